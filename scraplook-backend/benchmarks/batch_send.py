@@ -0,0 +1,183 @@
+"""
+Benchmark sending messages to a large recipient list, one by one or in a batch.
+
+The same `--messages` messages, each sent to `--recipients` new email addresses,
+are sent through `POST /messages/` one request at a time, then through a single
+`POST /messages/batch` request, and the throughput of both paths is reported.
+
+Usage (from `scraplook-backend`):
+    pdm run bench_batch_send --messages 500 --recipients 200
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from json import loads
+from time import perf_counter
+from uuid import uuid4
+
+from httpx import AsyncClient
+from prisma import Prisma
+
+from common import app_client, login, print_report
+from config.prisma_client import get_prisma_instance
+from services.messages_services import BULK_TX_TIMEOUT, safe_delete_messages
+from utils.hash import hash_str_chain
+
+PASSWORD = "benchmark-password"
+
+
+def _messages(id_sender: str, id_recipients: list[str], count: int) -> list[dict]:
+    """
+    Build messages sent to all recipients.
+
+    Args:
+        id_sender: Email address ID sending messages.
+        id_recipients: Email address IDs receiving messages.
+        count: Number of messages.
+
+    Returns:
+        list[dict]: Messages, as expected by the message endpoints.
+    """
+    return [
+        {
+            "subject": f"Benchmark message {index}",
+            "body": "Contenu d'un mail de benchmark",
+            "fromId": id_sender,
+            "recipients": [
+                {"emailId": id_recipient, "type": "to"}
+                for id_recipient in id_recipients
+            ],
+        }
+        for index in range(count)
+    ]
+
+
+async def _send_one_by_one(
+    client: AsyncClient, headers: dict, messages: list[dict]
+) -> float:
+    """
+    Send messages with one request each.
+
+    Args:
+        client: Client calling the app.
+        headers: Authorization headers.
+        messages: Messages to send.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    start = perf_counter()
+    for message in messages:
+        response = await client.post("/messages/", json=message, headers=headers)
+        response.raise_for_status()
+    return perf_counter() - start
+
+
+async def _send_batch(
+    client: AsyncClient, headers: dict, messages: list[dict]
+) -> float:
+    """
+    Send messages with a single batch request, reading its whole progress stream.
+
+    Args:
+        client: Client calling the app.
+        headers: Authorization headers.
+        messages: Messages to send.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    start = perf_counter()
+    async with client.stream(
+        "POST", "/messages/batch", json={"messages": messages}, headers=headers
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if loads(line)["error"] is not None:
+                raise RuntimeError(f"Batch send failed: {line}")
+    return perf_counter() - start
+
+
+async def _cleanup(prisma: Prisma, id_user: str, id_emails: list[str]) -> None:
+    """
+    Delete the benchmark user, its email addresses and their messages.
+
+    Args:
+        prisma: DB connection.
+        id_user: Benchmark user ID.
+        id_emails: Benchmark email address IDs.
+
+    Returns:
+
+    """
+    async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+        for id_email in id_emails:
+            await safe_delete_messages(transaction, id_email, {}, log_changes=False)
+        await transaction.email.delete_many(where={"id": {"in": id_emails}})
+        await transaction.user.delete(where={"id": id_user})
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    async with app_client() as client:
+        prisma = await get_prisma_instance()
+        suffix = uuid4().hex[:8]
+        user = await prisma.user.create(
+            data={
+                "name": f"benchmark-{suffix}",
+                "password": await hash_str_chain(PASSWORD),
+            }
+        )
+        emails = [
+            await prisma.email.create(
+                data={
+                    "address": f"benchmark-{suffix}-{index}@benchmark.test",
+                    "userId": user.id,
+                }
+            )
+            for index in range(arguments.recipients + 1)
+        ]
+        id_emails = [email.id for email in emails]
+
+        try:
+            token = await login(client, user.name, PASSWORD)
+            headers = {"Authorization": f"Bearer {token}"}
+            messages = _messages(id_emails[0], id_emails[1:], arguments.messages)
+
+            one_by_one_seconds = await _send_one_by_one(client, headers, messages)
+            batch_seconds = await _send_batch(client, headers, messages)
+        finally:
+            await _cleanup(prisma, user.id, id_emails)
+
+    print_report(
+        {
+            "messages": arguments.messages,
+            "recipients_per_message": arguments.recipients,
+            "one_by_one": {
+                "seconds": round(one_by_one_seconds, 3),
+                "messages_per_second": round(
+                    arguments.messages / one_by_one_seconds, 1
+                ),
+            },
+            "batch": {
+                "seconds": round(batch_seconds, 3),
+                "messages_per_second": round(arguments.messages / batch_seconds, 1),
+            },
+            "speedup": round(one_by_one_seconds / batch_seconds, 2),
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--recipients", type=int, default=200)
+    run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Common helpers of benchmark scripts.
+
+Benchmarks are run from the `scraplook-backend` directory (for `.env` and
+`logger_config.yaml`), with `src/scraplook-backend` in `PYTHONPATH`, see the
+`bench_*` scripts of `pyproject.toml`.
+"""
+
+from contextlib import asynccontextmanager
+from json import dumps
+from math import ceil
+from typing import AsyncIterator
+
+from httpx import ASGITransport, AsyncClient
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """
+    Compute a percentile with the nearest-rank method.
+
+    Args:
+        values: Measured values.
+        rank: Percentile to compute, between 0 and 100.
+
+    Returns:
+        float: Percentile value, 0 if there is no value.
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = max(ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def latency_report(latencies_seconds: list[float]) -> dict[str, float]:
+    """
+    Summarize request latencies.
+
+    Args:
+        latencies_seconds: Latency of each request, in seconds.
+
+    Returns:
+        dict[str, float]: Number of requests and p50/p95/p99/max latencies in ms.
+    """
+    return {
+        "count": len(latencies_seconds),
+        "p50_ms": round(percentile(latencies_seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies_seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies_seconds, 99) * 1000, 3),
+        "max_ms": round(max(latencies_seconds, default=0.0) * 1000, 3),
+    }
+
+
+def print_report(report: dict) -> None:
+    """
+    Print a benchmark report as JSON.
+
+    Args:
+        report: Benchmark results.
+
+    Returns:
+
+    """
+    print(dumps(report, indent=2))
+
+
+@asynccontextmanager
+async def app_client() -> AsyncIterator[AsyncClient]:
+    """
+    Start the FastAPI app in-process and return a client calling it.
+
+    Requests are handled in the event loop of the benchmark, so anything blocking
+    the loop in the app shows up in the latencies measured.
+
+    Returns:
+        AsyncIterator[AsyncClient]: Client calling the app.
+    """
+    from main import app  # pylint: disable=C0415
+
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://benchmark"
+        ) as client:
+            yield client
+
+
+async def login(client: AsyncClient, username: str, password: str) -> str:
+    """
+    Log in a user and return its access token.
+
+    Args:
+        client: Client calling the app.
+        username: User name.
+        password: User password.
+
+    Returns:
+        str: Access token.
+    """
+    response = await client.post(
+        "/auth/token", data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
@@ -0,0 +1,124 @@
+"""
+Benchmark response compression on listings of the seeded dataset.
+
+Each route is called with `Accept-Encoding: identity`, `gzip` and `br`. The report
+gives the bytes on the wire and the latency for each encoding, and the CPU time
+taken by the compressors of the middleware alone on the uncompressed body.
+
+Usage (from `scraplook-backend`, on a seeded DB):
+    pdm run bench_compression --requests 50
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from time import perf_counter, process_time
+
+from httpx import AsyncClient
+
+from common import app_client, latency_report, login, print_report
+from config.app_config import get_app_config
+from middlewares.compression import BrotliCompressor, GzipCompressor
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+async def _measure_route(
+    client: AsyncClient, route: str, params: dict, headers: dict, requests: int
+) -> dict:
+    """
+    Call a route with each encoding, and compress its body with each compressor.
+
+    Args:
+        client: Client calling the app.
+        route: Route to call.
+        params: Query parameters of the route.
+        headers: Authorization headers.
+        requests: Number of calls per encoding.
+
+    Returns:
+        dict: Results per encoding.
+    """
+    env_data = get_app_config().env_data
+    report: dict = {}
+    body = b""
+
+    for encoding in ENCODINGS:
+        latencies = []
+        wire_bytes = 0
+        for _ in range(requests):
+            start = perf_counter()
+            response = await client.get(
+                route, params=params, headers={**headers, "Accept-Encoding": encoding}
+            )
+            latencies.append(perf_counter() - start)
+            response.raise_for_status()
+            wire_bytes = response.num_bytes_downloaded
+            body = response.content
+
+        report[encoding] = {
+            "wire_bytes": wire_bytes,
+            "content_encoding": response.headers.get("content-encoding"),
+            **latency_report(latencies),
+        }
+
+    compressors = {
+        "gzip": lambda: GzipCompressor(env_data.compression_gzip_level),
+        "br": lambda: BrotliCompressor(env_data.compression_brotli_quality),
+    }
+    for encoding, create_compressor in compressors.items():
+        start = process_time()
+        for _ in range(requests):
+            compressor = create_compressor()
+            compressed = compressor.compress(body) + compressor.finish()
+        report[encoding]["compression_cpu_ms"] = round(
+            (process_time() - start) / requests * 1000, 3
+        )
+        report[encoding]["ratio"] = round(len(body) / max(len(compressed), 1), 2)
+
+    return report
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    async with app_client() as client:
+        token = await login(client, arguments.username, arguments.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        user = (await client.get("/auth/me", headers=headers)).json()
+        emails = (
+            await client.get(
+                "/email_address/all", params={"user_id": user["id"]}, headers=headers
+            )
+        ).json()
+        mailbox = {"id_email_address": emails[0]["id"], "limit": 200}
+
+        routes = {
+            "/messages/sent_messages": mailbox,
+            "/messages/received_messages": mailbox,
+            "/messages/received_summaries": mailbox,
+            "/messages/export": {"id_email_address": emails[0]["id"]},
+            "/user/all": {},
+        }
+        report = {
+            route: await _measure_route(
+                client, route, params, headers, arguments.requests
+            )
+            for route, params in routes.items()
+        }
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--username", default="AntoninD")
+    parser.add_argument("--password", default="azerty")
+    parser.add_argument("--requests", type=int, default=50)
+    run(main(parser.parse_args()))
@@ -0,0 +1,133 @@
+"""
+Benchmark deletion of an email address holding a large mailbox.
+
+A mailbox of `--messages` messages is created between two new email addresses,
+half sent and half received by the address deleted. The other address already
+deleted its copy of every message, so all messages are deleted completely.
+
+Usage (from `scraplook-backend`):
+    pdm run bench_delete_mailbox --messages 100000
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from time import perf_counter
+from uuid import uuid4
+
+from prisma import Prisma
+
+from common import print_report
+from config.prisma_client import disconnect_prisma, get_prisma_instance
+from services.email_address_services import delete_email_address
+from services.search_services import index_messages
+
+SEED_CHUNK_SIZE = 500
+
+
+async def _seed_mailbox(
+    prisma: Prisma, id_mailbox: str, id_other: str, messages: int
+) -> None:
+    """
+    Create messages between two email addresses, already deleted by the other one.
+
+    Args:
+        prisma: DB connection.
+        id_mailbox: Email address ID whose mailbox is deleted by the benchmark.
+        id_other: Email address ID exchanging messages with the mailbox.
+        messages: Number of messages to create.
+
+    Returns:
+
+    """
+    for start in range(0, messages, SEED_CHUNK_SIZE):
+        count = min(SEED_CHUNK_SIZE, messages - start)
+        id_messages = [str(uuid4()) for _ in range(count)]
+        # even messages are sent by the mailbox, odd ones are received
+        senders = [
+            (id_mailbox, id_other) if index % 2 == 0 else (id_other, id_mailbox)
+            for index in range(start, start + count)
+        ]
+
+        async with prisma.tx() as transaction:
+            await transaction.message.create_many(
+                data=[
+                    {
+                        "id": id_message,
+                        "subject": f"Benchmark message {start + index}",
+                        "body": "Contenu d'un mail de benchmark",
+                        "fromId": sender,
+                        "deleted_by_sender": sender == id_other,
+                    }
+                    for index, (id_message, (sender, _)) in enumerate(
+                        zip(id_messages, senders)
+                    )
+                ]
+            )
+            await transaction.messagerecipient.create_many(
+                data=[
+                    {
+                        "messageId": id_message,
+                        "emailId": recipient,
+                        "type": "to",
+                        "deletes_message": recipient == id_other,
+                    }
+                    for id_message, (_, recipient) in zip(id_messages, senders)
+                ]
+            )
+            await index_messages(transaction, id_messages)
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    prisma = await get_prisma_instance()
+    suffix = uuid4().hex[:8]
+    user = await prisma.user.create(
+        data={"name": f"benchmark-{suffix}", "password": "not-a-hash"}
+    )
+    mailbox = await prisma.email.create(
+        data={"address": f"mailbox-{suffix}@benchmark.test", "userId": user.id}
+    )
+    other = await prisma.email.create(
+        data={"address": f"other-{suffix}@benchmark.test", "userId": user.id}
+    )
+
+    start = perf_counter()
+    await _seed_mailbox(prisma, mailbox.id, other.id, arguments.messages)
+    seed_seconds = perf_counter() - start
+
+    start = perf_counter()
+    await delete_email_address(prisma, mailbox.id)
+    delete_seconds = perf_counter() - start
+
+    remaining = await prisma.message.count(
+        where={"OR": [{"fromId": mailbox.id}, {"fromId": other.id}]}
+    )
+    await prisma.email.delete(where={"id": other.id})
+    await prisma.user.delete(where={"id": user.id})
+    await disconnect_prisma()
+
+    print_report(
+        {
+            "messages": arguments.messages,
+            "seed_seconds": round(seed_seconds, 3),
+            "delete_seconds": round(delete_seconds, 3),
+            "deleted_messages_per_second": round(
+                arguments.messages / delete_seconds, 1
+            ),
+            "messages_left": remaining,
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100_000)
+    run(main(parser.parse_args()))
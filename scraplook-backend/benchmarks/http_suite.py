@@ -0,0 +1,423 @@
+"""
+End-to-end load test of the HTTP API, with concurrent clients on a seeded DB.
+
+The app of `main.py` is started in-process, then each client logs in as one of the
+synthetic users (see `pdm run seed_synthetic`) and calls routes for `--duration`
+seconds, drawn from the weights of a scenario: login, inbox listing, message
+detail, send and delete. Throughput and latencies of each route are reported as
+JSON, calls of the `--warmup` first seconds excluded.
+
+The report can be saved as the baseline of its scenario in `benchmarks/baselines/`,
+then later runs compared to it: routes whose p50/p95/p99 latency grows, or whose
+throughput drops, by more than `--tolerance` are listed as regressions, and the
+script exits with status 1.
+
+Usage (from `scraplook-backend`, on a DB seeded with `seed_synthetic`):
+    pdm run bench_http --scenario mixed --clients 20 --duration 30 --save-baseline
+    pdm run bench_http --scenario mixed --clients 20 --duration 30 --compare
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import gather, run
+from dataclasses import dataclass, field
+from json import dumps, loads
+from pathlib import Path
+from random import Random
+from sys import exit as sys_exit
+from time import perf_counter
+from typing import Awaitable, Callable
+
+from httpx import AsyncClient, Response
+
+from common import app_client, latency_report, login, print_report
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+# weight of each operation, per scenario
+SCENARIOS: dict[str, dict[str, int]] = {
+    "read_heavy": {"login": 1, "list": 60, "detail": 30, "send": 6, "delete": 3},
+    "mixed": {"login": 2, "list": 40, "detail": 25, "send": 20, "delete": 13},
+    "write_heavy": {"login": 1, "list": 20, "detail": 9, "send": 45, "delete": 25},
+}
+# route reported for each operation
+ROUTES = {
+    "login": "POST /auth/token",
+    "list": "GET /messages/received_summaries",
+    "detail": "GET /messages/{id_message}",
+    "send": "POST /messages/",
+    "delete": "DELETE /messages/",
+}
+# compared to the baseline: metrics that must not grow, and that must not drop
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_METRIC = "throughput_rps"
+LISTING_LIMIT = 50
+
+
+@dataclass
+class _Session:
+    """
+    State of a benchmark client, logged in as one user.
+    """
+
+    username: str
+    random: Random
+    headers: dict[str, str] = field(default_factory=dict)
+    id_email_addresses: list[str] = field(default_factory=list)
+    # (email address ID, message ID) of messages seen in the last listing
+    received: list[tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass
+class _LoadState:
+    """
+    State shared by benchmark clients: settings, and calls measured per route.
+    """
+
+    password: str
+    weights: dict[str, int]
+    measured_from: float
+    end: float
+    # email addresses of all clients, recipients of messages sent
+    id_email_addresses: list[str] = field(default_factory=list)
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+
+async def _login(client: AsyncClient, session: _Session, state: _LoadState) -> Response:
+    """
+    Log in the user of the session again.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        state: Shared state.
+
+    Returns:
+        Response: Response of the call.
+    """
+    response = await client.post(
+        "/auth/token", data={"username": session.username, "password": state.password}
+    )
+    if response.is_success:
+        session.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return response
+
+
+async def _list(client: AsyncClient, session: _Session, _: _LoadState) -> Response:
+    """
+    Read the first page of the inbox of one address of the session.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        _: Shared state.
+
+    Returns:
+        Response: Response of the call.
+    """
+    id_email_address = session.random.choice(session.id_email_addresses)
+    response = await client.get(
+        "/messages/received_summaries",
+        params={"id_email_address": id_email_address, "limit": LISTING_LIMIT},
+        headers=session.headers,
+    )
+    if response.is_success:
+        session.received = [
+            (id_email_address, item["id"]) for item in response.json()["items"]
+        ]
+    return response
+
+
+async def _detail(client: AsyncClient, session: _Session, _: _LoadState) -> Response:
+    """
+    Read a message seen in the last listing.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        _: Shared state.
+
+    Returns:
+        Response: Response of the call.
+    """
+    _, id_message = session.random.choice(session.received)
+    return await client.get(f"/messages/{id_message}", headers=session.headers)
+
+
+async def _send(client: AsyncClient, session: _Session, state: _LoadState) -> Response:
+    """
+    Send a message from the session to 1 to 3 addresses of any client.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        state: Shared state.
+
+    Returns:
+        Response: Response of the call.
+    """
+    recipients = session.random.sample(
+        state.id_email_addresses,
+        min(session.random.randint(1, 3), len(state.id_email_addresses)),
+    )
+    return await client.post(
+        "/messages/",
+        json={
+            "subject": "Benchmark",
+            "body": "Contenu d'un mail de benchmark. " * session.random.randint(1, 30),
+            "fromId": session.random.choice(session.id_email_addresses),
+            "recipients": [
+                {"emailId": id_recipient, "type": "to"} for id_recipient in recipients
+            ],
+        },
+        headers=session.headers,
+    )
+
+
+async def _delete(client: AsyncClient, session: _Session, _: _LoadState) -> Response:
+    """
+    Delete a message seen in the last listing, from the address that received it.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        _: Shared state.
+
+    Returns:
+        Response: Response of the call.
+    """
+    id_email_address, id_message = session.received.pop(
+        session.random.randrange(len(session.received))
+    )
+    return await client.delete(
+        "/messages/",
+        params={"id_email_address": id_email_address, "id_message": id_message},
+        headers=session.headers,
+    )
+
+
+OPERATIONS: dict[
+    str, Callable[[AsyncClient, _Session, _LoadState], Awaitable[Response]]
+] = {
+    "login": _login,
+    "list": _list,
+    "detail": _detail,
+    "send": _send,
+    "delete": _delete,
+}
+
+
+async def _open_session(
+    client: AsyncClient, index: int, arguments: Namespace
+) -> _Session:
+    """
+    Log in a client as a synthetic user, and get its email addresses.
+
+    Args:
+        client: Client calling the app.
+        index: Client index, clients share users if they outnumber them.
+        arguments: Benchmark arguments.
+
+    Returns:
+        _Session: Client state.
+    """
+    session = _Session(
+        username=f"{arguments.name_prefix}-{index % arguments.users}",
+        random=Random(arguments.seed + index),
+    )
+    token = await login(client, session.username, arguments.password)
+    session.headers = {"Authorization": f"Bearer {token}"}
+
+    user = (await client.get("/auth/me", headers=session.headers)).json()
+    emails = (
+        await client.get(
+            "/email_address/all",
+            params={"user_id": user["id"]},
+            headers=session.headers,
+        )
+    ).json()
+    session.id_email_addresses = [email["id"] for email in emails]
+    return session
+
+
+async def _run_client(
+    client: AsyncClient, session: _Session, state: _LoadState
+) -> None:
+    """
+    Call routes drawn from the scenario weights, until the end of the benchmark.
+
+    Detail and delete need a message seen in a listing, the inbox is listed instead
+    when there is none.
+
+    Args:
+        client: Client calling the app.
+        session: Client state.
+        state: Shared state, where calls are recorded.
+
+    Returns:
+
+    """
+    operations = list(state.weights)
+    weights = list(state.weights.values())
+
+    while (start := perf_counter()) < state.end:
+        operation = session.random.choices(operations, weights)[0]
+        if operation in ("detail", "delete") and not session.received:
+            operation = "list"
+
+        response = await OPERATIONS[operation](client, session, state)
+        if start >= state.measured_from:
+            route = ROUTES[operation]
+            state.latencies.setdefault(route, []).append(perf_counter() - start)
+            if response.is_error:
+                state.errors[route] = state.errors.get(route, 0) + 1
+
+
+def _build_report(state: _LoadState, arguments: Namespace) -> dict:
+    """
+    Summarize calls measured, per route and in total.
+
+    Args:
+        state: Shared state, with calls recorded.
+        arguments: Benchmark arguments.
+
+    Returns:
+        dict: Report.
+    """
+    seconds = arguments.duration
+    routes = {
+        route: {
+            **latency_report(latencies),
+            "errors": state.errors.get(route, 0),
+            THROUGHPUT_METRIC: round(len(latencies) / seconds, 2),
+        }
+        for route, latencies in sorted(state.latencies.items())
+    }
+    requests = sum(len(latencies) for latencies in state.latencies.values())
+
+    return {
+        "config": {
+            "scenario": arguments.scenario,
+            "clients": arguments.clients,
+            "users": arguments.users,
+            "duration_s": arguments.duration,
+            "seed": arguments.seed,
+        },
+        "requests": requests,
+        "errors": sum(state.errors.values()),
+        THROUGHPUT_METRIC: round(requests / seconds, 2),
+        "routes": routes,
+    }
+
+
+def _find_regressions(report: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """
+    Compare a report to a baseline, route by route.
+
+    Args:
+        report: Report of the run.
+        baseline: Report of the baseline run.
+        tolerance: Relative change allowed, e.g. 0.1 for 10%.
+
+    Returns:
+        list[dict]: Metrics worse than the baseline beyond the tolerance.
+    """
+    regressions = []
+    for route, measures in report["routes"].items():
+        reference = baseline["routes"].get(route)
+        if reference is None:
+            continue
+
+        for metric in (*LATENCY_METRICS, THROUGHPUT_METRIC):
+            current, previous = measures[metric], reference[metric]
+            if not previous:
+                continue
+            change = current / previous - 1
+            worse = -change if metric == THROUGHPUT_METRIC else change
+            if worse > tolerance:
+                regressions.append(
+                    {
+                        "route": route,
+                        "metric": metric,
+                        "baseline": previous,
+                        "current": current,
+                        "change": round(change, 3),
+                    }
+                )
+
+    return regressions
+
+
+async def main(arguments: Namespace) -> int:
+    """
+    Run the benchmark, print its report, and save or compare it to the baseline.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+        int: Exit status, 1 if regressions were found.
+    """
+    baseline_path = BASELINES_DIR / f"http_{arguments.scenario}.json"
+
+    async with app_client() as client:
+        sessions = await gather(
+            *(
+                _open_session(client, index, arguments)
+                for index in range(arguments.clients)
+            )
+        )
+        start = perf_counter()
+        state = _LoadState(
+            password=arguments.password,
+            weights=SCENARIOS[arguments.scenario],
+            measured_from=start + arguments.warmup,
+            end=start + arguments.warmup + arguments.duration,
+            id_email_addresses=sorted(
+                {
+                    id_email
+                    for session in sessions
+                    for id_email in session.id_email_addresses
+                }
+            ),
+        )
+        await gather(*(_run_client(client, session, state) for session in sessions))
+
+    report = _build_report(state, arguments)
+    status = 0
+    if arguments.compare:
+        baseline = loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = _find_regressions(report, baseline, arguments.tolerance)
+        report["comparison"] = {
+            "baseline": str(baseline_path),
+            "baseline_config": baseline["config"],
+            "tolerance": arguments.tolerance,
+            "regressions": regressions,
+        }
+        status = 1 if regressions else 0
+
+    print_report(report)
+    if arguments.output:
+        Path(arguments.output).write_text(dumps(report, indent=2), encoding="utf-8")
+    if arguments.save_baseline:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        baseline_path.write_text(dumps(report, indent=2), encoding="utf-8")
+
+    return status
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    # synthetic users logged in, see `seed_synthetic`
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--name-prefix", default="synthetic")
+    parser.add_argument("--password", default="synthetic")
+    parser.add_argument("--output", help="file where the report is also written")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    sys_exit(run(main(parser.parse_args())))
@@ -0,0 +1,272 @@
+"""
+Benchmark how many idle new message streams one server process can hold.
+
+A uvicorn worker is started, then `--subscribers` clients open `/messages/stream`
+on the same mailbox, by steps of `--ramp-step`. Once all streams are open and idle,
+the benchmark reports the server memory per stream, the latency of an unrelated
+endpoint, and how long a message sent to the mailbox takes to reach every stream.
+
+Usage (from `scraplook-backend`, on a seeded DB):
+    pdm run bench_idle_subscribers --subscribers 5000
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import Task, create_subprocess_exec, create_task, gather, run, sleep
+from asyncio.subprocess import Process
+from json import loads
+from resource import RLIMIT_NOFILE, getrlimit, setrlimit
+from sys import executable
+from time import perf_counter
+
+from httpx import AsyncClient, HTTPError, Limits, Timeout
+
+from common import latency_report, login, percentile, print_report
+from utils.admin import ADMIN_TOKEN_HEADER
+
+PROBE_ROUTE = "/auth/check_refresh_access_token"
+
+
+def _raise_open_files_limit() -> None:
+    """
+    Raise the limit of open files to its maximum, as each stream holds a socket.
+
+    Returns:
+
+    """
+    _, hard = getrlimit(RLIMIT_NOFILE)
+    setrlimit(RLIMIT_NOFILE, (hard, hard))
+
+
+def _rss_kib(pid: int) -> int:
+    """
+    Read the resident memory of a process.
+
+    Args:
+        pid: Process ID.
+
+    Returns:
+        int: Resident memory, in KiB.
+    """
+    with open(f"/proc/{pid}/status", encoding="utf-8") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _start_server(port: int) -> Process:
+    """
+    Start a uvicorn worker serving the app, and wait until it answers.
+
+    Args:
+        port: Port to listen on.
+
+    Returns:
+        Process: Server process.
+    """
+    server = await create_subprocess_exec(
+        executable,
+        "-m",
+        "uvicorn",
+        "main:app",
+        "--app-dir",
+        "src/scraplook-backend",
+        "--port",
+        str(port),
+        "--backlog",
+        "4096",
+        "--no-access-log",
+        "--log-level",
+        "warning",
+        preexec_fn=_raise_open_files_limit,
+    )
+
+    async with AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(100):
+            try:
+                await client.get("/docs")
+                return server
+            except HTTPError:
+                await sleep(0.1)
+
+    server.terminate()
+    raise RuntimeError("Server did not start")
+
+
+async def _subscriber(
+    client: AsyncClient,
+    params: dict,
+    headers: dict[str, str],
+    opened: list[int],
+    received: list[float],
+) -> None:
+    """
+    Open a stream and record when each new message event is received, until cancelled.
+
+    Args:
+        client: Client calling the server.
+        params: Query parameters of the stream.
+        headers: Authorization header of the stream.
+        opened: Shared number of streams open.
+        received: Reception times of new message events, filled by the subscriber.
+
+    Returns:
+
+    """
+    async with client.stream(
+        "GET", "/messages/stream", params=params, headers=headers
+    ) as response:
+        response.raise_for_status()
+        opened[0] += 1
+        async for line in response.aiter_lines():
+            if line.startswith("data:") and loads(line[5:])["type"] == "new_message":
+                received.append(perf_counter())
+
+
+async def _probe(client: AsyncClient, token: str, count: int) -> list[float]:
+    """
+    Call an endpoint that neither hashes nor queries the DB.
+
+    Args:
+        client: Client calling the server.
+        token: Access token.
+        count: Number of calls.
+
+    Returns:
+        list[float]: Latency of each call, in seconds.
+    """
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(count):
+        start = perf_counter()
+        response = await client.get(PROBE_ROUTE, headers=headers)
+        latencies.append(perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    _raise_open_files_limit()
+    server = await _start_server(arguments.port)
+    client = AsyncClient(
+        base_url=f"http://127.0.0.1:{arguments.port}",
+        limits=Limits(max_connections=None, max_keepalive_connections=None),
+        timeout=Timeout(30.0, read=None),
+    )
+
+    try:
+        token = await login(client, arguments.username, arguments.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        user = (await client.get("/auth/me", headers=headers)).json()
+        emails = (
+            await client.get(
+                "/email_address/all", params={"user_id": user["id"]}, headers=headers
+            )
+        ).json()
+        id_mailbox = emails[0]["id"]
+
+        idle_probes = await _probe(client, token, arguments.probes)
+        rss_before = _rss_kib(server.pid)
+
+        opened = [0]
+        received: list[float] = []
+        params = {"id_email_address": id_mailbox}
+        tasks: list[Task] = []
+        start = perf_counter()
+        for step in range(0, arguments.subscribers, arguments.ramp_step):
+            count = min(arguments.ramp_step, arguments.subscribers - step)
+            tasks.extend(
+                create_task(_subscriber(client, params, headers, opened, received))
+                for _ in range(count)
+            )
+            # wait for the step to be open before opening the next one
+            while opened[0] < step + count:
+                await sleep(0.05)
+        ramp_seconds = perf_counter() - start
+        await sleep(arguments.idle_seconds)
+
+        rss_after = _rss_kib(server.pid)
+        loaded_probes = await _probe(client, token, arguments.probes)
+
+        sent_at = perf_counter()
+        response = await client.post(
+            "/messages/",
+            json={
+                "subject": "Benchmark message",
+                "body": "Contenu d'un mail de benchmark",
+                "fromId": id_mailbox,
+                "recipients": [{"emailId": id_mailbox, "type": "to"}],
+            },
+            headers=headers,
+        )
+        response.raise_for_status()
+        while (
+            len(received) < arguments.subscribers
+            and perf_counter() - sent_at < arguments.delivery_timeout
+        ):
+            await sleep(0.01)
+        deliveries = [at - sent_at for at in received]
+
+        # stream counters are reserved to admins
+        stream_stats = None
+        if arguments.admin_token is not None:
+            stream_stats = (
+                await client.get(
+                    "/messages/stream_stats",
+                    headers={ADMIN_TOKEN_HEADER: arguments.admin_token},
+                )
+            ).json()
+
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+    finally:
+        await client.aclose()
+        server.terminate()
+        await server.wait()
+
+    print_report(
+        {
+            "subscribers": arguments.subscribers,
+            "ramp_seconds": round(ramp_seconds, 3),
+            "server_rss_mib": {
+                "before": round(rss_before / 1024, 1),
+                "after": round(rss_after / 1024, 1),
+                "per_subscriber_kib": round(
+                    (rss_after - rss_before) / arguments.subscribers, 2
+                ),
+            },
+            "probe_idle": latency_report(idle_probes),
+            "probe_with_subscribers": latency_report(loaded_probes),
+            "delivery": {
+                "received": len(deliveries),
+                "p50_ms": round(percentile(deliveries, 50) * 1000, 3),
+                "p99_ms": round(percentile(deliveries, 99) * 1000, 3),
+                "max_ms": round(max(deliveries, default=0.0) * 1000, 3),
+            },
+            "stream_stats": stream_stats,
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--username", default="AntoninD")
+    parser.add_argument("--password", default="azerty")
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--ramp-step", type=int, default=500)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--delivery-timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--admin-token", help="admin token, to report stream counters")
+    run(main(parser.parse_args()))
@@ -0,0 +1,160 @@
+"""
+Microbenchmark of the serialization of message listings, default versus fast path.
+
+A page of `--sizes` synthetic messages, each with its sender and `--recipients`
+recipients, is returned by two endpoints of an in-process app: one through the
+FastAPI response model (validation, `jsonable_encoder`, `json`), the other through
+`ResponseSchema` (compiled serializer, orjson). No DB is used, so only the
+serialization cost is measured.
+
+Usage (from `scraplook-backend`):
+    pdm run bench_json_responses --sizes 1000 10000
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from fastapi import FastAPI, Response
+from httpx import ASGITransport, AsyncClient
+from prisma.models import Email, Message, MessageRecipient
+
+from common import latency_report, print_report
+from config.app_config import get_app_config
+from models.message import MessagePage
+from utils.fast_json import ResponseSchema
+
+
+def _build_page(size: int, recipients: int) -> MessagePage:
+    """
+    Build a page of messages as read from the DB, with senders and recipients.
+
+    Args:
+        size: Number of messages.
+        recipients: Number of recipients per message.
+
+    Returns:
+        MessagePage: Page of messages.
+    """
+    emails = [
+        Email(id=f"email-{index}", address=f"user{index}@test.fr", userId="user")
+        for index in range(recipients + 1)
+    ]
+    sent_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return MessagePage(
+        items=[
+            Message(
+                id=f"message-{index}",
+                subject=f"Objet du mail {index}",
+                body="Contenu d'un mail de benchmark. " * 20,
+                sentAt=sent_at + timedelta(seconds=index),
+                fromId=emails[0].id,
+                fromEmail=emails[0],
+                deleted_by_sender=False,
+                recipients=[
+                    MessageRecipient(
+                        id=f"recipient-{index}-{rank}",
+                        messageId=f"message-{index}",
+                        emailId=email.id,
+                        email=email,
+                        deletes_message=False,
+                        read=False,
+                        type="to",
+                    )
+                    for rank, email in enumerate(emails[1:])
+                ],
+            )
+            for index in range(size)
+        ],
+        next_cursor=None,
+    )
+
+
+def _build_app(page: MessagePage) -> FastAPI:
+    """
+    Build an app returning the same page through both serialization paths.
+
+    Args:
+        page: Page returned by the endpoints.
+
+    Returns:
+        FastAPI: App to benchmark.
+    """
+    app = FastAPI()
+    schema = ResponseSchema[MessagePage](MessagePage)
+
+    @app.get("/default", response_model=MessagePage)
+    async def default_path() -> MessagePage:
+        return page
+
+    @app.get("/fast", response_model=MessagePage)
+    async def fast_path(response: Response) -> MessagePage:
+        return schema.response(page, response)
+
+    return app
+
+
+async def _measure(client: AsyncClient, route: str, requests: int) -> dict:
+    """
+    Call an endpoint several times.
+
+    Args:
+        client: Client calling the app.
+        route: Endpoint to call.
+        requests: Number of calls.
+
+    Returns:
+        dict: Latencies and response size.
+    """
+    latencies = []
+    size = 0
+    for _ in range(requests):
+        start = perf_counter()
+        response = await client.get(route)
+        latencies.append(perf_counter() - start)
+        response.raise_for_status()
+        size = len(response.content)
+
+    return {"bytes": size, **latency_report(latencies)}
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    app_config = get_app_config()
+    app_config.env_data = app_config.env_data.model_copy(
+        update={"fast_json_responses": True}
+    )
+
+    report = {}
+    for size in arguments.sizes:
+        app = _build_app(_build_page(size, arguments.recipients))
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://benchmark"
+        ) as client:
+            default = await _measure(client, "/default", arguments.requests)
+            fast = await _measure(client, "/fast", arguments.requests)
+
+        report[f"{size}_messages"] = {
+            "default": default,
+            "fast": fast,
+            "speedup_p50": round(default["p50_ms"] / fast["p50_ms"], 2),
+        }
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--recipients", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20)
+    run(main(parser.parse_args()))
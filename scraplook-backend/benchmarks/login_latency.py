@@ -0,0 +1,165 @@
+"""
+Benchmark latency of unrelated endpoints while logins are running concurrently.
+
+Each login hashes a password with bcrypt. The benchmark probes an endpoint that
+neither hashes nor queries the DB, first alone, then while `--concurrency` clients
+log in continuously, and reports probe latencies of both phases.
+
+Usage (from `scraplook-backend`, on a seeded DB):
+    pdm run bench_login --logins 200 --concurrency 20
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import Event, gather, run, sleep
+from time import perf_counter
+from typing import Awaitable
+
+from httpx import AsyncClient
+
+from common import app_client, latency_report, login, print_report
+
+PROBE_ROUTE = "/auth/check_refresh_access_token"
+
+
+async def _probe(
+    client: AsyncClient, token: str, stop: Event, interval: float
+) -> list[float]:
+    """
+    Call the probe endpoint until stopped.
+
+    Args:
+        client: Client calling the app.
+        token: Access token sent to the probe endpoint.
+        stop: Event set when probing must stop.
+        interval: Pause between two probes, in seconds.
+
+    Returns:
+        list[float]: Latency of each probe, in seconds.
+    """
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = perf_counter()
+        response = await client.get(PROBE_ROUTE, headers=headers)
+        latencies.append(perf_counter() - start)
+        response.raise_for_status()
+        await sleep(interval)
+    return latencies
+
+
+async def _login_worker(
+    client: AsyncClient, arguments: Namespace, remaining: list[int]
+) -> list[float]:
+    """
+    Log in repeatedly until the login budget is consumed.
+
+    Args:
+        client: Client calling the app.
+        arguments: Benchmark arguments.
+        remaining: Shared number of logins left to do.
+
+    Returns:
+        list[float]: Latency of each login, in seconds.
+    """
+    latencies = []
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        start = perf_counter()
+        await login(client, arguments.username, arguments.password)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+async def _stop_after(stop: Event, delay: float) -> None:
+    """
+    Set an event after a delay.
+
+    Args:
+        stop: Event to set.
+        delay: Delay in seconds.
+
+    Returns:
+
+    """
+    await sleep(delay)
+    stop.set()
+
+
+async def _stop_when_done(
+    workers: Awaitable[list[list[float]]], stop: Event
+) -> list[list[float]]:
+    """
+    Wait for login workers, then stop probing.
+
+    Args:
+        workers: Login workers to wait for.
+        stop: Event set once workers are done.
+
+    Returns:
+        list[list[float]]: Login latencies of each worker.
+    """
+    try:
+        return await workers
+    finally:
+        stop.set()
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the benchmark and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    async with app_client() as client:
+        token = await login(client, arguments.username, arguments.password)
+
+        # probes alone
+        stop = Event()
+        probe = _probe(client, token, stop, arguments.probe_interval)
+        _, idle_latencies = await gather(
+            _stop_after(stop, arguments.idle_seconds), probe
+        )
+
+        # probes during logins
+        stop = Event()
+        remaining = [arguments.logins]
+        start = perf_counter()
+        probe_task = _probe(client, token, stop, arguments.probe_interval)
+        workers = gather(
+            *(
+                _login_worker(client, arguments, remaining)
+                for _ in range(arguments.concurrency)
+            )
+        )
+        busy_latencies, login_latencies = await gather(
+            probe_task, _stop_when_done(workers, stop)
+        )
+        elapsed = perf_counter() - start
+
+    print_report(
+        {
+            "probe_route": PROBE_ROUTE,
+            "idle": latency_report(idle_latencies),
+            "during_logins": latency_report(busy_latencies),
+            "logins": {
+                **latency_report([lat for worker in login_latencies for lat in worker]),
+                "concurrency": arguments.concurrency,
+                "per_second": round(arguments.logins / elapsed, 2),
+            },
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--username", default="AntoninD")
+    parser.add_argument("--password", default="azerty")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+"""
+Load test of message writes with concurrent senders, for several DB configurations.
+
+For each journal mode and connection pool size given, the DB is reconnected with
+these settings, then `--messages` messages are sent through `send_message` by
+each number of concurrent senders given. Throughput and failed sends (e.g. busy
+timeouts) are reported per configuration.
+
+Usage (from `scraplook-backend`):
+    pdm run bench_write_throughput --journal-modes DELETE WAL --connection-limits 1 8
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import gather, run
+from time import perf_counter
+from typing import Optional
+from uuid import uuid4
+
+from prisma import Prisma, errors
+
+from common import print_report
+from config.app_config import get_app_config
+from config.prisma_client import disconnect_prisma, get_prisma_instance
+from models.message import MessageInput, MessageRecipientInput
+from services.messages_services import (
+    BULK_TX_TIMEOUT,
+    safe_delete_messages,
+    send_message,
+)
+
+
+async def _sender(
+    prisma: Prisma, message: MessageInput, remaining: list[int], failures: list[str]
+) -> None:
+    """
+    Send messages until the shared budget is consumed.
+
+    Args:
+        prisma: DB connection.
+        message: Message to send.
+        remaining: Shared number of messages left to send.
+        failures: Errors of failed sends, filled by the sender.
+
+    Returns:
+
+    """
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        try:
+            await send_message(prisma, message)
+        except errors.PrismaError as error:
+            failures.append(str(error))
+
+
+async def _run_configuration(
+    arguments: Namespace,
+    journal_mode: str,
+    connection_limit: Optional[int],
+    message: MessageInput,
+) -> dict:
+    """
+    Reconnect the DB with a configuration, and send messages with each concurrency.
+
+    Args:
+        arguments: Benchmark arguments.
+        journal_mode: SQLite journal mode.
+        connection_limit: Connection pool size, query engine default if None.
+        message: Message to send.
+
+    Returns:
+        dict: Results of the configuration.
+    """
+    app_config = get_app_config()
+    app_config.env_data = app_config.env_data.model_copy(
+        update={
+            "sqlite_journal_mode": journal_mode,
+            "database_connection_limit": connection_limit,
+        }
+    )
+    await disconnect_prisma()
+    prisma = await get_prisma_instance()
+
+    runs = []
+    for concurrency in arguments.concurrency:
+        remaining = [arguments.messages]
+        failures: list[str] = []
+        start = perf_counter()
+        await gather(
+            *(_sender(prisma, message, remaining, failures) for _ in range(concurrency))
+        )
+        seconds = perf_counter() - start
+        runs.append(
+            {
+                "concurrency": concurrency,
+                "seconds": round(seconds, 3),
+                "messages_per_second": round(
+                    (arguments.messages - len(failures)) / seconds, 1
+                ),
+                "failures": len(failures),
+                "first_failure": failures[0] if failures else None,
+            }
+        )
+
+    return {
+        "journal_mode": journal_mode,
+        "connection_limit": connection_limit,
+        "runs": runs,
+    }
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Run the load test and print its report.
+
+    Args:
+        arguments: Benchmark arguments.
+
+    Returns:
+
+    """
+    initial_env_data = get_app_config().env_data
+    prisma = await get_prisma_instance()
+
+    suffix = uuid4().hex[:8]
+    user = await prisma.user.create(
+        data={"name": f"benchmark-{suffix}", "password": "not-a-hash"}
+    )
+    sender = await prisma.email.create(
+        data={"address": f"sender-{suffix}@benchmark.test", "userId": user.id}
+    )
+    recipient = await prisma.email.create(
+        data={"address": f"recipient-{suffix}@benchmark.test", "userId": user.id}
+    )
+    message = MessageInput(
+        subject="Benchmark message",
+        body="Contenu d'un mail de benchmark",
+        fromId=sender.id,
+        recipients=[MessageRecipientInput(emailId=recipient.id, type="to")],
+    )
+
+    results = []
+    try:
+        for journal_mode in arguments.journal_modes:
+            for connection_limit in arguments.connection_limits or [None]:
+                results.append(
+                    await _run_configuration(
+                        arguments, journal_mode, connection_limit, message
+                    )
+                )
+    finally:
+        get_app_config().env_data = initial_env_data
+        await disconnect_prisma()
+        prisma = await get_prisma_instance()
+        async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+            for id_email in (sender.id, recipient.id):
+                await safe_delete_messages(transaction, id_email, {}, log_changes=False)
+            await transaction.email.delete_many(
+                where={"id": {"in": [sender.id, recipient.id]}}
+            )
+            await transaction.user.delete(where={"id": user.id})
+        await disconnect_prisma()
+
+    print_report({"messages_per_run": arguments.messages, "configurations": results})
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--journal-modes",
+        nargs="+",
+        default=["DELETE", "WAL"],
+        choices=["DELETE", "TRUNCATE", "PERSIST", "WAL"],
+    )
+    parser.add_argument("--connection-limits", type=int, nargs="+", default=[])
+    run(main(parser.parse_args()))
@@ -0,0 +1,33 @@
+-- align tables with schema.prisma: deletion by recipients is flagged on
+-- MessageRecipient, and recipients are deleted with their message
+
+-- RedefineTables
+PRAGMA defer_foreign_keys=ON;
+PRAGMA foreign_keys=OFF;
+CREATE TABLE "new_Message" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "subject" TEXT,
+    "body" TEXT NOT NULL,
+    "sentAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "fromId" TEXT NOT NULL,
+    "deleted_by_sender" BOOLEAN NOT NULL DEFAULT false,
+    CONSTRAINT "Message_fromId_fkey" FOREIGN KEY ("fromId") REFERENCES "Email" ("id") ON DELETE RESTRICT ON UPDATE CASCADE
+);
+INSERT INTO "new_Message" ("id", "subject", "body", "sentAt", "fromId", "deleted_by_sender") SELECT "id", "subject", "body", "sentAt", "fromId", "deleted_by_sender" FROM "Message";
+DROP TABLE "Message";
+ALTER TABLE "new_Message" RENAME TO "Message";
+CREATE TABLE "new_MessageRecipient" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "messageId" TEXT NOT NULL,
+    "emailId" TEXT NOT NULL,
+    "deletes_message" BOOLEAN NOT NULL DEFAULT false,
+    "type" TEXT NOT NULL,
+    CONSTRAINT "MessageRecipient_messageId_fkey" FOREIGN KEY ("messageId") REFERENCES "Message" ("id") ON DELETE CASCADE ON UPDATE CASCADE,
+    CONSTRAINT "MessageRecipient_emailId_fkey" FOREIGN KEY ("emailId") REFERENCES "Email" ("id") ON DELETE RESTRICT ON UPDATE CASCADE
+);
+INSERT INTO "new_MessageRecipient" ("id", "messageId", "emailId", "type") SELECT "id", "messageId", "emailId", "type" FROM "MessageRecipient";
+DROP TABLE "MessageRecipient";
+ALTER TABLE "new_MessageRecipient" RENAME TO "MessageRecipient";
+CREATE UNIQUE INDEX "MessageRecipient_messageId_emailId_key" ON "MessageRecipient"("messageId", "emailId");
+PRAGMA foreign_keys=ON;
+PRAGMA defer_foreign_keys=OFF;
@@ -0,0 +1,8 @@
+-- CreateIndex
+CREATE INDEX "Message_fromId_sentAt_id_idx" ON "Message"("fromId", "sentAt", "id");
+
+-- CreateIndex
+CREATE INDEX "Message_sentAt_id_idx" ON "Message"("sentAt", "id");
+
+-- CreateIndex
+CREATE INDEX "MessageRecipient_emailId_deletes_message_idx" ON "MessageRecipient"("emailId", "deletes_message");
@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "MailboxChange" (
+    "seq" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "emailId" TEXT NOT NULL,
+    "messageId" TEXT NOT NULL,
+    "kind" TEXT NOT NULL,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT "MailboxChange_emailId_fkey" FOREIGN KEY ("emailId") REFERENCES "Email" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- CreateIndex
+CREATE INDEX "MailboxChange_emailId_seq_idx" ON "MailboxChange"("emailId", "seq");
@@ -0,0 +1,37 @@
+-- CreateTable
+CREATE TABLE "MailboxEntry" (
+    "emailId" TEXT NOT NULL,
+    "messageId" TEXT NOT NULL,
+    "folder" TEXT NOT NULL,
+    "sentAt" DATETIME NOT NULL,
+    "subject" TEXT,
+    "snippet" TEXT NOT NULL,
+    "fromAddress" TEXT NOT NULL,
+    "recipientCount" INTEGER NOT NULL,
+    "deleted" BOOLEAN NOT NULL DEFAULT false,
+
+    PRIMARY KEY ("emailId", "messageId", "folder"),
+    CONSTRAINT "MailboxEntry_emailId_fkey" FOREIGN KEY ("emailId") REFERENCES "Email" ("id") ON DELETE CASCADE ON UPDATE CASCADE,
+    CONSTRAINT "MailboxEntry_messageId_fkey" FOREIGN KEY ("messageId") REFERENCES "Message" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- CreateIndex
+CREATE INDEX "MailboxEntry_emailId_folder_deleted_sentAt_messageId_idx" ON "MailboxEntry"("emailId", "folder", "deleted", "sentAt", "messageId");
+
+-- CreateIndex
+CREATE INDEX "MailboxEntry_messageId_idx" ON "MailboxEntry"("messageId");
+
+-- Backfill
+-- entries of existing messages, the snippet length is models.message.SNIPPET_LENGTH
+INSERT INTO "MailboxEntry" ("emailId", "messageId", "folder", "sentAt", "subject", "snippet", "fromAddress", "recipientCount", "deleted")
+SELECT m."fromId", m."id", 'sent', m."sentAt", m."subject", substr(m."body", 1, 120), e."address",
+    (SELECT COUNT(*) FROM "MessageRecipient" r WHERE r."messageId" = m."id"), m."deleted_by_sender"
+FROM "Message" m
+JOIN "Email" e ON e."id" = m."fromId";
+
+INSERT INTO "MailboxEntry" ("emailId", "messageId", "folder", "sentAt", "subject", "snippet", "fromAddress", "recipientCount", "deleted")
+SELECT mr."emailId", m."id", 'received', m."sentAt", m."subject", substr(m."body", 1, 120), e."address",
+    (SELECT COUNT(*) FROM "MessageRecipient" r WHERE r."messageId" = m."id"), mr."deletes_message"
+FROM "MessageRecipient" mr
+JOIN "Message" m ON m."id" = mr."messageId"
+JOIN "Email" e ON e."id" = m."fromId";
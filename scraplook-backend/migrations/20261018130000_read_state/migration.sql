@@ -0,0 +1,22 @@
+-- AlterTable
+ALTER TABLE "MessageRecipient" ADD COLUMN "read" BOOLEAN NOT NULL DEFAULT false;
+
+-- AlterTable
+ALTER TABLE "MailboxEntry" ADD COLUMN "read" BOOLEAN NOT NULL DEFAULT false;
+
+-- CreateTable
+CREATE TABLE "MailboxCounter" (
+    "emailId" TEXT NOT NULL PRIMARY KEY,
+    "total" INTEGER NOT NULL DEFAULT 0,
+    "unread" INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT "MailboxCounter_emailId_fkey" FOREIGN KEY ("emailId") REFERENCES "Email" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Backfill
+-- messages sent are read by their sender, messages received are unread
+UPDATE "MailboxEntry" SET "read" = true WHERE "folder" = 'sent';
+
+INSERT INTO "MailboxCounter" ("emailId", "total", "unread")
+SELECT "emailId", COUNT(*), COUNT(*) FROM "MailboxEntry"
+WHERE "folder" = 'received' AND "deleted" = false
+GROUP BY "emailId";
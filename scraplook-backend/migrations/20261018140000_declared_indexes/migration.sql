@@ -0,0 +1,10 @@
+-- CreateIndex
+CREATE INDEX "Email_userId_idx" ON "Email"("userId");
+
+-- DropIndex
+-- replaced by an index covering "messageId", to read the received messages of a
+-- mailbox without reading "MessageRecipient" rows
+DROP INDEX "MessageRecipient_emailId_deletes_message_idx";
+
+-- CreateIndex
+CREATE INDEX "MessageRecipient_emailId_deletes_message_messageId_idx" ON "MessageRecipient"("emailId", "deletes_message", "messageId");
@@ -0,0 +1,42 @@
+-- CreateTable
+CREATE TABLE "MessageSearchDocument" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "messageId" TEXT NOT NULL,
+    CONSTRAINT "MessageSearchDocument_messageId_fkey" FOREIGN KEY ("messageId") REFERENCES "Message" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "MessageSearchDocument_messageId_key" ON "MessageSearchDocument"("messageId");
+
+-- CreateVirtualTable
+-- Full-text index of messages keyed by "MessageSearchDocument"."id", holding a copy
+-- of subjects and bodies, and the IDs of senders and recipients without hyphens in
+-- "parties", to scope searches to one email address, see services/search_services.py.
+CREATE VIRTUAL TABLE "MessageSearch" USING fts5(
+    "messageId" UNINDEXED, "parties", "subject", "body",
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- CreateTrigger
+-- a document is added once the recipients of its message are inserted
+CREATE TRIGGER "MessageSearchDocument_insert" AFTER INSERT ON "MessageSearchDocument"
+BEGIN
+    INSERT INTO "MessageSearch" (rowid, "messageId", "parties", "subject", "body")
+    SELECT new."id", m."id",
+        replace(m."fromId", '-', '') || COALESCE(
+            (SELECT ' ' || group_concat(replace(r."emailId", '-', ''), ' ')
+            FROM "MessageRecipient" r WHERE r."messageId" = m."id"), ''
+        ),
+        m."subject", m."body"
+    FROM "Message" m WHERE m."id" = new."messageId";
+END;
+
+-- CreateTrigger
+-- documents are deleted with their message
+CREATE TRIGGER "MessageSearchDocument_delete" AFTER DELETE ON "MessageSearchDocument"
+BEGIN
+    DELETE FROM "MessageSearch" WHERE rowid = old."id";
+END;
+
+-- FillVirtualTable
+INSERT INTO "MessageSearchDocument" ("messageId") SELECT "id" FROM "Message";
@@ -0,0 +1,46 @@
+-- align "Message" and "MessageRecipient" with schema.prisma on every database,
+-- whatever created it: no "deleted_by_receiver", deletion by recipients flagged
+-- on "MessageRecipient", recipients deleted with their message and unique per
+-- message. Tables are rebuilt rather than altered, so running it again on an
+-- aligned database leaves it unchanged.
+
+-- RedefineTables
+PRAGMA defer_foreign_keys=ON;
+PRAGMA foreign_keys=OFF;
+-- the search triggers read "Message": without the legacy mode, renaming the new
+-- table fails while "Message" is dropped
+PRAGMA legacy_alter_table=ON;
+DROP TABLE IF EXISTS "new_Message";
+CREATE TABLE "new_Message" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "subject" TEXT,
+    "body" TEXT NOT NULL,
+    "sentAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "fromId" TEXT NOT NULL,
+    "deleted_by_sender" BOOLEAN NOT NULL DEFAULT false,
+    CONSTRAINT "Message_fromId_fkey" FOREIGN KEY ("fromId") REFERENCES "Email" ("id") ON DELETE RESTRICT ON UPDATE CASCADE
+);
+INSERT INTO "new_Message" ("id", "subject", "body", "sentAt", "fromId", "deleted_by_sender") SELECT "id", "subject", "body", "sentAt", "fromId", "deleted_by_sender" FROM "Message";
+DROP TABLE "Message";
+ALTER TABLE "new_Message" RENAME TO "Message";
+CREATE INDEX "Message_fromId_sentAt_id_idx" ON "Message"("fromId", "sentAt", "id");
+CREATE INDEX "Message_sentAt_id_idx" ON "Message"("sentAt", "id");
+DROP TABLE IF EXISTS "new_MessageRecipient";
+CREATE TABLE "new_MessageRecipient" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "messageId" TEXT NOT NULL,
+    "emailId" TEXT NOT NULL,
+    "deletes_message" BOOLEAN NOT NULL DEFAULT false,
+    "read" BOOLEAN NOT NULL DEFAULT false,
+    "type" TEXT NOT NULL,
+    CONSTRAINT "MessageRecipient_messageId_fkey" FOREIGN KEY ("messageId") REFERENCES "Message" ("id") ON DELETE CASCADE ON UPDATE CASCADE,
+    CONSTRAINT "MessageRecipient_emailId_fkey" FOREIGN KEY ("emailId") REFERENCES "Email" ("id") ON DELETE RESTRICT ON UPDATE CASCADE
+);
+INSERT INTO "new_MessageRecipient" ("id", "messageId", "emailId", "deletes_message", "read", "type") SELECT "id", "messageId", "emailId", "deletes_message", "read", "type" FROM "MessageRecipient";
+DROP TABLE "MessageRecipient";
+ALTER TABLE "new_MessageRecipient" RENAME TO "MessageRecipient";
+CREATE UNIQUE INDEX "MessageRecipient_messageId_emailId_key" ON "MessageRecipient"("messageId", "emailId");
+CREATE INDEX "MessageRecipient_emailId_deletes_message_messageId_idx" ON "MessageRecipient"("emailId", "deletes_message", "messageId");
+PRAGMA legacy_alter_table=OFF;
+PRAGMA foreign_keys=ON;
+PRAGMA defer_foreign_keys=OFF;
@@ -0,0 +1,139 @@
+-- versions of data, used as entity tags of responses, see
+-- services/versions_services.py. Triggers increase them in the transaction of
+-- each write, whatever process or tool makes it. Message details share 4096
+-- keys, from the first three hex digits of their ID. Running it again leaves the
+-- database unchanged.
+
+-- CreateTable
+CREATE TABLE IF NOT EXISTS "DataVersion" (
+    "key" TEXT NOT NULL PRIMARY KEY,
+    "version" INTEGER NOT NULL DEFAULT 0
+);
+
+-- random epoch of the database, so that tags of a recreated database never match
+INSERT INTO "DataVersion" ("key", "version") VALUES ('epoch', abs(random() % 4294967296))
+ON CONFLICT ("key") DO NOTHING;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "User_insert_version" AFTER INSERT ON "User"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('users', 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "User_update_version" AFTER UPDATE ON "User"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('users', 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "User_delete_version" AFTER DELETE ON "User"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('users', 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+-- the user list embeds email addresses
+CREATE TRIGGER IF NOT EXISTS "Email_insert_version" AFTER INSERT ON "Email"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    VALUES ('users', 1), ('user_emails:' || new."userId", 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+-- messages of all mailboxes embed addresses, "addresses" versions them all
+CREATE TRIGGER IF NOT EXISTS "Email_update_version" AFTER UPDATE ON "Email"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    SELECT "key", 1 FROM (
+        SELECT 'users' AS "key" UNION SELECT 'addresses'
+        UNION SELECT 'user_emails:' || old."userId"
+        UNION SELECT 'user_emails:' || new."userId"
+    ) WHERE true
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "Email_delete_version" AFTER DELETE ON "Email"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    VALUES ('users', 1), ('addresses', 1), ('user_emails:' || old."userId", 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+-- mailbox listings and counters are read from entries, and counters only change
+-- with them, so they are versioned by entries
+CREATE TRIGGER IF NOT EXISTS "MailboxEntry_insert_version" AFTER INSERT ON "MailboxEntry"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('mailbox:' || new."emailId", 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "MailboxEntry_update_version" AFTER UPDATE ON "MailboxEntry"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('mailbox:' || new."emailId", 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "MailboxEntry_delete_version" AFTER DELETE ON "MailboxEntry"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version") VALUES ('mailbox:' || old."emailId", 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+-- deletion flags and read states are shown in listings of all parties
+CREATE TRIGGER IF NOT EXISTS "Message_update_version" AFTER UPDATE ON "Message"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    SELECT "key", 1 FROM (
+        SELECT 'message:' || substr(new."id", 1, 3) AS "key"
+        UNION SELECT 'mailbox:' || new."fromId"
+        UNION SELECT 'mailbox:' || "emailId" FROM "MessageRecipient"
+        WHERE "messageId" = new."id"
+    ) WHERE true
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+-- entries of the message are deleted with it, which changes its mailboxes
+CREATE TRIGGER IF NOT EXISTS "Message_delete_version" AFTER DELETE ON "Message"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    VALUES ('message:' || substr(old."id", 1, 3), 1)
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "MessageRecipient_update_version" AFTER UPDATE ON "MessageRecipient"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    SELECT "key", 1 FROM (
+        SELECT 'message:' || substr(new."messageId", 1, 3) AS "key"
+        UNION SELECT 'mailbox:' || "fromId" FROM "Message" WHERE "id" = new."messageId"
+        UNION SELECT 'mailbox:' || "emailId" FROM "MessageRecipient"
+        WHERE "messageId" = new."messageId"
+    ) WHERE true
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- CreateTrigger
+CREATE TRIGGER IF NOT EXISTS "MessageRecipient_delete_version" AFTER DELETE ON "MessageRecipient"
+BEGIN
+    INSERT INTO "DataVersion" ("key", "version")
+    SELECT "key", 1 FROM (
+        SELECT 'message:' || substr(old."messageId", 1, 3) AS "key"
+        UNION SELECT 'mailbox:' || old."emailId"
+        UNION SELECT 'mailbox:' || "fromId" FROM "Message" WHERE "id" = old."messageId"
+        UNION SELECT 'mailbox:' || "emailId" FROM "MessageRecipient"
+        WHERE "messageId" = old."messageId"
+    ) WHERE true
+    ON CONFLICT ("key") DO UPDATE SET "version" = "version" + 1;
+END;
@@ -0,0 +1,5 @@
+-- changes older than the retention are pruned by creation date, see
+-- services/changes_services.py
+
+-- CreateIndex
+CREATE INDEX IF NOT EXISTS "MailboxChange_createdAt_idx" ON "MailboxChange"("createdAt");
@@ -3,7 +3,7 @@ Module that manages app config creation.
 """
 
 from logging import Logger
-from typing import Optional
+from typing import Literal, Optional
 from dotenv import dotenv_values
 from pydantic import BaseModel, ValidationError, Field
 
@@ -32,7 +32,38 @@ class EnvData(BaseModel):
     encryption_key: Optional[str] = Field(default=_DEFAULT_ENCRYPTION_KEY_VALUE)
     access_token_duration_minutes: int
     refresh_token_duration_hours: int
+    # tickets replace access tokens in the query string of new message streams
+    stream_ticket_duration_seconds: int = Field(default=60, ge=1)
     access_token_invalid_timeout_minutes: int
+    hash_workers: int = Field(default=4, ge=1)
+    hash_max_pending: int = Field(default=64, ge=1)
+    hash_queue_timeout_seconds: float = Field(default=5.0, gt=0)
+    user_cache_max_size: int = Field(default=1024, ge=1)
+    user_cache_ttl_seconds: float = Field(default=60.0, ge=0)
+    push_max_pending: int = Field(default=100, ge=1)
+    push_keepalive_seconds: float = Field(default=15.0, gt=0)
+    # older changes are pruned from the change log, their cursors must resync
+    mailbox_changes_retention_days: float = Field(default=30.0, gt=0)
+    database_url: str = Field(default="file:./dev.db")
+    database_connection_limit: Optional[int] = Field(default=None, ge=1)
+    database_pool_timeout_seconds: Optional[float] = Field(default=None, ge=0)
+    sqlite_busy_timeout_seconds: float = Field(default=5.0, gt=0)
+    # SQL of each query is written to the output of the query engine
+    prisma_log_queries: bool = Field(default=False)
+    sqlite_journal_mode: Optional[Literal["DELETE", "TRUNCATE", "PERSIST", "WAL"]] = (
+        Field(default="WAL")
+    )
+    fast_json_responses: bool = Field(default=False)
+    compression_min_size: int = Field(default=1024, ge=0)
+    compression_gzip_level: int = Field(default=6, ge=1, le=9)
+    compression_brotli_quality: int = Field(default=4, ge=0, le=11)
+    query_budget_mode: Literal["off", "warn", "raise"] = Field(default="off")
+    query_budget_max_queries: int = Field(default=20, ge=1)
+    query_budget_max_repeats: int = Field(default=5, ge=1)
+    # admin features (profiling, memory snapshots) are disabled without a token
+    admin_token: Optional[str] = Field(default=None, min_length=16)
+    profiling_enabled: bool = Field(default=False)
+    profiling_dir: str = Field(default="logs/profiles")
 
 
 class Config(BaseModel):
@@ -0,0 +1,78 @@
+"""
+Module that provides logging handlers and formatters used by `logger_config.yaml`.
+"""
+
+from datetime import datetime, timezone
+from json import dumps
+from logging import Formatter, LogRecord
+from logging.handlers import QueueHandler
+from queue import Empty, Full, Queue
+from typing import Literal
+
+DropPolicy = Literal["drop_new", "drop_oldest"]
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Handler putting records in a bounded queue, emptied by a listener thread.
+
+    Logging never blocks the caller: when the queue is full, the new record or the
+    oldest queued record is dropped, depending on the drop policy.
+    """
+
+    def __init__(self, max_size: int, drop_policy: DropPolicy = "drop_new"):
+        super().__init__(Queue(maxsize=max_size))
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def enqueue(self, record: LogRecord) -> None:
+        """
+        Put a record in the queue, or drop a record if the queue is full.
+
+        Args:
+            record: Record prepared for the listener.
+
+        Returns:
+
+        """
+        try:
+            self.queue.put_nowait(record)
+            return
+        except Full:
+            self.dropped += 1
+
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (Empty, Full):
+                # the listener or another thread emptied or filled the queue meanwhile
+                pass
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get usage counters of the queue.
+
+        Returns:
+            dict[str, int]: Number of records queued and dropped.
+        """
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+class JsonFormatter(Formatter):
+    """
+    Formatter writing each record as a JSON object on one line.
+    """
+
+    def format(self, record: LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps(entry, ensure_ascii=False)
@@ -2,11 +2,20 @@
 Module that manages app logger creation.
 """
 
+from atexit import register
 from logging import Logger, getLogger, root
 from logging.config import dictConfig
+from logging.handlers import QueueListener
+from typing import Any, Optional
 from yaml import safe_load
 from yaml.error import YAMLError
 
+from config.log_handlers import BoundedQueueHandler
+
+_queue_handler: Optional[BoundedQueueHandler] = None
+_queue_listener: Optional[QueueListener] = None
+_listener_running = False
+
 
 class CannotCreateLoggerException(Exception):
     """
@@ -44,10 +53,95 @@ def create_logger(config_file_path: str, logger_name: str) -> Logger:
         raise CannotCreateLoggerException(error) from error
 
     # create logger
+    queue_config = logger_config.pop("queue", None)
     dictConfig(logger_config)
+    if queue_config and queue_config.get("enabled", True):
+        configure_log_queue(queue_config)
 
     # return logger if exists
     if logger_name in root.manager.loggerDict:  # pylint: disable=E1101
         return getLogger(logger_name)
 
     raise LoggerNotFound(f"Logger {logger_name} not found")
+
+
+def configure_log_queue(queue_config: dict[str, Any]) -> None:
+    """
+    Move the handlers of loggers behind a bounded queue, and start its listener thread.
+
+    Records are then written to files and streams by the listener thread, instead
+    of the thread logging them, e.g. the event loop.
+
+    Args:
+        queue_config: `queue` section of the logger configuration, with the
+            `loggers` to move, the queue `max_size` and its `drop_policy`.
+
+    Returns:
+
+    """
+    global _queue_handler, _queue_listener  # pylint: disable=W0603
+
+    stop_log_listener()
+    _queue_handler = BoundedQueueHandler(
+        queue_config.get("max_size", 10000), queue_config.get("drop_policy", "drop_new")
+    )
+
+    handlers = []
+    for logger_name in queue_config.get("loggers", []):
+        logger = getLogger(logger_name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            if handler not in handlers:
+                handlers.append(handler)
+        logger.addHandler(_queue_handler)
+
+    _queue_listener = QueueListener(
+        _queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    start_log_listener()
+
+
+def start_log_listener() -> None:
+    """
+    Start the listener thread of the log queue, if logs are queued and it is stopped.
+
+    Returns:
+
+    """
+    global _listener_running  # pylint: disable=W0603
+
+    if _queue_listener is not None and not _listener_running:
+        _queue_listener.start()
+        _listener_running = True
+
+
+def stop_log_listener() -> None:
+    """
+    Stop the listener thread of the log queue, once queued records are written.
+
+    Returns:
+
+    """
+    global _listener_running  # pylint: disable=W0603
+
+    if _queue_listener is not None and _listener_running:
+        _queue_listener.stop()
+        _listener_running = False
+
+
+def get_log_queue_stats() -> dict[str, int]:
+    """
+    Get usage counters of the log queue.
+
+    Returns:
+        dict[str, int]: Number of records queued and dropped, zero if logs are not
+            queued.
+    """
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+
+    return _queue_handler.stats()
+
+
+# write queued records if the app is not stopped through its lifespan, e.g. scripts
+register(stop_log_listener)
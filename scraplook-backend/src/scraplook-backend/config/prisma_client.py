@@ -2,12 +2,126 @@
 Module that manages db connection with prisma and singleton method.
 """
 
-from typing import Optional
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from pydantic import BaseModel
 from prisma import Prisma
 
+from config.app_config import EnvData, get_app_config
+from utils.metrics import get_request_queries, observe_query
+from utils.query_budget import record_query_shape
+
 _db_connection: Optional[Prisma] = None
 
 
+class InstrumentedPrisma(Prisma):
+    """
+    Prisma client timing each query, by kind, and counting it in the current request.
+
+    Transactions copy the client with its class, so their queries are timed too.
+    When the request traces query shapes, they are checked against its query budget.
+    """
+
+    __slots__ = ()
+
+    async def _execute(
+        self,
+        *,
+        method: str,
+        arguments: dict[str, Any],
+        model: Optional[type[BaseModel]] = None,
+        root_selection: Optional[list[str]] = None,
+    ) -> Any:
+        queries = get_request_queries()
+        if queries is not None and queries.shapes is not None:
+            record_query_shape(queries, method, model, arguments)
+
+        start = perf_counter()
+        try:
+            return await super()._execute(
+                method=method,
+                arguments=arguments,
+                model=model,
+                root_selection=root_selection,
+            )
+        finally:
+            # e.g. `Message.find_many`, or `MessageSummary.query_raw`
+            name = method if model is None else f"{model.__name__}.{method}"
+            observe_query(name, perf_counter() - start)
+
+
+def is_sqlite_url(url: str) -> bool:
+    """
+    Indicate if a datasource url targets a SQLite database.
+
+    Args:
+        url: Datasource url.
+
+    Returns:
+        bool: True for a SQLite database file.
+    """
+    return url.startswith(("file:", "sqlite:"))
+
+
+def build_datasource_url(env_data: EnvData) -> str:
+    """
+    Build the datasource url from the environment, with its connection pool settings.
+
+    Settings already written in the url query string are kept. Relative SQLite
+    paths are resolved from the working directory, which holds `schema.prisma`.
+
+    The pool size only sets how many queries run at once: SQLite still lets a
+    single transaction write at a time, the others waiting for its lock up to the
+    busy timeout. The change log of mailboxes relies on it, as its sequence numbers
+    must follow commit order (see `services.changes_services`): a database letting
+    transactions write concurrently would need another ordering.
+
+    Args:
+        env_data: Environment variables.
+
+    Returns:
+        str: Datasource url passed to the query engine.
+    """
+    url, _, query = env_data.database_url.partition("?")
+    parameters: dict[str, str] = {}
+
+    if env_data.database_connection_limit is not None:
+        parameters["connection_limit"] = str(env_data.database_connection_limit)
+    if env_data.database_pool_timeout_seconds is not None:
+        parameters["pool_timeout"] = f"{env_data.database_pool_timeout_seconds:g}"
+
+    if is_sqlite_url(url):
+        path = url.split(":", 1)[1]
+        url = f"file:{Path(path).resolve()}"
+        # the query engine uses it as the busy timeout of each connection
+        parameters["socket_timeout"] = f"{env_data.sqlite_busy_timeout_seconds:g}"
+
+    parameters.update(parse_qsl(query))
+    return f"{url}?{urlencode(parameters)}" if parameters else url
+
+
+async def configure_sqlite(prisma: Prisma, env_data: EnvData) -> None:
+    """
+    Apply SQLite settings stored in the database file.
+
+    Settings scoped to a connection (such as `synchronous`) are not applied, as
+    queries are spread over the connections of the query engine pool.
+
+    Args:
+        prisma: DB connection.
+        env_data: Environment variables.
+
+    Returns:
+
+    """
+    if env_data.sqlite_journal_mode is not None:
+        # WAL lets readers run while a writer commits, and persists in the file
+        await prisma.query_raw(f"PRAGMA journal_mode = {env_data.sqlite_journal_mode}")
+
+
 async def get_prisma_instance() -> Prisma:
     """
     Return prisma instance if available, otherwise create a new instance and return it.
@@ -18,9 +132,16 @@ async def get_prisma_instance() -> Prisma:
     global _db_connection  # pylint: disable=W0603
 
     if _db_connection is None or not _db_connection.is_connected():
-        _db_connection = Prisma()
+        env_data = get_app_config().env_data
+        _db_connection = InstrumentedPrisma(
+            datasource={"url": build_datasource_url(env_data)},
+            log_queries=env_data.prisma_log_queries,
+        )
         await _db_connection.connect()
 
+        if is_sqlite_url(env_data.database_url):
+            await configure_sqlite(_db_connection, env_data)
+
     return _db_connection
 
 
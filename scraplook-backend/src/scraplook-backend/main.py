@@ -2,20 +2,29 @@
 Main module to manage FastAPI server.
 """
 
+from asyncio import create_task
 from contextlib import asynccontextmanager
 from logging import getLogger
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from routes import (
+    admin_route,
     email_address_route,
     messages_route,
+    metrics_route,
     user_route,
     seeder_route,
     auth_route,
 )
 from config.app_config import get_app_config, AppConfigNotCreatedException
+from config.logger import start_log_listener, stop_log_listener
 from config.prisma_client import get_prisma_instance, disconnect_prisma
+from middlewares.compression import CompressionMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.profiling import ProfilingMiddleware
+from services.changes_services import prune_mailbox_changes_periodically
+from utils.hash import shutdown_hash_pool
 
 
 # manage app lifespan events
@@ -30,16 +39,24 @@ async def lifespan(_: FastAPI):
     except AppConfigNotCreatedException as error:
         raise RuntimeError(error) from error
 
+    # write logs queued by the event loop from a listener thread
+    start_log_listener()
     app_config.logger.info("Starting application...")
 
     # start db connection
-    await get_prisma_instance()
+    prisma = await get_prisma_instance()
+
+    # prune the change log of mailboxes in the background
+    pruning = create_task(prune_mailbox_changes_periodically(prisma))
 
     yield
 
+    pruning.cancel()
     # disconnect to db
     await disconnect_prisma()
+    shutdown_hash_pool()
     app_config.logger.info("Application stopping ...")
+    stop_log_listener()
 
 
 # create server
@@ -54,6 +71,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# compress large responses
+env_data = get_app_config().env_data
+app.add_middleware(
+    CompressionMiddleware,
+    min_size=env_data.compression_min_size,
+    gzip_level=env_data.compression_gzip_level,
+    brotli_quality=env_data.compression_brotli_quality,
+)
+
+# profile requests flagged by an admin, only added when enabled
+if env_data.profiling_enabled and env_data.admin_token is not None:
+    app.add_middleware(
+        ProfilingMiddleware,
+        admin_token=env_data.admin_token,
+        directory=env_data.profiling_dir,
+    )
+
+# measure requests, outermost to include compression in latencies and sizes
+app.add_middleware(MetricsMiddleware, query_budget_mode=env_data.query_budget_mode)
+
 # update logger used
 uvicorn_access_logger = getLogger("uvicorn.access")
 uvicorn_access_logger.disabled = False
@@ -64,3 +101,5 @@ app.include_router(email_address_route.router)
 app.include_router(messages_route.router)
 app.include_router(user_route.router)
 app.include_router(auth_route.router)
+app.include_router(metrics_route.router)
+app.include_router(admin_route.router)
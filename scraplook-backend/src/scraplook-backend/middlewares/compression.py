@@ -0,0 +1,295 @@
+"""
+Middleware module to compress responses with gzip or brotli.
+
+The encoding is negotiated with the `Accept-Encoding` header of the request,
+brotli being preferred. Complete responses smaller than a threshold are sent as
+is, as compression would not save a round trip. Streaming responses are
+compressed chunk by chunk, the compressor being flushed after each chunk so the
+client receives it at once.
+"""
+
+from typing import Optional, Union
+from zlib import Z_SYNC_FLUSH, compressobj
+
+from brotli import MODE_TEXT, Compressor
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# encodings supported, by order of preference
+ENCODINGS = ("br", "gzip")
+# responses already compressed, or needing to reach the client unbuffered
+EXCLUDED_MEDIA_TYPES = ("text/event-stream", "application/gzip")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Choose the encoding of a response from the `Accept-Encoding` header.
+
+    Args:
+        accept_encoding: Header value, e.g. `gzip, deflate, br;q=0.9`.
+
+    Returns:
+        Optional[str]: Supported encoding with the highest weight, None if the
+            client accepts none of them.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        weight = 1.0
+        name, _, value = parameters.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = weight
+
+    default = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class GzipCompressor:
+    """
+    Incremental gzip compressor, flushed after each chunk.
+    """
+
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        self._compressor = compressobj(level, wbits=31)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a chunk of the body.
+
+        Args:
+            data: Chunk to compress.
+
+        Returns:
+            bytes: Compressed data, decodable without the next chunks.
+        """
+        return self._compressor.compress(data) + self._compressor.flush(Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """
+        End the compressed body.
+
+        Returns:
+            bytes: Last compressed data.
+        """
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    """
+    Incremental brotli compressor, flushed after each chunk.
+    """
+
+    def __init__(self, quality: int):
+        self._compressor = Compressor(mode=MODE_TEXT, quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a chunk of the body.
+
+        Args:
+            data: Chunk to compress.
+
+        Returns:
+            bytes: Compressed data, decodable without the next chunks.
+        """
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        """
+        End the compressed body.
+
+        Returns:
+            bytes: Last compressed data.
+        """
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses.
+
+    Responses already encoded, Server-Sent Events and gzip files are never
+    compressed.
+    """
+
+    def __init__(
+        self, app: ASGIApp, min_size: int, gzip_level: int, brotli_quality: int
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """
+    Wrapper of the `send` callable of a request, compressing its response.
+
+    The start of the response is held until its first body chunk is known, to
+    decide if the response is compressed.
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.inner_send = send
+        self.start_message: Message = {}
+        self.compressor: Optional[Union[GzipCompressor, BrotliCompressor]] = None
+        self.passthrough = False
+
+    def _create_compressor(self) -> Union[GzipCompressor, BrotliCompressor]:
+        """
+        Create a compressor for the negotiated encoding.
+
+        Returns:
+            Union[GzipCompressor, BrotliCompressor]: New compressor.
+        """
+        if self.encoding == "br":
+            return BrotliCompressor(self.middleware.brotli_quality)
+        return GzipCompressor(self.middleware.gzip_level)
+
+    def _is_excluded(self, headers: Headers) -> bool:
+        """
+        Check if a response must be sent as is, from its headers.
+
+        Args:
+            headers: Headers of the response.
+
+        Returns:
+            bool: True if the response must not be compressed.
+        """
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return "content-encoding" in headers or media_type in EXCLUDED_MEDIA_TYPES
+
+    def _start_compressed(self, content_length: Optional[int]) -> Message:
+        """
+        Update the held response start for a compressed body.
+
+        Args:
+            content_length: Length of the compressed body, None if streamed.
+
+        Returns:
+            Message: Response start to send.
+        """
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        # the compressed body is another representation: its tag can only be weak
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return self.start_message
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        """
+        Decide if a response is compressed, from its start and first body chunk.
+
+        Args:
+            body: First chunk of the body.
+            more_body: Indicates if other chunks follow.
+
+        Returns:
+            bool: True if the response is compressed.
+        """
+        if self._is_excluded(Headers(raw=self.start_message["headers"])):
+            return False
+        # small or empty complete bodies (e.g. 304) are not worth compressing
+        return more_body or len(body) >= max(self.middleware.min_size, 1)
+
+    async def _send_passthrough(self, message: Message) -> None:
+        """
+        Send the held response start and a body chunk as is, as well as the next
+        chunks.
+
+        Args:
+            message: First body message of the response.
+
+        Returns:
+
+        """
+        self.passthrough = True
+        await self.inner_send(self.start_message)
+        await self.inner_send(message)
+
+    async def _send_first_body(self, message: Message) -> bool:
+        """
+        Send the held response start with the first body chunk, compressed if
+        needed.
+
+        Args:
+            message: First body message of the response.
+
+        Returns:
+            bool: True if the chunk is sent, False if it is left to the compressor
+                created for the stream.
+        """
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if not self._should_compress(body, more_body):
+            await self._send_passthrough(message)
+            return True
+
+        self.compressor = self._create_compressor()
+        if not more_body:
+            compressed = self.compressor.compress(body) + self.compressor.finish()
+            await self.inner_send(self._start_compressed(len(compressed)))
+            await self.inner_send({**message, "body": compressed})
+            return True
+
+        await self.inner_send(self._start_compressed(None))
+        return False
+
+    async def send(self, message: Message) -> None:
+        """
+        Send a message of the response, compressing its body if needed.
+
+        Args:
+            message: ASGI message sent by the app.
+
+        Returns:
+
+        """
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.inner_send(message)
+            return
+
+        if self.compressor is None and await self._send_first_body(message):
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        compressed = self.compressor.compress(body) if body else b""
+        if not more_body:
+            compressed += self.compressor.finish()
+        await self.inner_send({**message, "body": compressed, "more_body": more_body})
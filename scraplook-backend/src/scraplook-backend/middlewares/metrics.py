@@ -0,0 +1,160 @@
+"""
+Middleware module to record the count, latency, response size and DB queries of
+requests, by route.
+
+Requests are labeled with the path template of the route they matched, e.g.
+`/messages/{id_message}`, so that the number of series does not grow with IDs.
+Requests matching no route are labeled `unmatched`. The latency includes the
+sending of the response body, and the size is the one sent on the wire.
+
+Unless `query_budget_mode` is `off`, the shapes of DB queries are traced too, and
+in `warn` mode requests exceeding their query budget are logged.
+
+While memory is traced by an admin, the peak of traced memory of message requests
+is recorded, above the memory traced when they start. The peak is shared by the
+whole process, so it is only measured for requests handled alone: a request is
+measured if no other request is in flight when it starts, and its measure is
+dropped if another request starts before it ends. Streams, idle most of the time,
+are not counted as requests in flight.
+"""
+
+import tracemalloc
+from time import perf_counter
+from typing import Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.memory import reset_traced_peak
+from utils.metrics import RequestQueries, end_request, start_request
+from utils.query_budget import warn_budget_violations
+
+UNMATCHED_ROUTE = "unmatched"
+# paths of the requests whose memory peak is recorded, but streams that never end
+MEMORY_PATH_PREFIXES = ("/messages",)
+MEMORY_EXCLUDED_PATHS = ("/messages/stream",)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording metrics of HTTP requests, see `utils.metrics`.
+    """
+
+    def __init__(self, app: ASGIApp, query_budget_mode: str = "off"):
+        self.app = app
+        self.query_budget_mode = query_budget_mode
+        # requests in flight and requests started, streams excluded, to measure
+        # memory peaks of requests handled alone
+        self.requests_in_flight = 0
+        self.requests_started = 0
+
+    def _start_memory_measure(self, path: str) -> Optional[tuple[int, int]]:
+        """
+        Count a request in flight, and start measuring its memory peak if it is
+        handled alone while memory is traced.
+
+        Args:
+            path: Path of the request.
+
+        Returns:
+            Optional[tuple[int, int]]: Number of requests started and memory traced
+                when the measure starts, in bytes, None if it is not measured.
+        """
+        if path in MEMORY_EXCLUDED_PATHS:
+            return None
+
+        self.requests_in_flight += 1
+        self.requests_started += 1
+        if (
+            not tracemalloc.is_tracing()
+            or self.requests_in_flight > 1
+            or not path.startswith(MEMORY_PATH_PREFIXES)
+        ):
+            return None
+
+        reset_traced_peak()
+        return self.requests_started, tracemalloc.get_traced_memory()[0]
+
+    def _end_memory_measure(
+        self, path: str, measure: Optional[tuple[int, int]]
+    ) -> Optional[int]:
+        """
+        Uncount a request in flight, and get its memory peak if no other request
+        started meanwhile.
+
+        Args:
+            path: Path of the request.
+            measure: Value returned by `_start_memory_measure`.
+
+        Returns:
+            Optional[int]: Peak of memory allocated while handling the request, in
+                bytes, None if it was not measured.
+        """
+        if path not in MEMORY_EXCLUDED_PATHS:
+            self.requests_in_flight -= 1
+        if measure is None or not tracemalloc.is_tracing():
+            return None
+
+        started, memory_start = measure
+        if self.requests_started != started:
+            return None
+        return max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+
+    def _record(
+        self,
+        scope: Scope,
+        response: dict[str, int],
+        seconds: float,
+        queries: RequestQueries,
+        memory_peak: Optional[int],
+    ) -> None:
+        """
+        Record the metrics of a request handled, and warn if it exceeded its query
+        budget.
+
+        Args:
+            scope: Scope of the request.
+            response: Status and number of body bytes of the response.
+            seconds: Time taken to send the response.
+            queries: DB queries of the request.
+            memory_peak: Peak of memory allocated while handling the request, in
+                bytes, None if it was not measured.
+
+        Returns:
+
+        """
+        # the router stores the route matched in the scope
+        route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+        end_request(
+            scope["method"],
+            route,
+            response["status"],
+            seconds,
+            response["size"],
+            queries,
+            memory_peak,
+        )
+        if self.query_budget_mode == "warn":
+            warn_budget_violations(scope["method"], route, queries)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        queries = start_request(trace_shapes=self.query_budget_mode != "off")
+        response = {"status": 500, "size": 0}
+        measure = self._start_memory_measure(scope["path"])
+
+        async def send_measured(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            memory_peak = self._end_memory_measure(scope["path"], measure)
+            self._record(scope, response, perf_counter() - start, queries, memory_peak)
@@ -0,0 +1,100 @@
+"""
+Middleware module to profile single requests on demand, with cProfile.
+
+A request is profiled when it has the `X-Profile: 1` header or the `profile=1`
+query parameter, and the admin token in the `X-Admin-Token` header. Its whole
+handling is profiled, from authentication to the sending of the response body,
+and the profile is written as a pstats file in the profiling directory. The file
+name is returned in the `X-Profile-File` header. It can be read with `pstats`, or
+rendered as a flame graph, e.g. with `flameprof` or `snakeviz`.
+
+cProfile traces the event loop thread: tasks running concurrently with the
+profiled request are in its profile too, while work sent to thread pools (e.g.
+password hashing) is not. One request is profiled at a time.
+
+The middleware is only added to the app when profiling is enabled, so it costs
+nothing otherwise.
+"""
+
+from cProfile import Profile
+from datetime import datetime
+from pathlib import Path
+from re import sub
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.admin import ADMIN_TOKEN_HEADER, is_admin_token
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAMETER = "profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests flagged by an admin.
+    """
+
+    def __init__(self, app: ASGIApp, admin_token: str, directory: str):
+        self.app = app
+        self.admin_token = admin_token
+        self.directory = Path(directory)
+        self._profiling = False
+
+    def _is_profiled(self, scope: Scope) -> bool:
+        """
+        Check if a request asks to be profiled, with the admin token.
+
+        Args:
+            scope: Request scope.
+
+        Returns:
+            bool: True if the request must be profiled.
+        """
+        headers = Headers(scope=scope)
+        flagged = headers.get(PROFILE_HEADER) == "1" or (
+            (PROFILE_QUERY_PARAMETER, "1")
+            in parse_qsl(scope.get("query_string", b"").decode("latin-1"))
+        )
+        return flagged and is_admin_token(
+            self.admin_token, headers.get(ADMIN_TOKEN_HEADER)
+        )
+
+    def _profile_path(self, scope: Scope) -> Path:
+        """
+        Build the path of the profile file of a request.
+
+        Args:
+            scope: Request scope.
+
+        Returns:
+            Path: Profile file, named after the date, method and path of the request.
+        """
+        path = sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        date = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return self.directory / f"{date}_{scope['method']}_{path[:80]}.pstats"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._profiling or not self._is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_path = self._profile_path(scope)
+
+        async def send_with_profile_file(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[PROFILE_FILE_HEADER] = profile_path.name
+            await send(message)
+
+        self._profiling = True
+        profile = Profile()
+        try:
+            profile.enable()
+            await self.app(scope, receive, send_with_profile_file)
+        finally:
+            profile.disable()
+            self._profiling = False
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(profile_path)
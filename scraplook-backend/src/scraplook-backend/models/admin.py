@@ -0,0 +1,41 @@
+"""
+Module that contains admin models, to inspect the memory of the app.
+"""
+
+from pydantic import BaseModel
+
+
+class MemoryTracingStatus(BaseModel):
+    """
+    Model to store the state of memory tracing, sent to a client.
+    """
+
+    tracing: bool
+    frames: int
+    # size of traced memory blocks, in bytes
+    traced_current: int
+    traced_peak: int
+
+
+class AllocationSite(BaseModel):
+    """
+    Model to store the memory allocated by a site between two snapshots, sent to a
+    client.
+    """
+
+    # `file:line` of each frame, the most recent call first
+    traceback: list[str]
+    size: int
+    size_diff: int
+    count: int
+    count_diff: int
+
+
+class MemorySnapshotDiff(BaseModel):
+    """
+    Model to store the comparison of a memory snapshot with the previous one, sent
+    to a client.
+    """
+
+    status: MemoryTracingStatus
+    sites: list[AllocationSite]
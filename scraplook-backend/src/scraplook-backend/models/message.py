@@ -2,8 +2,13 @@
 Module that contains all message models.
 """
 
-from typing import Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+from prisma.models import MailboxChange, Message
+
+# number of body characters kept in message summaries
+SNIPPET_LENGTH = 120
 
 
 class MessageRecipientInput(BaseModel):
@@ -24,3 +29,132 @@ class MessageInput(BaseModel):
     body: str
     fromId: str
     recipients: list[MessageRecipientInput]
+
+
+class BatchMessageInput(BaseModel):
+    """
+    Model to store many messages to send at once, sent to an endpoint.
+    """
+
+    messages: list[MessageInput] = Field(min_length=1, max_length=10000)
+
+
+class BatchSendProgress(BaseModel):
+    """
+    Model to store the progress of a batch send, streamed by an endpoint.
+    """
+
+    sent: int
+    total: int
+    done: bool = False
+    error: Optional[str] = None
+
+
+class MessagePage(BaseModel):
+    """
+    Model to store a page of messages sent by an endpoint.
+    """
+
+    items: list[Message]
+    next_cursor: Optional[str] = None
+
+
+class MessageSummary(BaseModel):
+    """
+    Model to store the columns of a message displayed in a listing.
+    """
+
+    id: str
+    subject: Optional[str] = None
+    fromAddress: str
+    sentAt: datetime
+    snippet: str
+    recipientCount: int
+    # always true in the sent folder
+    read: bool
+
+
+class MessageSummaryPage(BaseModel):
+    """
+    Model to store a page of message summaries sent by an endpoint.
+    """
+
+    items: list[MessageSummary]
+    next_cursor: Optional[str] = None
+
+
+class MessageSearchResult(MessageSummary):
+    """
+    Model to store a message matching a search, with its relevance rank.
+
+    The lower the rank, the more relevant the message.
+    """
+
+    rank: float
+
+
+class MessageSearchPage(BaseModel):
+    """
+    Model to store a page of search results sent by an endpoint.
+    """
+
+    items: list[MessageSearchResult]
+    next_cursor: Optional[str] = None
+
+
+class BulkDeleteInput(BaseModel):
+    """
+    Model to store messages to delete from an email address, sent to an endpoint.
+
+    Messages are selected by ID, by sending date, or both.
+    """
+
+    id_email_address: str
+    id_messages: Optional[list[str]] = Field(default=None, max_length=1000)
+    sent_before: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_messages_selected(self) -> "BulkDeleteInput":
+        """
+        Check messages to delete are selected by ID or by sending date.
+
+        Returns:
+            BulkDeleteInput: Validated model.
+        """
+        if self.id_messages is None and self.sent_before is None:
+            raise ValueError("id_messages or sent_before must be given")
+        return self
+
+
+class BulkDeleteResult(BaseModel):
+    """
+    Model to store the outcome of a message deletion sent by an endpoint.
+
+    The status is `deleted` if the message is not visible anymore for the email address,
+    `purged` if it was also deleted completely, and `not_found` if it wasn't visible.
+    """
+
+    id: str
+    status: Literal["deleted", "purged", "not_found"]
+
+
+class ReadStateInput(BaseModel):
+    """
+    Model to store messages to mark as read or unread by an email address, sent to
+    an endpoint.
+    """
+
+    id_email_address: str
+    id_messages: list[str] = Field(min_length=1, max_length=1000)
+
+
+class MailboxChangePage(BaseModel):
+    """
+    Model to store changes of a mailbox, sent by an endpoint.
+    """
+
+    changes: list[MailboxChange]
+    next_since: int
+    has_more: bool
+    # changes after `since` were pruned: the mailbox must be reloaded
+    resync: bool = False
@@ -0,0 +1,67 @@
+"""
+Module that contains synthetic dataset models.
+"""
+
+from math import isfinite
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class SyntheticDatasetInput(BaseModel):
+    """
+    Model to store the scale of a synthetic dataset to generate, sent to an endpoint.
+
+    The same seed and scale always generate the same dataset.
+    """
+
+    seed: int = 0
+    users: int = Field(default=100, ge=1)
+    addresses_per_user: int = Field(default=2, ge=1)
+    messages_per_address: int = Field(default=100, ge=0)
+    # weight of each number of recipients: 1, 2, 3...
+    recipient_weights: list[float] = Field(
+        default=[0.6, 0.2, 0.1, 0.05, 0.05], min_length=1
+    )
+    # body sizes follow a log-normal distribution, bounded to `body_size_max`
+    body_size_median: int = Field(default=400, ge=1)
+    body_size_sigma: float = Field(default=1.0, ge=0)
+    body_size_max: int = Field(default=20000, ge=1)
+    # all users share this password, hashed once
+    password: str = "synthetic"
+    name_prefix: str = Field(default="synthetic", min_length=1)
+    # number of messages inserted per transaction
+    batch_size: int = Field(default=5000, ge=1, le=50000)
+
+    @field_validator("recipient_weights")
+    @classmethod
+    def check_recipient_weights(cls, recipient_weights: list[float]) -> list[float]:
+        """
+        Check recipient weights can be used to draw numbers of recipients.
+
+        Args:
+            recipient_weights: Weight of each number of recipients.
+
+        Returns:
+            list[float]: Validated weights.
+        """
+        if not all(isfinite(weight) and weight >= 0 for weight in recipient_weights):
+            raise ValueError("recipient_weights must be finite and non-negative")
+        if not any(weight > 0 for weight in recipient_weights):
+            raise ValueError("recipient_weights must have a positive weight")
+        return recipient_weights
+
+
+class SyntheticDatasetProgress(BaseModel):
+    """
+    Model to store the progress of a synthetic dataset generation, sent by an endpoint.
+    """
+
+    users: int = 0
+    email_addresses: int = 0
+    messages: int = 0
+    recipients: int = 0
+    total_messages: int
+    seconds: float = 0.0
+    done: bool = False
+    error: Optional[str] = None
@@ -18,6 +18,16 @@ class Token(BaseModel):
     token_type: str
 
 
+class StreamTicket(BaseModel):
+    """
+    Model to store a ticket opening a new message stream, sent to a client.
+    """
+
+    ticket: str
+    # lifetime of the ticket, in seconds
+    expires_in: int
+
+
 class UserInput(BaseModel):
     """
     Model to store user information sent to an endpoint.
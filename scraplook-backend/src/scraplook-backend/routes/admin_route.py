@@ -0,0 +1,161 @@
+"""
+Route module to inspect the memory of the app, reserved to admins.
+
+Admin routes require the admin token of `.env` in the `X-Admin-Token` header, and
+do not exist without one.
+"""
+
+from asyncio import to_thread
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, status, HTTPException, Header, Query
+
+from models.admin import AllocationSite, MemorySnapshotDiff, MemoryTracingStatus
+from config.app_config import get_app_config
+from utils.admin import ADMIN_TOKEN_HEADER, is_admin_token
+from utils.memory import (
+    GroupBy,
+    MemoryTracingNotStartedException,
+    diff_snapshot,
+    get_tracing_status,
+    start_tracing,
+    stop_tracing,
+)
+
+APP_CONFIG = get_app_config()
+
+MAX_FRAMES = 50
+MAX_SITES = 200
+
+
+async def verify_admin(
+    admin_token: Annotated[Optional[str], Header(alias=ADMIN_TOKEN_HEADER)] = None,
+) -> None:
+    """
+    Check that a request is sent by an admin.
+
+    Args:
+        admin_token: Admin token sent by the client.
+
+    Returns:
+
+    Raises:
+        HTTPException: 404 if admin features are disabled, 403 if the token is
+            missing or invalid.
+    """
+    if APP_CONFIG.env_data.admin_token is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    if not is_admin_token(APP_CONFIG.env_data.admin_token, admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Jeton d'administration invalide",
+        )
+
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(verify_admin)]
+)
+
+
+def _tracing_status() -> MemoryTracingStatus:
+    """
+    Get the state of memory tracing.
+
+    Returns:
+        MemoryTracingStatus: State of memory tracing.
+    """
+    tracing, frames, traced_current, traced_peak = get_tracing_status()
+    return MemoryTracingStatus(
+        tracing=tracing,
+        frames=frames,
+        traced_current=traced_current,
+        traced_peak=traced_peak,
+    )
+
+
+@router.get("/memory", status_code=status.HTTP_200_OK)
+async def get_memory_tracing() -> MemoryTracingStatus:
+    """
+    Endpoint to retrieve the state of memory tracing.
+
+    Returns:
+        MemoryTracingStatus: State of memory tracing.
+    """
+    return _tracing_status()
+
+
+@router.post("/memory/start", status_code=status.HTTP_200_OK)
+async def start_memory_tracing(
+    frames: Annotated[int, Query(ge=1, le=MAX_FRAMES)] = 10,
+) -> MemoryTracingStatus:
+    """
+    Endpoint to start tracing memory allocations, with a first snapshot.
+
+    Tracing slows allocations down, it should be stopped once done.
+
+    Args:
+        frames: Number of frames stored in the traceback of each allocation, more
+            to tell apart the callers of a site.
+
+    Returns:
+        MemoryTracingStatus: State of memory tracing.
+    """
+    await to_thread(start_tracing, frames)
+    APP_CONFIG.logger.warning("Memory tracing started (%d frames)", frames)
+    return _tracing_status()
+
+
+@router.post("/memory/snapshot", status_code=status.HTTP_200_OK)
+async def take_memory_snapshot(
+    group_by: Annotated[GroupBy, Query()] = "lineno",
+    limit: Annotated[int, Query(ge=1, le=MAX_SITES)] = 20,
+) -> MemorySnapshotDiff:
+    """
+    Endpoint to take a memory snapshot, and compare it with the previous one.
+
+    Args:
+        group_by: Grouping of the allocations: by file, line or whole traceback.
+        limit: Maximum number of allocation sites returned.
+
+    Returns:
+        MemorySnapshotDiff: Allocation sites, the largest size differences first.
+
+    Raises:
+        HTTPException: 409 if memory tracing is not started.
+    """
+    try:
+        statistics = await to_thread(diff_snapshot, group_by, limit)
+    except MemoryTracingNotStartedException as error:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Le traçage mémoire n'est pas démarré",
+        ) from error
+
+    sites = [
+        AllocationSite(
+            traceback=[
+                f"{frame.filename}:{frame.lineno}"
+                for frame in reversed(statistic.traceback)
+            ],
+            size=statistic.size,
+            size_diff=statistic.size_diff,
+            count=statistic.count,
+            count_diff=statistic.count_diff,
+        )
+        for statistic in statistics
+    ]
+    return MemorySnapshotDiff(status=_tracing_status(), sites=sites)
+
+
+@router.post("/memory/stop", status_code=status.HTTP_200_OK)
+async def stop_memory_tracing() -> MemoryTracingStatus:
+    """
+    Endpoint to stop tracing memory allocations.
+
+    Returns:
+        MemoryTracingStatus: State of memory tracing.
+    """
+    await to_thread(stop_tracing)
+    APP_CONFIG.logger.warning("Memory tracing stopped")
+    return _tracing_status()
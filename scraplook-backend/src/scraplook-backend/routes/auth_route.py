@@ -5,25 +5,33 @@ Route module to manage user authentification
 from typing import Annotated, Optional
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
-from models.user import Token, UserOutput
+from models.user import StreamTicket, Token, UserOutput
 from prisma import Prisma, errors
 from prisma.models import User
-from services.user_services import get_user_by_name
-from utils.hash import pwd_context
+from services.user_services import (
+    get_user_by_name,
+    get_cached_user_by_name,
+    get_user_cache_stats,
+)
+from utils.hash import verify_str_chain, HashPoolSaturatedException
 from config.app_config import get_app_config
 from config.prisma_client import get_prisma_instance
+from routes.admin_route import verify_admin
 
 # === Configuration JWT ===
 ALGORITHM = "HS256"
+# scope of the tickets of new message streams, rejected as access tokens
+STREAM_TICKET_SCOPE = "stream"
 
 # === Initialisation du router ===
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 # === OAuth2 ===
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
 
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -31,11 +39,17 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+hash_pool_saturated_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Trop de demandes de connexion, veuillez réessayer",
+    headers={"Retry-After": "1"},
+)
+
 APP_CONFIG = get_app_config()
 
 
 # === Fonctions auxiliaires ===
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Check password is equivalent to a hashed password.
 
@@ -47,7 +61,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         bool: Indicates if password is equivalent to hashed password.
     """
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await verify_str_chain(plain_password, hashed_password)
     except ValueError as error:
         APP_CONFIG.logger.warning(
             "Incorrect hashed password format: %s, error: %s", hashed_password, error
@@ -92,7 +106,7 @@ async def authenticate_user(
         user = await get_user_by_name(prisma, username)
     except errors.RecordNotFoundError:
         return None
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user.password):
         return None
     return user
 
@@ -112,7 +126,12 @@ async def login_for_access_token(
     Returns:
         Token: JWT token associated with user.
     """
-    user = await authenticate_user(prisma, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(prisma, form_data.username, form_data.password)
+    except HashPoolSaturatedException as error:
+        APP_CONFIG.logger.warning("Authentication postponed: %s", error)
+        raise hash_pool_saturated_exception from error
+
     if not user:
         APP_CONFIG.logger.warning(
             "Authentication failed for user: %s", form_data.username
@@ -152,6 +171,53 @@ async def get_current_user(
         token: User's access token.
         prisma: DB connection.
 
+    Returns:
+        UserOutput: User object with current access token.
+    """
+    return await get_user_from_token(prisma, token)
+
+
+async def get_current_user_from_header_or_ticket(
+    header_token: Annotated[Optional[str], Depends(oauth2_scheme_optional)],
+    ticket: Annotated[Optional[str], Query()] = None,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> UserOutput:
+    """
+    Helper method to retrieve current user from an access token sent in the
+    `Authorization` header, or from a stream ticket sent in the `ticket` query
+    parameter.
+
+    The query parameter is meant for clients that cannot set headers, such as
+    browser `EventSource`. Query strings end up in access logs, so it takes a
+    short-lived ticket from `/auth/stream_ticket` rather than the access token.
+
+    Args:
+        header_token: User's access token sent in the header.
+        ticket: Stream ticket sent in the query string.
+        prisma: DB connection.
+
+    Returns:
+        UserOutput: User object with current access token.
+    """
+    if header_token is not None:
+        return await get_user_from_token(prisma, header_token)
+    if ticket is None:
+        raise credentials_exception
+
+    return await get_user_from_token(prisma, ticket, STREAM_TICKET_SCOPE)
+
+
+async def get_user_from_token(
+    prisma: Prisma, token: str, scope: Optional[str] = None
+) -> UserOutput:
+    """
+    Retrieve the user of an access token from DB, and check the token is valid.
+
+    Args:
+        prisma: DB connection.
+        token: User's access token.
+        scope: Scope the token must have, None for access tokens.
+
     Returns:
         UserOutput: User object with current access token.
     """
@@ -166,13 +232,14 @@ async def get_current_user(
         )
         raise credentials_exception from error
 
-    if payload.get("sub") is None:
+    if payload.get("sub") is None or payload.get("scope") != scope:
         raise credentials_exception
 
-    user_in_db = await get_user_by_name(prisma, username)
-    user_in_db.password = ""
-    if user_in_db is None:
-        raise credentials_exception
+    # user is cached at most until the access token expires
+    try:
+        user_in_db = await get_cached_user_by_name(prisma, username, payload.get("exp"))
+    except errors.RecordNotFoundError as error:
+        raise credentials_exception from error
 
     return UserOutput(
         **user_in_db.model_dump(),
@@ -180,6 +247,31 @@ async def get_current_user(
     )
 
 
+@router.post("/stream_ticket", response_model=StreamTicket)
+async def create_stream_ticket(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+) -> StreamTicket:
+    """
+    Endpoint to create a short-lived ticket opening new message streams.
+
+    The ticket is sent in the query string of `/messages/stream` by clients that
+    cannot set headers, instead of the access token. It only opens streams, and
+    expires after `stream_ticket_duration_seconds`.
+
+    Args:
+        user: User information.
+
+    Returns:
+        StreamTicket: Ticket and its lifetime.
+    """
+    duration = APP_CONFIG.env_data.stream_ticket_duration_seconds
+    ticket = create_token(
+        data={"sub": user.name, "scope": STREAM_TICKET_SCOPE},
+        expires_delta=timedelta(seconds=duration),
+    )
+    return StreamTicket(ticket=ticket, expires_in=duration)
+
+
 @router.get("/check_refresh_access_token", response_model=bool)
 async def check_refresh_access_token(
     token: Annotated[str, Depends(oauth2_scheme)],
@@ -282,3 +374,19 @@ async def read_users_me(user: Annotated[UserOutput, Depends(get_current_user)]):
         UserOutput: User information.
     """
     return user
+
+
+@router.get(
+    "/user_cache_stats",
+    response_model=dict[str, int],
+    dependencies=[Depends(verify_admin)],
+)
+async def read_user_cache_stats() -> dict[str, int]:
+    """
+    Endpoint to retrieve usage counters of the authenticated user cache, reserved
+    to admins.
+
+    Returns:
+        dict[str, int]: Number of hits, misses, evictions and entries of the cache.
+    """
+    return get_user_cache_stats()
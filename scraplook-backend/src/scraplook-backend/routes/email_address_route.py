@@ -2,12 +2,12 @@
 Route module to manage email addresses
 """
 
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Header, Response
 
 from prisma import Prisma, errors
-from prisma.models import Email
+from prisma.models import Email, MailboxCounter
 
 from models.user import UserOutput
 from models.email_address import EmailAddressInput
@@ -19,6 +19,9 @@ from services.email_address_services import (
     update_email_address,
     get_email_address_information,
 )
+from services.mailbox_entries_services import get_mailbox_counters
+from services.versions_services import mailbox_etag, user_email_addresses_etag
+from utils.etag import check_etag
 from config.app_config import get_app_config
 from config.prisma_client import get_prisma_instance
 
@@ -30,6 +33,8 @@ APP_CONFIG = get_app_config()
 async def get_all(
     user: Annotated[UserOutput, Depends(get_current_user)],
     user_id: str,
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     prisma: Prisma = Depends(get_prisma_instance),
 ) -> list[Email]:
     """
@@ -37,11 +42,19 @@ async def get_all(
 
     Args:
         user_id: User ID.
+        response: Response, tagged with the version of the email addresses.
+        if_none_match: Version of the email addresses already known by the client.
         prisma: DB connection.
 
     Returns:
         list[Email]: Email addresses of the user.
     """
+    not_modified = check_etag(
+        if_none_match, await user_email_addresses_etag(prisma, user_id), response
+    )
+    if not_modified is not None:
+        return not_modified
+
     return await get_user_email_addresses(prisma, user_id)
 
 
@@ -70,6 +83,40 @@ async def get_one(
         ) from error
 
 
+@router.get(
+    "/{id_email_address}/counters",
+    status_code=status.HTTP_200_OK,
+    response_model=MailboxCounter,
+)
+async def get_counters(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MailboxCounter:
+    """
+    Endpoint to get the number of messages and of unread messages received by an
+    email address.
+
+    Args:
+        id_email_address: Email address ID.
+        response: Response, tagged with the version of the mailbox.
+        if_none_match: Version of the mailbox already known by the client.
+        prisma: DB connection.
+
+    Returns:
+        MailboxCounter: Counters of the received folder.
+    """
+    not_modified = check_etag(
+        if_none_match, await mailbox_etag(prisma, id_email_address), response
+    )
+    if not_modified is not None:
+        return not_modified
+
+    return await get_mailbox_counters(prisma, id_email_address)
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def add_user_email_address(
     user: Annotated[UserOutput, Depends(get_current_user)],
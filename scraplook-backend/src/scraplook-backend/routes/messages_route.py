@@ -2,23 +2,60 @@
 Route module to manage messages.
 """
 
-from typing import Annotated
+from json import dumps
+from typing import Annotated, AsyncIterator, Optional
+from zlib import Z_SYNC_FLUSH, compressobj
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
 
 from prisma import Prisma, errors
-from prisma.models import Message
+from prisma.models import MailboxCounter, Message
 
 from models.user import UserOutput
-from models.message import MessageInput
-from routes.auth_route import get_current_user
+from models.message import (
+    BatchMessageInput,
+    BatchSendProgress,
+    BulkDeleteInput,
+    BulkDeleteResult,
+    MailboxChangePage,
+    MessageInput,
+    MessagePage,
+    MessageSummaryPage,
+    MessageSearchPage,
+    ReadStateInput,
+)
+from routes.admin_route import verify_admin
+from routes.auth_route import get_current_user, get_current_user_from_header_or_ticket
+from services.email_address_services import get_user_email_addresses
 from services.messages_services import (
     get_user_messages_sent,
     get_user_messages_received,
     get_user_message,
     send_message,
     safe_delete_message,
+    build_message_page,
+    get_user_messages_sent_summary,
+    get_user_messages_received_summary,
+    build_message_summary_page,
+    bulk_safe_delete_messages,
+    find_unknown_email_addresses,
+    send_messages_batch,
+    export_mailbox,
+    set_messages_read_state,
+)
+from services.changes_services import get_mailbox_changes
+from services.notification_services import (
+    get_push_stats,
+    subscribe_mailboxes,
+    unsubscribe_mailboxes,
 )
+from services.search_services import build_search_query, search_messages
+from services.versions_services import mailbox_etag, message_etag
+from utils.etag import check_etag
+from utils.fast_json import ResponseSchema
+from utils.pagination import InvalidCursorException, encode_message_cursor
+from utils.pubsub import SubscriptionOverflowException
 from config.app_config import get_app_config
 from config.prisma_client import get_prisma_instance
 
@@ -26,49 +63,439 @@ from config.prisma_client import get_prisma_instance
 router = APIRouter(prefix="/messages", tags=["messages"], dependencies=[])
 APP_CONFIG = get_app_config()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_CHANGES_PAGE_SIZE = 1000
+
+# serializers of listings, used when fast JSON responses are enabled
+MESSAGE_PAGE_SCHEMA = ResponseSchema[MessagePage](MessagePage)
+MESSAGE_SUMMARY_PAGE_SCHEMA = ResponseSchema[MessageSummaryPage](MessageSummaryPage)
+MESSAGE_SEARCH_PAGE_SCHEMA = ResponseSchema[MessageSearchPage](MessageSearchPage)
+
 
-@router.get("/sent_messages", response_model=list[Message])
+@router.get("/sent_messages", response_model=MessagePage)
 async def get_sent_messages(
     user: Annotated[UserOutput, Depends(get_current_user)],
     id_email_address: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     prisma: Prisma = Depends(get_prisma_instance),
-) -> list[Message]:
+) -> MessagePage:
     """
-    Endpoint to retrieve messages sent by an email address.
+    Endpoint to retrieve a page of messages sent by an email address.
 
     Args:
         id_email_address: Email address ID that sent messages.
+        response: Response, tagged with the version of the mailbox.
+        cursor: Cursor of the page to retrieve, first page if not given.
+        limit: Maximum number of messages in the page.
+        if_none_match: Version of the page already known by the client.
         prisma: DB connection.
 
     Returns:
-        list[Message]: Messages sent by an email address.
+        MessagePage: Messages sent by an email address, with the next page cursor.
     """
-    return await get_user_messages_sent(prisma, id_email_address)
+    not_modified = check_etag(
+        if_none_match, await mailbox_etag(prisma, id_email_address), response
+    )
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        messages = await get_user_messages_sent(prisma, id_email_address, cursor, limit)
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid messages cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    return MESSAGE_PAGE_SCHEMA.response(build_message_page(messages, limit), response)
 
 
-@router.get("/received_messages", response_model=list[Message])
+@router.get("/received_messages", response_model=MessagePage)
 async def get_received_messages(
     user: Annotated[UserOutput, Depends(get_current_user)],
     id_email_address: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     prisma: Prisma = Depends(get_prisma_instance),
-) -> list[Message]:
+) -> MessagePage:
     """
-    Endpoint to get messages received by an email address.
+    Endpoint to get a page of messages received by an email address.
 
     Args:
         id_email_address: Email address ID that received messages.
+        response: Response, tagged with the version of the mailbox.
+        cursor: Cursor of the page to retrieve, first page if not given.
+        limit: Maximum number of messages in the page.
+        if_none_match: Version of the page already known by the client.
         prisma: DB connection.
 
     Returns:
-        list[Message]: Messages received by an email address.
+        MessagePage: Messages received by an email address, with the next page cursor.
+    """
+    not_modified = check_etag(
+        if_none_match, await mailbox_etag(prisma, id_email_address), response
+    )
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        messages = await get_user_messages_received(
+            prisma, id_email_address, cursor, limit
+        )
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid messages cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    return MESSAGE_PAGE_SCHEMA.response(build_message_page(messages, limit), response)
+
+
+@router.get("/sent_summaries", response_model=MessageSummaryPage)
+async def get_sent_summaries(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MessageSummaryPage:
+    """
+    Endpoint to retrieve a page of summaries of messages sent by an email address.
+
+    Full message bodies are only available through `/messages/{id_message}`.
+
+    Args:
+        id_email_address: Email address ID that sent messages.
+        response: Response of the endpoint.
+        cursor: Cursor of the page to retrieve, first page if not given.
+        limit: Maximum number of summaries in the page.
+        prisma: DB connection.
+
+    Returns:
+        MessageSummaryPage: Summaries of messages sent, with the next page cursor.
+    """
+    try:
+        summaries = await get_user_messages_sent_summary(
+            prisma, id_email_address, cursor, limit
+        )
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid messages cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    return MESSAGE_SUMMARY_PAGE_SCHEMA.response(
+        build_message_summary_page(summaries, limit), response
+    )
+
+
+@router.get("/received_summaries", response_model=MessageSummaryPage)
+async def get_received_summaries(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MessageSummaryPage:
+    """
+    Endpoint to retrieve a page of summaries of messages received by an email address.
+
+    Full message bodies are only available through `/messages/{id_message}`.
+
+    Args:
+        id_email_address: Email address ID that received messages.
+        response: Response of the endpoint.
+        cursor: Cursor of the page to retrieve, first page if not given.
+        limit: Maximum number of summaries in the page.
+        prisma: DB connection.
+
+    Returns:
+        MessageSummaryPage: Summaries of messages received, with the next page cursor.
+    """
+    try:
+        summaries = await get_user_messages_received_summary(
+            prisma, id_email_address, cursor, limit
+        )
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid messages cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    return MESSAGE_SUMMARY_PAGE_SCHEMA.response(
+        build_message_summary_page(summaries, limit), response
+    )
+
+
+@router.get("/changes", response_model=MailboxChangePage)
+async def get_changes(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    since: Annotated[Optional[int], Query(ge=0)] = None,
+    limit: Annotated[
+        int, Query(ge=1, le=MAX_CHANGES_PAGE_SIZE)
+    ] = MAX_CHANGES_PAGE_SIZE,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MailboxChangePage:
+    """
+    Endpoint to retrieve messages added to or removed from a mailbox since a change.
+
+    Clients read `next_since` without `since` before loading the mailbox, then only
+    ask for changes after it. Deleted messages are reported, unlike in listings.
+    With `resync`, changes after `since` were pruned and the mailbox must be loaded
+    again.
+
+    Args:
+        id_email_address: Email address ID whose changes are retrieved.
+        since: Sequence number of the last change already known.
+        limit: Maximum number of changes, `has_more` tells if more are waiting.
+        prisma: DB connection.
+
+    Returns:
+        MailboxChangePage: Changes, with the sequence number to ask from next time.
+    """
+    return await get_mailbox_changes(prisma, id_email_address, since, limit)
+
+
+@router.get("/search", response_model=MessageSearchPage)
+async def search_mails(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    q: Annotated[str, Query(min_length=1, max_length=256)],
+    response: Response,
+    prefix: bool = True,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MessageSearchPage:
+    """
+    Endpoint to search messages sent or received by an email address.
+
+    Messages match if their subject or body contain all words searched,
+    results are ordered by relevance.
+
+    Args:
+        id_email_address: Email address ID whose messages are searched.
+        q: Words to search.
+        response: Response of the endpoint.
+        prefix: Indicates if words also match longer words starting with them.
+        cursor: Cursor of the page to retrieve, first page if not given.
+        limit: Maximum number of results in the page.
+        prisma: DB connection.
+
+    Returns:
+        MessageSearchPage: Messages matching the search, with the next page cursor.
+    """
+    search_query = build_search_query(q, prefix)
+    if search_query is None:
+        return MessageSearchPage(items=[], next_cursor=None)
+
+    try:
+        page = await search_messages(
+            prisma, id_email_address, search_query, cursor, limit
+        )
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid search cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    return MESSAGE_SEARCH_PAGE_SCHEMA.response(page, response)
+
+
+async def _export_lines(chunks: AsyncIterator[list[Message]]) -> AsyncIterator[str]:
+    """
+    Format chunks of exported messages as JSON lines.
+
+    Each line holds a message and the cursor to resume the export after it.
+
+    Args:
+        chunks: Chunks of messages to export.
+
+    Returns:
+        AsyncIterator[str]: JSON lines of each chunk.
+    """
+    async for messages in chunks:
+        yield "".join(
+            f'{{"cursor":"{encode_message_cursor(message.sentAt, message.id)}",'
+            f'"message":{message.model_dump_json()}}}\n'
+            for message in messages
+        )
+
+
+async def _gzip_stream(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """
+    Compress a text stream into a gzip stream on the fly.
+
+    The compressor is flushed after each piece of text, so the client receives
+    each chunk as soon as it is read.
+
+    Args:
+        lines: Text to compress.
+
+    Returns:
+        AsyncIterator[bytes]: Gzip stream.
+    """
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = compressobj(wbits=31)
+    async for text in lines:
+        yield compressor.compress(text.encode("utf-8")) + compressor.flush(Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+@router.get("/export")
+async def export_mails(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    id_email_address: str,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> StreamingResponse:
     """
-    return await get_user_messages_received(prisma, id_email_address)
+    Endpoint to export all messages sent or received by an email address.
+
+    Messages are streamed as JSON lines `{"cursor": ..., "message": ...}`, so an
+    interrupted export can be resumed by passing the cursor of the last line received.
+
+    Args:
+        id_email_address: Email address ID whose messages are exported.
+        cursor: Cursor of the last message already exported, from the start if not given.
+        gzip: Indicates if the export is compressed as a gzip file.
+        prisma: DB connection.
+
+    Returns:
+        StreamingResponse: Messages, as JSON lines.
+    """
+    try:
+        chunks = export_mailbox(prisma, id_email_address, cursor)
+    except InvalidCursorException as error:
+        APP_CONFIG.logger.warning("Invalid export cursor: %s", error)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+    if gzip:
+        return StreamingResponse(
+            _gzip_stream(_export_lines(chunks)),
+            media_type="application/gzip",
+            headers={
+                "Content-Disposition": 'attachment; filename="messages.ndjson.gz"'
+            },
+        )
+
+    return StreamingResponse(_export_lines(chunks), media_type="application/x-ndjson")
+
+
+async def _new_message_events(id_email_addresses: frozenset[str]) -> AsyncIterator[str]:
+    """
+    Watch new messages received by email addresses, as Server-Sent Events.
+
+    A comment is sent when no message arrives for a while, to keep the connection
+    open through proxies. If the client does not read events fast enough, a
+    `resync` event is sent and the stream ends.
+
+    Args:
+        id_email_addresses: Email address IDs to watch.
+
+    Returns:
+        AsyncIterator[str]: Server-Sent Events.
+    """
+    subscription = subscribe_mailboxes(id_email_addresses)
+    try:
+        while True:
+            try:
+                event = await subscription.next_event(
+                    APP_CONFIG.env_data.push_keepalive_seconds
+                )
+            except SubscriptionOverflowException as error:
+                APP_CONFIG.logger.warning("Message stream overflowed: %s", error)
+                yield "event: resync\ndata: {}\n\n"
+                return
+
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+    finally:
+        unsubscribe_mailboxes(subscription)
+
+
+@router.get("/stream")
+async def stream_mails(
+    user: Annotated[UserOutput, Depends(get_current_user_from_header_or_ticket)],
+    id_email_address: Annotated[Optional[list[str]], Query()] = None,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> StreamingResponse:
+    """
+    Endpoint to be notified of new messages received, instead of polling listings.
+
+    Events are sent with Server-Sent Events: `new_message` events hold the ID of
+    the message received, `resync` means events were lost and listings must be
+    reloaded. Clients that cannot set headers give a ticket from
+    `/auth/stream_ticket` in the `ticket` query parameter instead of the access
+    token.
+
+    Args:
+        id_email_address: Email address IDs to watch, all addresses of the user
+            if not given.
+        prisma: DB connection.
+
+    Returns:
+        StreamingResponse: Server-Sent Events stream.
+
+    Raises:
+        HTTPException: 403 if an email address does not belong to the user, 404 if
+            there is no email address to watch.
+    """
+    id_user_email_addresses = [
+        email.id for email in await get_user_email_addresses(prisma, user.id)
+    ]
+    if id_email_address and not set(id_email_address) <= set(id_user_email_addresses):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Adresse mail d'un autre utilisateur",
+        )
+
+    id_email_addresses = id_email_address or id_user_email_addresses
+    if not id_email_addresses:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No email address to watch"
+        )
+
+    return StreamingResponse(
+        _new_message_events(frozenset(id_email_addresses)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stream_stats", dependencies=[Depends(verify_admin)])
+async def get_stream_stats() -> dict[str, int]:
+    """
+    Endpoint to retrieve usage counters of new message streams of the process,
+    reserved to admins.
+
+    Returns:
+        dict[str, int]: Number of events published and dropped, of watched email
+            addresses and of open streams.
+    """
+    return get_push_stats()
 
 
 @router.get("/{id_message}", response_model=Message)
 async def get_message(
     user: Annotated[UserOutput, Depends(get_current_user)],
     id_message: str,
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     prisma: Prisma = Depends(get_prisma_instance),
 ) -> Message:
     """
@@ -76,11 +503,19 @@ async def get_message(
 
     Args:
         id_message: Message ID to get.
+        response: Response, tagged with the version of the message.
+        if_none_match: Version of the message already known by the client.
         prisma: DB connection.
 
     Returns:
         Message: Message information.
     """
+    not_modified = check_etag(
+        if_none_match, await message_etag(prisma, id_message), response
+    )
+    if not_modified is not None:
+        return not_modified
+
     try:
         return await get_user_message(prisma, id_message)
     except errors.RecordNotFoundError as error:
@@ -109,6 +544,70 @@ async def send_mail(
     await send_message(prisma, message_info)
 
 
+async def _batch_send_progress(
+    prisma: Prisma, batch: BatchMessageInput
+) -> AsyncIterator[str]:
+    """
+    Send a batch of messages, and stream its progress as JSON lines.
+
+    Args:
+        prisma: DB connection.
+        batch: Messages to send.
+
+    Returns:
+        AsyncIterator[str]: One JSON line per chunk of messages sent.
+    """
+    total = len(batch.messages)
+    sent = 0
+    try:
+        async for sent in send_messages_batch(prisma, batch.messages):
+            progress = BatchSendProgress(sent=sent, total=total, done=sent == total)
+            yield progress.model_dump_json() + "\n"
+    except errors.PrismaError as error:
+        # the response has already started, the error can only be streamed
+        APP_CONFIG.logger.warning("Batch send interrupted: %s", error)
+        progress = BatchSendProgress(sent=sent, total=total, error="Envoi interrompu")
+        yield progress.model_dump_json() + "\n"
+
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def send_mails_batch(
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    batch: BatchMessageInput,
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> StreamingResponse:
+    """
+    Endpoint to send many messages at once, e.g. to a large recipient list.
+
+    Senders and recipients are checked before anything is sent, then messages are
+    inserted by chunks and the progress is streamed as JSON lines. Chunks already
+    sent are kept if a later one fails.
+
+    Args:
+        batch: Messages to send.
+        prisma: DB connection.
+
+    Returns:
+        StreamingResponse: Progress of the batch, as `BatchSendProgress` JSON lines.
+    """
+    unknown = await find_unknown_email_addresses(prisma, batch.messages)
+    if unknown:
+        APP_CONFIG.logger.warning("Batch send to unknown email addresses: %s", unknown)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "message": "Unknown email addresses",
+                "id_email_addresses": unknown,
+            },
+        )
+
+    return StreamingResponse(
+        _batch_send_progress(prisma, batch),
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/x-ndjson",
+    )
+
+
 @router.delete("/", status_code=status.HTTP_200_OK)
 async def delete_mail(
     id_email_address: str,
@@ -128,3 +627,62 @@ async def delete_mail(
 
     """
     await safe_delete_message(prisma, id_email_address, id_message)
+
+
+@router.post("/bulk_delete", response_model=list[BulkDeleteResult])
+async def bulk_delete_mails(
+    delete_info: BulkDeleteInput,
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> list[BulkDeleteResult]:
+    """
+    Endpoint to delete several messages from an email address at once.
+
+    Messages are selected by ID, by sending date, or both.
+
+    Args:
+        delete_info: Email address and messages to delete.
+        prisma: DB connection.
+
+    Returns:
+        list[BulkDeleteResult]: Outcome of each message deletion.
+    """
+    return await bulk_safe_delete_messages(prisma, delete_info)
+
+
+@router.post("/mark_read", response_model=MailboxCounter)
+async def mark_mails_read(
+    read_info: ReadStateInput,
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MailboxCounter:
+    """
+    Endpoint to mark several received messages as read at once.
+
+    Args:
+        read_info: Email address and messages to mark.
+        prisma: DB connection.
+
+    Returns:
+        MailboxCounter: Counters of the received folder after the change.
+    """
+    return await set_messages_read_state(prisma, read_info, True)
+
+
+@router.post("/mark_unread", response_model=MailboxCounter)
+async def mark_mails_unread(
+    read_info: ReadStateInput,
+    user: Annotated[UserOutput, Depends(get_current_user)],
+    prisma: Prisma = Depends(get_prisma_instance),
+) -> MailboxCounter:
+    """
+    Endpoint to mark several received messages as unread at once.
+
+    Args:
+        read_info: Email address and messages to mark.
+        prisma: DB connection.
+
+    Returns:
+        MailboxCounter: Counters of the received folder after the change.
+    """
+    return await set_messages_read_state(prisma, read_info, False)
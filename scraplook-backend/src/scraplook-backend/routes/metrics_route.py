@@ -0,0 +1,85 @@
+"""
+Route module to expose performance metrics to Prometheus, reserved to admins.
+
+Metrics describe the whole process, e.g. the user cache and the new message
+streams: the scraper sends the admin token in the `X-Admin-Token` header.
+"""
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from config.logger import get_log_queue_stats
+from routes.admin_route import verify_admin
+from services.notification_services import get_push_stats
+from services.user_services import get_user_cache_stats
+from utils.metrics import format_counters, format_gauges, render_metrics
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(verify_admin)])
+
+# statistics that only increase, exported as counters, the others being gauges
+USER_CACHE_COUNTERS = frozenset({"hits", "misses", "evictions"})
+MESSAGE_STREAMS_COUNTERS = frozenset({"published", "dropped"})
+LOG_QUEUE_COUNTERS = frozenset({"dropped"})
+
+
+def _format_stats(
+    prefix: str, description: str, stats: dict[str, int], counters: frozenset[str]
+) -> list[str]:
+    """
+    Format usage statistics, as counters or gauges.
+
+    Args:
+        prefix: Prefix of the metric names.
+        description: Help text of the metrics.
+        stats: Statistics by name.
+        counters: Names of the statistics that only increase.
+
+    Returns:
+        list[str]: Metric lines.
+    """
+    return [
+        *format_counters(
+            prefix,
+            description,
+            {name: value for name, value in stats.items() if name in counters},
+        ),
+        *format_gauges(
+            prefix,
+            description,
+            {name: value for name, value in stats.items() if name not in counters},
+        ),
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Endpoint to retrieve request, DB query, user cache, stream and log queue metrics,
+    in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: Metrics text.
+    """
+    extra_lines = [
+        *_format_stats(
+            "user_cache",
+            "Usage of the authenticated user cache.",
+            get_user_cache_stats(),
+            USER_CACHE_COUNTERS,
+        ),
+        *_format_stats(
+            "message_streams",
+            "Usage of new message streams.",
+            get_push_stats(),
+            MESSAGE_STREAMS_COUNTERS,
+        ),
+        *_format_stats(
+            "log_queue",
+            "Usage of the log queue.",
+            get_log_queue_stats(),
+            LOG_QUEUE_COUNTERS,
+        ),
+    ]
+    return PlainTextResponse(
+        render_metrics(extra_lines), media_type="text/plain; version=0.0.4"
+    )
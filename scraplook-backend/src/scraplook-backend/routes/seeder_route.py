@@ -1,12 +1,24 @@
 """Database seeder, to initialize database with data."""
 
+from asyncio import gather
 from random import randint
+from typing import AsyncIterator
 from fastapi import APIRouter, status, Depends
-from prisma import Prisma
-
+from fastapi.responses import StreamingResponse
+from prisma import Prisma, errors
+
+from config.app_config import get_app_config
+from models.message import MessageInput, MessageRecipientInput
+from models.seeder import SyntheticDatasetInput, SyntheticDatasetProgress
+from services.messages_services import insert_messages
+from services.search_services import clear_search_index
+from services.synthetic_data_services import generate_synthetic_dataset
+from services.user_services import clear_user_cache
 from utils.hash import hash_str_chain
 from config.prisma_client import get_prisma_instance
 
+APP_CONFIG = get_app_config()
+
 router = APIRouter(prefix="/seeder", tags=["seeder"], dependencies=[])
 
 
@@ -54,11 +66,17 @@ async def user_seeder(prisma: Prisma = Depends(get_prisma_instance)) -> dict[str
         {"name": "Mia", "password": "miamiami"},
     ]
 
-    for user_data in users_data:
-        hashed_password = hash_str_chain(user_data["password"])
-        await prisma.user.create(
-            data={"name": user_data["name"], "password": hashed_password}
-        )
+    # hash passwords concurrently in the hash pool
+    hashed_passwords = await gather(
+        *(hash_str_chain(user_data["password"]) for user_data in users_data)
+    )
+
+    await prisma.user.create_many(
+        data=[
+            {"name": user_data["name"], "password": hashed_password}
+            for user_data, hashed_password in zip(users_data, hashed_passwords)
+        ]
+    )
 
     return {"message": "Users added successfully"}
 
@@ -83,6 +101,7 @@ async def email_addresses_seeder(
         await prisma.email.create(
             data={"address": f"{user_data.name}.test@gmail.com", "userId": user_data.id}
         )
+    clear_user_cache()
 
     return {"message": "Email addresses added successfully"}
 
@@ -102,29 +121,79 @@ async def email_messages(
     """
 
     user_email_addresses = await prisma.email.find_many()
-
-    for _, email_address in enumerate(user_email_addresses):
-        await prisma.message.create(
-            data={
-                "subject": f"Envoi mail par {email_address.address}",
-                "body": "Contenu d'un mail test",
-                "fromId": email_address.id,
-                "recipients": {
-                    "create": [
-                        {
-                            "emailId": user_email_addresses[
-                                randint(0, len(user_email_addresses) - 1)
-                            ].id,
-                            "type": "cc",
-                        }
-                    ]
-                },
-            }
+    messages_info = [
+        MessageInput(
+            subject=f"Envoi mail par {email_address.address}",
+            body="Contenu d'un mail test",
+            fromId=email_address.id,
+            recipients=[
+                MessageRecipientInput(
+                    emailId=user_email_addresses[
+                        randint(0, len(user_email_addresses) - 1)
+                    ].id,
+                    type="cc",
+                )
+            ],
         )
+        for email_address in user_email_addresses
+    ]
+
+    async with prisma.tx() as transaction:
+        await insert_messages(transaction, messages_info)
 
     return {"message": "Messages added successfully"}
 
 
+async def _synthetic_dataset_progress(
+    prisma: Prisma, scale: SyntheticDatasetInput
+) -> AsyncIterator[str]:
+    """
+    Generate a synthetic dataset, and stream its progress as JSON lines.
+
+    Args:
+        prisma: DB connection.
+        scale: Scale of the dataset.
+
+    Returns:
+        AsyncIterator[str]: One JSON line per batch of rows inserted.
+    """
+    total_messages = scale.users * scale.addresses_per_user * scale.messages_per_address
+    progress = SyntheticDatasetProgress(total_messages=total_messages)
+    try:
+        async for progress in generate_synthetic_dataset(prisma, scale):
+            yield progress.model_dump_json() + "\n"
+    except errors.PrismaError as error:
+        # the response has already started, the error can only be streamed
+        APP_CONFIG.logger.warning("Synthetic dataset interrupted: %s", error)
+        progress.error = "Génération interrompue"
+        yield progress.model_dump_json() + "\n"
+
+
+@router.post("/synthetic", status_code=status.HTTP_201_CREATED)
+async def synthetic_dataset_seeder(
+    scale: SyntheticDatasetInput, prisma: Prisma = Depends(get_prisma_instance)
+) -> StreamingResponse:
+    """
+    Endpoint to add a large synthetic dataset in DB, e.g. for benchmarks.
+
+    The same seed and scale always generate the same dataset. Its user names start
+    with `name_prefix`, which must not be used by existing users.
+
+    Args:
+        scale: Scale of the dataset.
+        prisma: DB connection.
+
+    Returns:
+        StreamingResponse: Progress of the generation, as `SyntheticDatasetProgress`
+            JSON lines.
+    """
+    return StreamingResponse(
+        _synthetic_dataset_progress(prisma, scale),
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/reset", status_code=status.HTTP_200_OK)
 async def reset_database(prisma: Prisma = Depends(get_prisma_instance)):
     """
@@ -136,8 +205,13 @@ async def reset_database(prisma: Prisma = Depends(get_prisma_instance)):
     Returns:
 
     """
+    await clear_search_index(prisma)
+    await prisma.mailboxchange.delete_many()
+    await prisma.mailboxentry.delete_many()
+    await prisma.mailboxcounter.delete_many()
     await prisma.messagerecipient.delete_many()
     await prisma.message.delete_many()
     await prisma.email.delete_many()
     await prisma.user.delete_many()
+    clear_user_cache()
     return {"message": "Database reset successfully"}
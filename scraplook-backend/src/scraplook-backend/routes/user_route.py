@@ -2,15 +2,19 @@
 Route module to manage user.
 """
 
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Header, Response
 from prisma import Prisma, errors
 from prisma.models import User
 
 from models.user import UserInput, UserOutput
-from routes.auth_route import get_current_user
+from routes.auth_route import get_current_user, hash_pool_saturated_exception
 from services.user_services import get_all_users, get_user_by_id, add_new_user
+from services.versions_services import users_etag
+from utils.etag import check_etag
+from utils.fast_json import ResponseSchema
+from utils.hash import HashPoolSaturatedException
 from config.app_config import get_app_config
 from config.prisma_client import get_prisma_instance
 
@@ -18,22 +22,33 @@ from config.prisma_client import get_prisma_instance
 router = APIRouter(prefix="/user", tags=["user"], dependencies=[])
 APP_CONFIG = get_app_config()
 
+# serializer of the user list, used when fast JSON responses are enabled
+USER_LIST_SCHEMA = ResponseSchema[list[User]](list[User])
+
 
 @router.get("/all", status_code=status.HTTP_200_OK, response_model=list[User])
 async def get_all(
     user: Annotated[UserOutput, Depends(get_current_user)],
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     prisma: Prisma = Depends(get_prisma_instance),
 ) -> list[User]:
     """
     Endpoint to get all users.
 
     Args:
+        response: Response, tagged with the version of the user list.
+        if_none_match: Version of the user list already known by the client.
         prisma: DB connection.
 
     Returns:
         list[User]: List of all users.
     """
-    return await get_all_users(prisma)
+    not_modified = check_etag(if_none_match, await users_etag(prisma), response)
+    if not_modified is not None:
+        return not_modified
+
+    return USER_LIST_SCHEMA.response(await get_all_users(prisma), response)
 
 
 @router.get("/{id_user}", status_code=status.HTTP_200_OK, response_model=User)
@@ -84,3 +99,6 @@ async def add_user(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User name already exists"
         ) from error
+    except HashPoolSaturatedException as error:
+        APP_CONFIG.logger.warning("User creation postponed: %s", error)
+        raise hash_pool_saturated_exception from error
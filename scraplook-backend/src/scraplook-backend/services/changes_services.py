@@ -0,0 +1,147 @@
+"""
+Service module to manage the change log of mailboxes, used for delta synchronization.
+
+Each message added to or removed from a mailbox, or marked as read or unread, is
+logged with a sequence number, shared by all mailboxes.
+Sequence numbers follow commit order, as SQLite lets a single transaction write at
+a time, whatever the size of the connection pool (see
+`config.prisma_client.build_datasource_url`): a change committed after a client
+read the log always gets a greater number.
+
+Changes older than `mailbox_changes_retention_days` are pruned every
+`PRUNE_INTERVAL_SECONDS` by a task of the app lifespan. The newest change is always
+kept, so that the oldest sequence number tells which cursors may have missed pruned
+changes: those are answered with `resync`.
+"""
+
+from asyncio import sleep
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+
+from config.app_config import get_app_config
+from models.message import MailboxChangePage
+from prisma import Prisma, errors
+
+ChangeKind = Literal["insert", "delete", "read", "unread"]
+
+# time between two prunings of the change log
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+# oldest and latest sequence numbers of all mailboxes, both read from the key
+_SEQ_BOUNDS_QUERY = """
+    SELECT
+        (SELECT MIN(seq) FROM MailboxChange) AS oldest,
+        (SELECT MAX(seq) FROM MailboxChange) AS latest
+"""
+
+
+async def record_mailbox_changes(
+    prisma: Prisma, kind: ChangeKind, changes: list[tuple[str, str]]
+) -> None:
+    """
+    Log messages added to or removed from mailboxes.
+
+    It should be called within the transaction changing the messages.
+
+    Args:
+        prisma: DB connection.
+        kind: Kind of change.
+        changes: Email address ID and message ID of each change.
+
+    Returns:
+
+    """
+    if changes:
+        await prisma.mailboxchange.create_many(
+            data=[
+                {"emailId": id_email_address, "messageId": id_message, "kind": kind}
+                for id_email_address, id_message in changes
+            ]
+        )
+
+
+async def prune_mailbox_changes(prisma: Prisma) -> int:
+    """
+    Delete changes older than the retention, except the newest one.
+
+    Args:
+        prisma: DB connection.
+
+    Returns:
+        int: Number of changes deleted.
+    """
+    latest = (await prisma.query_raw(_SEQ_BOUNDS_QUERY))[0]["latest"]
+    if latest is None:
+        return 0
+
+    retention = get_app_config().env_data.mailbox_changes_retention_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention)
+    return await prisma.mailboxchange.delete_many(
+        where={"createdAt": {"lt": cutoff}, "seq": {"lt": latest}}
+    )
+
+
+async def prune_mailbox_changes_periodically(prisma: Prisma) -> None:
+    """
+    Prune the change log every `PRUNE_INTERVAL_SECONDS`, until cancelled.
+
+    Args:
+        prisma: DB connection.
+
+    Returns:
+
+    """
+    logger = get_app_config().logger
+    while True:
+        try:
+            pruned = await prune_mailbox_changes(prisma)
+            if pruned:
+                logger.info("Mailbox changes pruned: %d", pruned)
+        except errors.PrismaError as error:
+            logger.warning("Mailbox changes not pruned: %s", error)
+        await sleep(PRUNE_INTERVAL_SECONDS)
+
+
+async def get_mailbox_changes(
+    prisma: Prisma, id_email_address: str, since: Optional[int], limit: int
+) -> MailboxChangePage:
+    """
+    Get changes of a mailbox after a sequence number.
+
+    Without sequence number, no change is returned, only the current sequence
+    number, to be read before a full reload of the mailbox. The same answer, with
+    `resync`, is given when changes after the sequence number may have been pruned.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID whose changes are read.
+        since: Sequence number of the last change already known.
+        limit: Maximum number of changes.
+
+    Returns:
+        MailboxChangePage: Changes in sequence order, with the sequence number to
+            ask from next time.
+    """
+    # read before the changes: a change committed in between gets a greater number
+    bounds = (await prisma.query_raw(_SEQ_BOUNDS_QUERY))[0]
+    oldest, latest = bounds["oldest"] or 0, bounds["latest"] or 0
+
+    # numbers between `since` and the oldest change may be pruned changes
+    if since is None or since < oldest - 1:
+        return MailboxChangePage(
+            changes=[], next_since=latest, has_more=False, resync=since is not None
+        )
+
+    changes = await prisma.mailboxchange.find_many(
+        where={"emailId": id_email_address, "seq": {"gt": since, "lte": latest}},
+        order={"seq": "asc"},
+        take=limit + 1,
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    return MailboxChangePage(
+        changes=changes,
+        next_since=changes[-1].seq if has_more else max(since, latest),
+        has_more=has_more,
+    )
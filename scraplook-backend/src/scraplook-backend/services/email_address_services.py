@@ -5,11 +5,9 @@ Service module to manage users email addresses.
 from models.email_address import EmailAddressInput
 from prisma import Prisma
 from prisma.models import Email
-from services.messages_services import (
-    get_user_messages_sent,
-    get_user_messages_received,
-    safe_delete_message,
-)
+from services.mailbox_entries_services import rename_sender_address
+from services.user_services import invalidate_cached_user
+from services.messages_services import BULK_TX_TIMEOUT, safe_delete_messages
 
 
 async def get_user_email_addresses(prisma: Prisma, id_user: str) -> list[Email]:
@@ -63,6 +61,7 @@ async def add_email_address(prisma: Prisma, email_info: EmailAddressInput) -> No
     await prisma.email.create(
         data=email_info.model_dump(),
     )
+    invalidate_cached_user(email_info.userId)
 
 
 async def update_email_address(
@@ -79,12 +78,20 @@ async def update_email_address(
     Returns:
 
     """
-    await prisma.email.update(
-        where={
-            "id": id_email_address,
-        },
-        data={"address": email_info.address},
-    )
+    async with prisma.tx() as transaction:
+        email = await transaction.email.update(
+            where={
+                "id": id_email_address,
+            },
+            data={"address": email_info.address},
+        )
+        # mailbox entries hold the address of the sender
+        if email is not None:
+            await rename_sender_address(
+                transaction, id_email_address, email_info.address
+            )
+    if email is not None:
+        invalidate_cached_user(email.userId)
 
 
 async def delete_email_address(prisma: Prisma, id_email_address: str) -> None:
@@ -98,20 +105,12 @@ async def delete_email_address(prisma: Prisma, id_email_address: str) -> None:
     Returns:
 
     """
-    # retrieve messages sent and received for this email address
-    messages_to_delete = await get_user_messages_sent(
-        prisma=prisma, id_email_address=id_email_address
-    )
-    messages_to_delete.extend(
-        await get_user_messages_received(
-            prisma=prisma, id_email_address=id_email_address
-        )
-    )
+    async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+        # delete all messages sent and received for this email address
+        # the change log of the mailbox is deleted with the email address
+        await safe_delete_messages(transaction, id_email_address, {}, log_changes=False)
 
-    # delete all messages
-    for message in messages_to_delete:
-        await safe_delete_message(
-            prisma=prisma, id_email_address=id_email_address, id_message=message.id
-        )
+        email = await transaction.email.delete(where={"id": id_email_address})
 
-    await prisma.email.delete(where={"id": id_email_address})
+    if email is not None:
+        invalidate_cached_user(email.userId)
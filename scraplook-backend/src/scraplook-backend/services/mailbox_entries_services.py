@@ -0,0 +1,279 @@
+"""
+Service module to manage mailbox entries, the listing table of mailboxes.
+
+Each mailbox has one entry per message of its sent and received folders, holding
+the columns displayed in a listing, copied from the message, its sender and its
+recipients. A folder is then read with a range scan of one index, without joining
+`Message`, `MessageRecipient` and `Email`.
+Entries are written in the same transactions as the messages they describe, and
+deleted with them.
+
+The number of messages and of unread messages of each received folder are kept in
+`MailboxCounter`, updated in the same transactions as entries, so that they are read
+without counting entries.
+"""
+
+from datetime import datetime
+from json import dumps
+from typing import Literal, Optional
+
+from models.message import SNIPPET_LENGTH, MessageSummary
+from prisma import Prisma
+from prisma.models import MailboxCounter
+from utils.pagination import to_epoch_milliseconds
+
+MailboxFolder = Literal["sent", "received"]
+
+# ?1 is a JSON array of message IDs, ?2 the snippet length
+_ADD_ENTRIES_QUERY = """
+    INSERT INTO MailboxEntry (emailId, folder, messageId, sentAt, subject,
+        snippet, fromAddress, recipientCount, deleted, read)
+    SELECT parties.emailId, parties.folder, m.id, m.sentAt, m.subject,
+        substr(m.body, 1, ?2), e.address,
+        (SELECT COUNT(*) FROM MessageRecipient r WHERE r.messageId = m.id), 0,
+        parties.folder = 'sent'
+    FROM (
+        SELECT m.fromId AS emailId, 'sent' AS folder, m.id AS messageId
+        FROM Message m WHERE m.id IN (SELECT value FROM json_each(?1))
+        UNION ALL
+        SELECT r.emailId, 'received', r.messageId
+        FROM MessageRecipient r WHERE r.messageId IN (SELECT value FROM json_each(?1))
+    ) parties
+    JOIN Message m ON m.id = parties.messageId
+    JOIN Email e ON e.id = m.fromId
+"""
+# ?1 is a JSON array of message IDs inserted
+_COUNT_ADDED_ENTRIES_QUERY = """
+    INSERT INTO MailboxCounter (emailId, total, unread)
+    SELECT me.emailId, COUNT(*), SUM(me.read = 0) FROM MailboxEntry me
+    WHERE me.messageId IN (SELECT value FROM json_each(?1)) AND me.folder = 'received'
+    GROUP BY me.emailId
+    ON CONFLICT (emailId) DO UPDATE SET
+        total = total + excluded.total, unread = unread + excluded.unread
+"""
+# ?1 is the email ID, ?2 a JSON array of message IDs, to call before deletion
+_COUNT_DELETED_ENTRIES_QUERY = """
+    UPDATE MailboxCounter SET
+        total = total - (
+            SELECT COUNT(*) FROM MailboxEntry me
+            WHERE me.emailId = ?1 AND me.folder = 'received' AND me.deleted = 0
+                AND me.messageId IN (SELECT value FROM json_each(?2))
+        ),
+        unread = unread - (
+            SELECT COUNT(*) FROM MailboxEntry me
+            WHERE me.emailId = ?1 AND me.folder = 'received' AND me.deleted = 0
+                AND me.read = 0 AND me.messageId IN (SELECT value FROM json_each(?2))
+        )
+    WHERE emailId = ?1
+"""
+# ?1 is the email ID, ?2 a JSON array of message IDs
+_DELETE_ENTRIES_QUERY = """
+    UPDATE MailboxEntry SET deleted = 1
+    WHERE emailId = ?1 AND deleted = 0
+        AND messageId IN (SELECT value FROM json_each(?2))
+"""
+# received messages whose read state differs, ?1 is the email ID, ?2 a JSON array
+# of message IDs and ?3 the read state, 0 or 1
+_READ_STATE_CHANGES_QUERY = """
+    SELECT messageId FROM MailboxEntry
+    WHERE emailId = ?1 AND folder = 'received' AND deleted = 0 AND read <> ?3
+        AND messageId IN (SELECT value FROM json_each(?2))
+"""
+# ?1 is the email ID, ?2 a JSON array of message IDs and ?3 the read state
+_SET_RECIPIENTS_READ_STATE_QUERY = """
+    UPDATE MessageRecipient SET read = ?3
+    WHERE emailId = ?1 AND messageId IN (SELECT value FROM json_each(?2))
+"""
+_SET_ENTRIES_READ_STATE_QUERY = """
+    UPDATE MailboxEntry SET read = ?3
+    WHERE emailId = ?1 AND folder = 'received'
+        AND messageId IN (SELECT value FROM json_each(?2))
+"""
+# ?1 is the email ID, ?2 the change of the number of unread messages
+_COUNT_READ_STATE_QUERY = """
+    UPDATE MailboxCounter SET unread = unread + ?2 WHERE emailId = ?1
+"""
+# ?1 is the sender email ID, ?2 its new address
+_RENAME_SENDER_QUERY = """
+    UPDATE MailboxEntry SET fromAddress = ?2
+    WHERE messageId IN (SELECT m.id FROM Message m WHERE m.fromId = ?1)
+"""
+# ?1 is the email ID and ?2 the folder
+_FOLDER_QUERY = """
+    SELECT messageId AS id, subject, fromAddress, sentAt, snippet, recipientCount,
+        read
+    FROM MailboxEntry
+    WHERE emailId = ?1 AND folder = ?2 AND deleted = 0
+"""
+# keyset condition on (sentAt, messageId), ?3 and ?4 are the sending date, in
+# epoch milliseconds as stored by Prisma, and the ID of the cursor message
+_FOLDER_CURSOR_CLAUSE = """
+    AND (sentAt, messageId) > (?3, ?4)
+"""
+
+
+async def add_mailbox_entries(prisma: Prisma, id_messages: list[str]) -> None:
+    """
+    Add messages to the folders of their sender and recipients, and count them.
+
+    It should be called within the transaction inserting the messages, once their
+    recipients are inserted.
+
+    Args:
+        prisma: DB connection.
+        id_messages: IDs of messages inserted.
+
+    Returns:
+
+    """
+    if id_messages:
+        await prisma.execute_raw(_ADD_ENTRIES_QUERY, dumps(id_messages), SNIPPET_LENGTH)
+        await prisma.execute_raw(_COUNT_ADDED_ENTRIES_QUERY, dumps(id_messages))
+
+
+async def delete_mailbox_entries(
+    prisma: Prisma, id_email_address: str, id_messages: list[str]
+) -> None:
+    """
+    Flag messages as deleted in the folders of an email address, and uncount them.
+
+    Entries are deleted with their message, once the message is purged.
+    It should be called within the transaction flagging the messages as deleted.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID that deletes messages.
+        id_messages: IDs of messages deleted for this email address.
+
+    Returns:
+
+    """
+    if id_messages:
+        await prisma.execute_raw(
+            _COUNT_DELETED_ENTRIES_QUERY, id_email_address, dumps(id_messages)
+        )
+        await prisma.execute_raw(
+            _DELETE_ENTRIES_QUERY, id_email_address, dumps(id_messages)
+        )
+
+
+async def set_read_state(
+    prisma: Prisma, id_email_address: str, id_messages: list[str], read: bool
+) -> list[str]:
+    """
+    Mark received messages as read or unread for an email address.
+
+    Only messages visible in the received folder, and not already in this state,
+    are changed. It should be called within a transaction.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID that reads messages.
+        id_messages: IDs of messages to mark.
+        read: Indicates if messages are marked as read or unread.
+
+    Returns:
+        list[str]: IDs of messages changed.
+    """
+    rows = await prisma.query_raw(
+        _READ_STATE_CHANGES_QUERY, id_email_address, dumps(id_messages), int(read)
+    )
+    id_changed_messages = [row["messageId"] for row in rows]
+    if not id_changed_messages:
+        return []
+
+    for query in (_SET_RECIPIENTS_READ_STATE_QUERY, _SET_ENTRIES_READ_STATE_QUERY):
+        await prisma.execute_raw(
+            query, id_email_address, dumps(id_changed_messages), int(read)
+        )
+    await prisma.execute_raw(
+        _COUNT_READ_STATE_QUERY,
+        id_email_address,
+        -len(id_changed_messages) if read else len(id_changed_messages),
+    )
+
+    return id_changed_messages
+
+
+async def get_mailbox_counters(prisma: Prisma, id_email_address: str) -> MailboxCounter:
+    """
+    Get the number of messages and of unread messages received by an email address.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID.
+
+    Returns:
+        MailboxCounter: Counters of the received folder, zero if it never
+            received a message.
+    """
+    counter = await prisma.mailboxcounter.find_unique(
+        where={"emailId": id_email_address}
+    )
+    if counter is None:
+        return MailboxCounter(emailId=id_email_address, total=0, unread=0)
+
+    return counter
+
+
+async def rename_sender_address(
+    prisma: Prisma, id_email_address: str, address: str
+) -> None:
+    """
+    Update the sender address of entries of messages sent by an email address.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID renamed.
+        address: New address.
+
+    Returns:
+
+    """
+    await prisma.execute_raw(_RENAME_SENDER_QUERY, id_email_address, address)
+
+
+async def get_folder_summaries(
+    prisma: Prisma,
+    id_email_address: str,
+    folder: MailboxFolder,
+    cursor_position: Optional[tuple[datetime, str]],
+    limit: Optional[int],
+) -> list[MessageSummary]:
+    """
+    Get summaries of messages of a folder, ordered on (sentAt, id).
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID whose folder is read.
+        folder: Folder to read.
+        cursor_position: Sending date and ID of the last message of the previous
+            page, which may have been deleted since.
+        limit: Page size, all messages are returned if not given.
+
+    Returns:
+        list[MessageSummary]: Summaries of messages, with one extra summary if a next
+            page exists.
+    """
+    # a negative limit means no limit in SQLite
+    size = -1 if limit is None else limit + 1
+
+    if cursor_position is None:
+        return await prisma.query_raw(
+            _FOLDER_QUERY + "ORDER BY sentAt, messageId LIMIT ?3",
+            id_email_address,
+            folder,
+            size,
+            model=MessageSummary,
+        )
+
+    sent_at, id_message = cursor_position
+    return await prisma.query_raw(
+        _FOLDER_QUERY + _FOLDER_CURSOR_CLAUSE + "ORDER BY sentAt, messageId LIMIT ?5",
+        id_email_address,
+        folder,
+        to_epoch_milliseconds(sent_at),
+        id_message,
+        size,
+        model=MessageSummary,
+    )
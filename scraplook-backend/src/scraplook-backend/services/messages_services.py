@@ -2,62 +2,268 @@
 Service module to manage Messages in email addresses.
 """
 
-from models.message import MessageInput
-from prisma import Prisma, errors
-from prisma.models import Message
+from datetime import datetime, timedelta
+from json import dumps
+from typing import Any, AsyncIterator, Iterator, Optional, TypeVar
+from uuid import uuid4
+
+from models.message import (
+    BulkDeleteInput,
+    BulkDeleteResult,
+    MessageInput,
+    MessagePage,
+    MessageSummary,
+    MessageSummaryPage,
+    ReadStateInput,
+)
+from prisma import Prisma
+from prisma.models import MailboxCounter, Message
+from prisma.types import MessageRecipientWhereInput, MessageWhereInput
+from services.changes_services import record_mailbox_changes
+from services.mailbox_entries_services import (
+    MailboxFolder,
+    add_mailbox_entries,
+    delete_mailbox_entries,
+    get_folder_summaries,
+    get_mailbox_counters,
+    set_read_state,
+)
+from services.notification_services import publish_new_messages
+from services.search_services import index_messages
+from utils.pagination import decode_message_cursor, encode_message_cursor
+
+# listings are ordered on (sentAt, id), matching the Message composite indexes
+MESSAGES_ORDER: list[dict[str, Any]] = [{"sentAt": "asc"}, {"id": "asc"}]
+
+# maximum number of IDs in the `in` filter of a bulk statement
+BULK_CHUNK_SIZE = 500
+# bulk writes on large mailboxes take longer than the default transaction timeout
+BULK_TX_TIMEOUT = timedelta(minutes=5)
+# number of messages inserted per transaction by batch sends
+BATCH_SEND_CHUNK_SIZE = 200
+# number of messages read per query by mailbox exports
+EXPORT_CHUNK_SIZE = 500
+
+PageItemT = TypeVar("PageItemT", Message, MessageSummary)
+
+# messages deleted by sender and all recipients, ?1 is a JSON array of message IDs
+_PURGEABLE_MESSAGES_QUERY = """
+    SELECT m.id FROM Message m
+    WHERE m.id IN (SELECT value FROM json_each(?1))
+        AND m.deleted_by_sender = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM MessageRecipient r
+            WHERE r.messageId = m.id AND r.deletes_message = 0
+        )
+"""
+
+
+def _after_message_filter(sent_at: datetime, id_message: str) -> MessageWhereInput:
+    """
+    Build the keyset condition selecting messages after a position in a listing
+    ordered on (sentAt, id).
+
+    Args:
+        sent_at: Sending date of the last message of the previous page.
+        id_message: ID of the last message of the previous page.
+
+    Returns:
+        MessageWhereInput: Condition on (sentAt, id), that holds even if the message
+            at the position was deleted.
+    """
+    return {
+        "OR": [
+            {"sentAt": {"gt": sent_at}},
+            {"sentAt": sent_at, "id": {"gt": id_message}},
+        ]
+    }
+
+
+def _split_page(
+    items: list[PageItemT], limit: int
+) -> tuple[list[PageItemT], Optional[str]]:
+    """
+    Split a listing fetched with one extra item into a page and its next cursor.
+
+    Args:
+        items: Items fetched, with at most one item more than the page size.
+        limit: Page size.
+
+    Returns:
+        tuple[list, Optional[str]]: Items of the page and cursor of the next page if any.
+    """
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    return items, encode_message_cursor(items[-1].sentAt, items[-1].id)
+
+
+def build_message_page(messages: list[Message], limit: int) -> MessagePage:
+    """
+    Build a page of messages from a listing fetched with a page size of `limit`.
+
+    Args:
+        messages: Messages fetched, with at most one message more than the page size.
+        limit: Page size.
+
+    Returns:
+        MessagePage: Page of messages, with the cursor of the next page if any.
+    """
+    items, next_cursor = _split_page(messages, limit)
+    return MessagePage(items=items, next_cursor=next_cursor)
+
+
+def build_message_summary_page(
+    summaries: list[MessageSummary], limit: int
+) -> MessageSummaryPage:
+    """
+    Build a page of message summaries from a listing fetched with a page size of `limit`.
+
+    Args:
+        summaries: Summaries fetched, with at most one summary more than the page size.
+        limit: Page size.
+
+    Returns:
+        MessageSummaryPage: Page of summaries, with the cursor of the next page if any.
+    """
+    items, next_cursor = _split_page(summaries, limit)
+    return MessageSummaryPage(items=items, next_cursor=next_cursor)
+
+
+async def _get_folder_messages(
+    prisma: Prisma,
+    id_email_address: str,
+    folder: MailboxFolder,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> list[Message]:
+    """
+    Get messages of a folder, with their sender and recipients.
+
+    The page of message IDs is read from mailbox entries, then messages are read
+    by ID.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID whose folder is read.
+        folder: Folder to read.
+        cursor: Opaque cursor of the last message of the previous page.
+        limit: Page size, all messages are returned if not given.
+
+    Returns:
+        list[Message]: Messages of the folder, with one extra message if a next
+            page exists.
+    """
+    cursor_position = None if cursor is None else decode_message_cursor(cursor)
+    summaries = await get_folder_summaries(
+        prisma, id_email_address, folder, cursor_position, limit
+    )
+
+    messages: list[Message] = []
+    for chunk in _chunks([summary.id for summary in summaries]):
+        messages += await prisma.message.find_many(
+            where={"id": {"in": chunk}},
+            include={
+                "recipients": {
+                    "include": {"email": True}  # optional: to get email details too
+                },
+                "fromEmail": True,
+            },
+            order=MESSAGES_ORDER,
+        )
+    return messages
 
 
 async def get_user_messages_sent(
-    prisma: Prisma, id_email_address: str
+    prisma: Prisma,
+    id_email_address: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
 ) -> list[Message]:
     """
-    Get all user messages sent by given email address in DB.
+    Get user messages sent by given email address in DB.
 
     Args:
         prisma: DB connection.
         id_email_address: Email address ID to retrieve sent messages.
+        cursor: Opaque cursor of the last message of the previous page.
+        limit: Page size, all messages are returned if not given.
 
     Returns:
         list[Message]: Messages sent by given email address.
     """
-    return await prisma.message.find_many(
-        where={"fromId": id_email_address, "deleted_by_sender": False},
-        include={
-            "recipients": {
-                "include": {"email": True}  # optional: to get email details too
-            },
-            "fromEmail": True,
-        },
-        order={"sentAt": "asc"},
-    )
+    return await _get_folder_messages(prisma, id_email_address, "sent", cursor, limit)
 
 
 async def get_user_messages_received(
-    prisma: Prisma, id_email_address: str
+    prisma: Prisma,
+    id_email_address: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
 ) -> list[Message]:
     """
-    Get all user messages received by given email address in DB.
+    Get user messages received by given email address in DB.
 
     Args:
         prisma: DB connection.
         id_email_address: Email address ID to retrieve received messages.
+        cursor: Opaque cursor of the last message of the previous page.
+        limit: Page size, all messages are returned if not given.
 
     Returns:
         list[Message]: Messages received by given email address.
     """
-    return await prisma.message.find_many(
-        where={
-            "recipients": {
-                "some": {"emailId": id_email_address, "deletes_message": False}
-            },
-        },
-        include={
-            "recipients": {
-                "include": {"email": True}  # optional: to get email details too
-            },
-            "fromEmail": True,
-        },
-        order={"sentAt": "asc"},
+    return await _get_folder_messages(
+        prisma, id_email_address, "received", cursor, limit
+    )
+
+
+async def get_user_messages_sent_summary(
+    prisma: Prisma, id_email_address: str, cursor: Optional[str], limit: int
+) -> list[MessageSummary]:
+    """
+    Get summaries of user messages sent by given email address in DB.
+
+    Only the columns displayed in a listing are read, from mailbox entries.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID to retrieve sent messages.
+        cursor: Opaque cursor of the last message of the previous page.
+        limit: Page size.
+
+    Returns:
+        list[MessageSummary]: Summaries of messages sent, with one extra summary
+            if a next page exists.
+    """
+    cursor_position = None if cursor is None else decode_message_cursor(cursor)
+    return await get_folder_summaries(
+        prisma, id_email_address, "sent", cursor_position, limit
+    )
+
+
+async def get_user_messages_received_summary(
+    prisma: Prisma, id_email_address: str, cursor: Optional[str], limit: int
+) -> list[MessageSummary]:
+    """
+    Get summaries of user messages received by given email address in DB.
+
+    Only the columns displayed in a listing are read, from mailbox entries.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID to retrieve received messages.
+        cursor: Opaque cursor of the last message of the previous page.
+        limit: Page size.
+
+    Returns:
+        list[MessageSummary]: Summaries of messages received, with one extra summary
+            if a next page exists.
+    """
+    cursor_position = None if cursor is None else decode_message_cursor(cursor)
+    return await get_folder_summaries(
+        prisma, id_email_address, "received", cursor_position, limit
     )
 
 
@@ -83,6 +289,63 @@ async def get_user_message(prisma: Prisma, id_message: str) -> Message:
     )
 
 
+def export_mailbox(
+    prisma: Prisma,
+    id_email_address: str,
+    cursor: Optional[str] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> AsyncIterator[list[Message]]:
+    """
+    Walk through all messages sent or received by an email address, by chunks.
+
+    Only one chunk is held in memory at a time. Each chunk is read with its own
+    query, so messages sent during the export after the current position are
+    exported too.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID whose mailbox is exported.
+        cursor: Opaque cursor of the last message already exported.
+        chunk_size: Number of messages read per query.
+
+    Returns:
+        AsyncIterator[list[Message]]: Chunks of messages, with their recipients,
+            ordered on (sentAt, id).
+    """
+    # the cursor is decoded before the walk starts, so it fails on the call itself
+    position = None if cursor is None else decode_message_cursor(cursor)
+    mailbox_filter: MessageWhereInput = {
+        "OR": [
+            {"fromId": id_email_address, "deleted_by_sender": False},
+            {
+                "recipients": {
+                    "some": {"emailId": id_email_address, "deletes_message": False}
+                }
+            },
+        ]
+    }
+
+    async def walk() -> AsyncIterator[list[Message]]:
+        after = position
+        while True:
+            where = mailbox_filter
+            if after is not None:
+                where = {"AND": [mailbox_filter, _after_message_filter(*after)]}
+            messages = await prisma.message.find_many(
+                where=where,
+                include={"recipients": True},
+                order=MESSAGES_ORDER,
+                take=chunk_size,
+            )
+            if messages:
+                yield messages
+            if len(messages) < chunk_size:
+                return
+            after = (messages[-1].sentAt, messages[-1].id)
+
+    return walk()
+
+
 async def send_message(prisma: Prisma, message_info: MessageInput) -> None:
     """
     Add new sent message from given email address to DB.
@@ -94,20 +357,131 @@ async def send_message(prisma: Prisma, message_info: MessageInput) -> None:
     Returns:
 
     """
-    await prisma.message.create(
-        data={
-            "subject": message_info.subject,
-            "body": message_info.body,
-            "fromId": message_info.fromId,
-            "recipients": {
-                "create": [
-                    {"emailId": recipient.emailId, "type": recipient.type}
-                    for recipient in message_info.recipients
-                ]
-            },
-        },
+    async with prisma.tx() as transaction:
+        id_messages = await insert_messages(transaction, [message_info])
+
+    publish_new_messages(id_messages, [message_info])
+
+
+async def find_unknown_email_addresses(
+    prisma: Prisma, messages_info: list[MessageInput]
+) -> list[str]:
+    """
+    Find senders and recipients of messages that are not existing email addresses.
+
+    Args:
+        prisma: DB connection.
+        messages_info: Messages to send.
+
+    Returns:
+        list[str]: Unknown email address IDs.
+    """
+    id_email_addresses = list(
+        dict.fromkeys(
+            id_email_address
+            for message_info in messages_info
+            for id_email_address in (
+                message_info.fromId,
+                *(recipient.emailId for recipient in message_info.recipients),
+            )
+        )
     )
 
+    known = set()
+    for chunk in _chunks(id_email_addresses):
+        emails = await prisma.email.find_many(where={"id": {"in": chunk}})
+        known.update(email.id for email in emails)
+
+    return [id_email for id_email in id_email_addresses if id_email not in known]
+
+
+async def send_messages_batch(
+    prisma: Prisma,
+    messages_info: list[MessageInput],
+    chunk_size: int = BATCH_SEND_CHUNK_SIZE,
+) -> AsyncIterator[int]:
+    """
+    Add many new sent messages to DB, by chunks.
+
+    Each chunk is inserted in its own transaction, so a failure only cancels the
+    chunk being inserted. Senders and recipients are expected to be checked
+    with `find_unknown_email_addresses` beforehand.
+
+    Args:
+        prisma: DB connection.
+        messages_info: Messages information to add in DB.
+        chunk_size: Number of messages inserted per transaction.
+
+    Returns:
+        AsyncIterator[int]: Number of messages inserted, after each chunk.
+    """
+    sent = 0
+    for start in range(0, len(messages_info), chunk_size):
+        chunk = messages_info[start : start + chunk_size]
+        async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+            id_messages = await insert_messages(transaction, chunk)
+        publish_new_messages(id_messages, chunk)
+        sent += len(chunk)
+        yield sent
+
+
+async def insert_messages(
+    prisma: Prisma, messages_info: list[MessageInput]
+) -> list[str]:
+    """
+    Insert messages and their recipients with one statement per table.
+
+    It should be called within a transaction, as the mailbox entries, the search
+    index and the change log of sender and recipient mailboxes are also updated.
+
+    Args:
+        prisma: DB connection.
+        messages_info: Messages information to add in DB.
+
+    Returns:
+        list[str]: IDs of messages inserted.
+    """
+    id_messages = [str(uuid4()) for _ in messages_info]
+
+    await prisma.message.create_many(
+        data=[
+            {
+                "id": id_message,
+                "subject": message_info.subject,
+                "body": message_info.body,
+                "fromId": message_info.fromId,
+            }
+            for id_message, message_info in zip(id_messages, messages_info)
+        ]
+    )
+    await prisma.messagerecipient.create_many(
+        data=[
+            {
+                "messageId": id_message,
+                "emailId": recipient.emailId,
+                "type": recipient.type,
+            }
+            for id_message, message_info in zip(id_messages, messages_info)
+            for recipient in message_info.recipients
+        ]
+    )
+    await add_mailbox_entries(prisma, id_messages)
+    await index_messages(prisma, id_messages)
+
+    changes = [
+        (id_email_address, id_message)
+        for id_message, message_info in zip(id_messages, messages_info)
+        for id_email_address in dict.fromkeys(
+            [
+                message_info.fromId,
+                *(recipient.emailId for recipient in message_info.recipients),
+            ]
+        )
+    ]
+    await record_mailbox_changes(prisma, "insert", changes)
+
+    return id_messages
+
 
 async def safe_delete_message(
     prisma: Prisma, id_email_address: str, id_message: str
@@ -116,6 +490,9 @@ async def safe_delete_message(
     Delete message from given email address in DB.
 
     The message is not deleted, it's only not visible for the user who deletes this message.
+    Unlike `safe_delete_messages`, flags are updated by key, and the message is read
+    once with its recipients, after the updates, to find whether it can be deleted
+    completely, instead of querying it.
 
     Args:
         prisma: DB connection.
@@ -125,31 +502,188 @@ async def safe_delete_message(
     Returns:
 
     """
-    # retrieve message information
-    try:
-        message = await get_user_message(prisma, id_message)
-    except errors.RecordNotFoundError:
-        # message to delete doesn't exist, so return
-        return
-
-    # update message information depending on email address which sent the message
-    if message.fromId == id_email_address:
-        await prisma.message.update(
-            where={"id": id_message}, data={"deleted_by_sender": True}
+    async with prisma.tx() as transaction:
+        sent = await transaction.message.update_many(
+            where={
+                "id": id_message,
+                "fromId": id_email_address,
+                "deleted_by_sender": False,
+            },
+            data={"deleted_by_sender": True},
         )
-    else:
-        await prisma.messagerecipient.update(
+        received = await transaction.messagerecipient.update_many(
             where={
-                "messageId_emailId": {
-                    "messageId": id_message,
-                    "emailId": id_email_address,
-                }
+                "messageId": id_message,
+                "emailId": id_email_address,
+                "deletes_message": False,
             },
             data={"deletes_message": True},
         )
+        if not sent and not received:
+            return
+
+        await delete_mailbox_entries(transaction, id_email_address, [id_message])
+        await record_mailbox_changes(
+            transaction, "delete", [(id_email_address, id_message)]
+        )
+
+        # read after the updates, so that deletions committed meanwhile by other
+        # parties are seen
+        message = await transaction.message.find_unique(
+            where={"id": id_message}, include={"recipients": True}
+        )
+        if message is None:
+            return
+        recipients = message.recipients or []
+
+        if message.deleted_by_sender and all(
+            recipient.deletes_message for recipient in recipients
+        ):
+            await transaction.message.delete(where={"id": id_message})
+
+
+async def bulk_safe_delete_messages(
+    prisma: Prisma, delete_info: BulkDeleteInput
+) -> list[BulkDeleteResult]:
+    """
+    Delete several messages from given email address in DB, in one transaction.
+
+    Args:
+        prisma: DB connection.
+        delete_info: Email address and messages to delete.
+
+    Returns:
+        list[BulkDeleteResult]: Outcome for each message ID given, or for each message
+            deleted if messages are only selected by sending date.
+    """
+    message_filter: MessageWhereInput = {}
+    if delete_info.id_messages is not None:
+        message_filter["id"] = {"in": delete_info.id_messages}
+    if delete_info.sent_before is not None:
+        message_filter["sentAt"] = {"lt": delete_info.sent_before}
+
+    async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+        id_deleted_messages, id_purged_messages = await safe_delete_messages(
+            transaction, delete_info.id_email_address, message_filter
+        )
 
-    # try to delete this message
-    await delete_message(prisma=prisma, id_message=id_message)
+    deleted, purged = set(id_deleted_messages), set(id_purged_messages)
+    id_messages = delete_info.id_messages
+    if id_messages is None:
+        id_messages = id_deleted_messages
+
+    return [
+        BulkDeleteResult(
+            id=id_message,
+            status=(
+                "purged"
+                if id_message in purged
+                else "deleted" if id_message in deleted else "not_found"
+            ),
+        )
+        for id_message in dict.fromkeys(id_messages)
+    ]
+
+
+async def safe_delete_messages(
+    prisma: Prisma,
+    id_email_address: str,
+    message_filter: MessageWhereInput,
+    log_changes: bool = True,
+) -> tuple[list[str], list[str]]:
+    """
+    Delete messages matching a filter from given email address in DB.
+
+    Messages are flagged as deleted for this email address with one update per table,
+    then messages deleted by sender and all recipients are deleted completely.
+    It should be called within a transaction.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID that deletes messages.
+        message_filter: Filter on messages to delete, all messages of the email
+            address if empty.
+        log_changes: Indicates if deletions are added to the change log of the
+            mailbox, useless when the email address itself is deleted.
+
+    Returns:
+        tuple[list[str], list[str]]: IDs of messages deleted for this email address,
+            and IDs of messages deleted completely.
+    """
+    sent_filter: MessageWhereInput = {
+        "AND": [
+            message_filter,
+            {"fromId": id_email_address, "deleted_by_sender": False},
+        ]
+    }
+    received_filter: MessageRecipientWhereInput = {
+        "emailId": id_email_address,
+        "deletes_message": False,
+        "message": {"is": message_filter},
+    }
+
+    # group by ID to only read message IDs, not message bodies
+    sent_messages = await prisma.message.group_by(by=["id"], where=sent_filter)
+    received_messages = await prisma.messagerecipient.group_by(
+        by=["messageId"], where=received_filter
+    )
+    id_deleted_messages = list(
+        dict.fromkeys(
+            [message["id"] for message in sent_messages]
+            + [message["messageId"] for message in received_messages]
+        )
+    )
+    if not id_deleted_messages:
+        return [], []
+
+    await prisma.message.update_many(
+        where=sent_filter, data={"deleted_by_sender": True}
+    )
+    await prisma.messagerecipient.update_many(
+        where=received_filter, data={"deletes_message": True}
+    )
+    await delete_mailbox_entries(prisma, id_email_address, id_deleted_messages)
+    if log_changes:
+        await record_mailbox_changes(
+            prisma,
+            "delete",
+            [(id_email_address, id_message) for id_message in id_deleted_messages],
+        )
+
+    return id_deleted_messages, await purge_deleted_messages(
+        prisma, id_deleted_messages
+    )
+
+
+async def set_messages_read_state(
+    prisma: Prisma, read_info: ReadStateInput, read: bool
+) -> MailboxCounter:
+    """
+    Mark several received messages as read or unread for an email address, in one
+    transaction.
+
+    Args:
+        prisma: DB connection.
+        read_info: Email address and messages to mark.
+        read: Indicates if messages are marked as read or unread.
+
+    Returns:
+        MailboxCounter: Counters of the received folder after the change.
+    """
+    id_email_address = read_info.id_email_address
+
+    async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+        id_changed_messages = await set_read_state(
+            transaction, id_email_address, read_info.id_messages, read
+        )
+        await record_mailbox_changes(
+            transaction,
+            "read" if read else "unread",
+            [(id_email_address, id_message) for id_message in id_changed_messages],
+        )
+        counters = await get_mailbox_counters(transaction, id_email_address)
+
+    return counters
 
 
 async def delete_message(prisma: Prisma, id_message: str) -> None:
@@ -157,6 +691,7 @@ async def delete_message(prisma: Prisma, id_message: str) -> None:
     Delete completely message from given email address in DB.
 
     The message is deleted only if sender and all recipients delete the message.
+    Nothing is added to change logs, as each of them already logged its deletion.
 
     Args:
         prisma: DB connection.
@@ -165,15 +700,46 @@ async def delete_message(prisma: Prisma, id_message: str) -> None:
     Returns:
 
     """
-    # retrieve message information
-    try:
-        message = await get_user_message(prisma, id_message)
-    except errors.RecordNotFoundError:
-        # message to delete doesn't exist, so return
-        return
+    async with prisma.tx() as transaction:
+        await purge_deleted_messages(transaction, [id_message])
+
+
+async def purge_deleted_messages(prisma: Prisma, id_messages: list[str]) -> list[str]:
+    """
+    Delete completely, among given messages, those deleted by sender and all recipients.
+
+    It should be called within a transaction.
+    Mailbox entries and search index rows are deleted with the messages.
+
+    Args:
+        prisma: DB connection.
+        id_messages: IDs of messages to delete if possible.
+
+    Returns:
+        list[str]: IDs of messages deleted.
+    """
+    if not id_messages:
+        return []
+
+    rows = await prisma.query_raw(_PURGEABLE_MESSAGES_QUERY, dumps(id_messages))
+    id_purged_messages = [row["id"] for row in rows]
+
+    for chunk in _chunks(id_purged_messages):
+        await prisma.message.delete_many(where={"id": {"in": chunk}})
+
+    return id_purged_messages
+
+
+def _chunks(values: list[str], size: int = BULK_CHUNK_SIZE) -> Iterator[list[str]]:
+    """
+    Split values in chunks, to keep `in` filters under SQLite parameter limits.
+
+    Args:
+        values: Values to split.
+        size: Maximum size of a chunk.
 
-    # if all users deleted this message, delete the message on db
-    if message.deleted_by_sender and all(
-        recipient.deletes_message for recipient in message.recipients
-    ):
-        await prisma.message.delete(where={"id": message.id})
+    Returns:
+        Iterator[list[str]]: Chunks of values.
+    """
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
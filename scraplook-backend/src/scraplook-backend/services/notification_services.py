@@ -0,0 +1,83 @@
+"""
+Service module to push events about new messages to subscribed mailboxes.
+
+Events are published in-process: a client only receives messages sent through
+the same server process.
+"""
+
+from models.message import MessageInput
+from utils.pubsub import PubSub, Subscription
+from config.app_config import get_app_config
+
+# new message events, by recipient email address ID
+_mailbox_events: PubSub[dict] = PubSub(
+    max_pending=get_app_config().env_data.push_max_pending
+)
+
+
+def publish_new_messages(
+    id_messages: list[str], messages_info: list[MessageInput]
+) -> None:
+    """
+    Notify recipients of messages just sent.
+
+    It must be called once messages are committed, so that subscribers can read them.
+
+    Args:
+        id_messages: IDs of messages sent.
+        messages_info: Information of messages sent, in the same order.
+
+    Returns:
+
+    """
+    for id_message, message_info in zip(id_messages, messages_info):
+        for id_email_address in {
+            recipient.emailId for recipient in message_info.recipients
+        }:
+            _mailbox_events.publish(
+                id_email_address,
+                {
+                    "type": "new_message",
+                    "emailId": id_email_address,
+                    "id": id_message,
+                    "fromId": message_info.fromId,
+                    "subject": message_info.subject,
+                },
+            )
+
+
+def subscribe_mailboxes(id_email_addresses: frozenset[str]) -> Subscription[dict]:
+    """
+    Subscribe to new messages received by email addresses.
+
+    Args:
+        id_email_addresses: Email address IDs to watch.
+
+    Returns:
+        Subscription[dict]: Subscription receiving new message events.
+    """
+    return _mailbox_events.subscribe(id_email_addresses)
+
+
+def unsubscribe_mailboxes(subscription: Subscription[dict]) -> None:
+    """
+    Stop a subscription created by `subscribe_mailboxes`.
+
+    Args:
+        subscription: Subscription to stop.
+
+    Returns:
+
+    """
+    _mailbox_events.unsubscribe(subscription)
+
+
+def get_push_stats() -> dict[str, int]:
+    """
+    Get usage counters of new message events.
+
+    Returns:
+        dict[str, int]: Number of events published and dropped, of watched email
+            addresses and of subscriptions.
+    """
+    return _mailbox_events.stats()
@@ -0,0 +1,207 @@
+"""
+Service module to manage the full-text search index of messages.
+
+The index is a SQLite FTS5 table, `MessageSearch`, created by the migrations. It
+holds a copy of the subject and body of each message, and the IDs of its sender
+and recipients in a `parties` column, so that a search is scoped to one email
+address within the FTS query itself: only the messages of this email address are
+ranked and read, whatever the number of matches in other mailboxes. Only the term
+statistics used by the ranking come from the whole index.
+
+Rows are keyed by `MessageSearchDocument.id`, an explicit integer key that, unlike
+the implicit rowid of `Message`, is kept by `VACUUM` and table rebuilds. Triggers
+of the migrations fill the index when a document is added, and empty it when the
+document is deleted along with its message.
+"""
+
+from json import dumps
+from re import UNICODE, findall
+from typing import Optional
+
+from models.message import SNIPPET_LENGTH, MessageSearchPage, MessageSearchResult
+from prisma import Prisma
+from utils.pagination import InvalidCursorException, decode_cursor, encode_cursor
+
+# ?1 is a JSON array of message IDs, whose sender and recipients are inserted
+_INDEX_MESSAGES_QUERY = """
+    INSERT INTO MessageSearchDocument (messageId)
+    SELECT value FROM json_each(?1)
+"""
+# ?1 is the FTS query scoped to the email address, ?2 the snippet length, ?3 the
+# email ID; messages deleted by the email address are still indexed with it
+_SEARCH_QUERY = """
+    WITH hits AS (
+        SELECT messageId, bm25(MessageSearch, 0.0, 0.0, 1.0, 1.0) AS rank
+        FROM MessageSearch WHERE MessageSearch MATCH ?1
+    )
+    SELECT m.id, m.subject, e.address AS fromAddress, m.sentAt,
+        substr(m.body, 1, ?2) AS snippet,
+        (SELECT COUNT(*) FROM MessageRecipient r WHERE r.messageId = m.id)
+            AS recipientCount,
+        COALESCE(
+            (SELECT r.read FROM MessageRecipient r
+            WHERE r.messageId = m.id AND r.emailId = ?3), 1
+        ) AS read,
+        h.rank
+    FROM hits h
+    JOIN Message m ON m.id = h.messageId
+    JOIN Email e ON e.id = m.fromId
+    WHERE (
+        (m.fromId = ?3 AND m.deleted_by_sender = 0)
+        OR EXISTS (
+            SELECT 1 FROM MessageRecipient mr
+            WHERE mr.messageId = m.id AND mr.emailId = ?3 AND mr.deletes_message = 0
+        )
+    )
+"""
+# keyset condition on (rank, id), ?4 and ?5 are the rank and ID of the cursor message
+_SEARCH_CURSOR_CLAUSE = """
+    AND (h.rank, m.id) > (?4, ?5)
+"""
+
+
+def build_search_query(terms: str, prefix: bool = True) -> Optional[str]:
+    """
+    Build a FTS5 query matching all words of a user search.
+
+    Words are quoted so that FTS5 operators typed by the user are searched as text.
+
+    Args:
+        terms: Words typed by the user.
+        prefix: Indicates if words also match longer words starting with them.
+
+    Returns:
+        Optional[str]: FTS5 query, None if the search contains no word.
+    """
+    words = findall(r"\w+", terms, UNICODE)
+    if not words:
+        return None
+
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{word}"{suffix}' for word in words)
+
+
+async def clear_search_index(prisma: Prisma) -> None:
+    """
+    Remove all messages from the search index at once, before all messages are
+    deleted.
+
+    Args:
+        prisma: DB connection.
+
+    Returns:
+
+    """
+    await prisma.execute_raw("DELETE FROM MessageSearch")
+
+
+async def index_messages(prisma: Prisma, id_messages: list[str]) -> None:
+    """
+    Add messages to the search index.
+
+    It must be called once the recipients of the messages are inserted. Messages
+    are removed from the index when they are deleted.
+
+    Args:
+        prisma: DB connection.
+        id_messages: IDs of messages just created.
+
+    Returns:
+
+    """
+    if id_messages:
+        await prisma.execute_raw(_INDEX_MESSAGES_QUERY, dumps(id_messages))
+
+
+def _scope_search_query(id_email_address: str, search_query: str) -> str:
+    """
+    Restrict a search to the messages of an email address, within the FTS query.
+
+    IDs are written in the `parties` column without their hyphens by the triggers
+    of the migrations, so that each ID is a single token.
+
+    Args:
+        id_email_address: Email address ID whose messages are searched.
+        search_query: FTS5 query on subjects and bodies.
+
+    Returns:
+        str: FTS5 query matching the email address and the search in the same row.
+    """
+    token = id_email_address.replace("-", "").replace('"', '""')
+    return f'parties : "{token}" AND {{subject body}} : ({search_query})'
+
+
+def _search_cursor_position(cursor: str) -> tuple[float, str]:
+    """
+    Retrieve the rank and ID of the last result of a page from its opaque cursor.
+
+    Args:
+        cursor: Opaque cursor of the last result of the previous page.
+
+    Returns:
+        tuple[float, str]: Rank and message ID stored in the cursor.
+    """
+    position = decode_cursor(cursor)
+    rank, id_message = position.get("rank"), position.get("id")
+    if not isinstance(rank, (int, float)) or not isinstance(id_message, str):
+        raise InvalidCursorException(f"Invalid cursor '{cursor}'")
+
+    return rank, id_message
+
+
+async def search_messages(
+    prisma: Prisma,
+    id_email_address: str,
+    search_query: str,
+    cursor: Optional[str],
+    limit: int,
+) -> MessageSearchPage:
+    """
+    Search messages sent or received by an email address, best matches first.
+
+    Results are ordered on (rank, id). As ranks depend on the whole index, pages
+    fetched while messages are added or deleted may slightly overlap.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID whose messages are searched.
+        search_query: FTS5 query on subjects and bodies, see `build_search_query`.
+        cursor: Opaque cursor of the last result of the previous page.
+        limit: Page size.
+
+    Returns:
+        MessageSearchPage: Page of results, with the cursor of the next page if any.
+    """
+    # the email address is matched by the index, so only its messages are ranked
+    scoped_query = _scope_search_query(id_email_address, search_query)
+
+    if cursor is None:
+        results = await prisma.query_raw(
+            _SEARCH_QUERY + "ORDER BY h.rank, m.id LIMIT ?4",
+            scoped_query,
+            SNIPPET_LENGTH,
+            id_email_address,
+            limit + 1,
+            model=MessageSearchResult,
+        )
+    else:
+        rank, id_message = _search_cursor_position(cursor)
+        results = await prisma.query_raw(
+            _SEARCH_QUERY + _SEARCH_CURSOR_CLAUSE + "ORDER BY h.rank, m.id LIMIT ?6",
+            scoped_query,
+            SNIPPET_LENGTH,
+            id_email_address,
+            rank,
+            id_message,
+            limit + 1,
+            model=MessageSearchResult,
+        )
+
+    if len(results) <= limit:
+        return MessageSearchPage(items=results, next_cursor=None)
+
+    items = results[:limit]
+    return MessageSearchPage(
+        items=items,
+        next_cursor=encode_cursor({"rank": items[-1].rank, "id": items[-1].id}),
+    )
@@ -0,0 +1,249 @@
+"""
+Service module to generate large synthetic datasets, e.g. for benchmarks.
+
+Rows are drawn from a seeded random generator, so that a seed and a scale always
+give the same dataset, IDs included. They are inserted with `create_many`, one
+transaction per batch of messages, and messages are added to mailbox entries,
+counters and the search index as sent messages are. All users share one password
+hash, computed once. The change log of mailboxes is left empty: clients read the
+current sequence number before a full load anyway.
+"""
+
+from datetime import datetime, timedelta, timezone
+from math import log
+from random import Random
+from time import perf_counter
+from typing import Any, AsyncIterator, Iterator
+from uuid import UUID
+
+from models.seeder import SyntheticDatasetInput, SyntheticDatasetProgress
+from prisma import Prisma
+from services.mailbox_entries_services import add_mailbox_entries
+from services.messages_services import BULK_TX_TIMEOUT
+from services.search_services import index_messages
+from services.user_services import clear_user_cache
+from utils.hash import hash_str_chain
+
+# messages are sent during the year before this date
+SENT_BEFORE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+SENT_SPAN_SECONDS = 365 * 24 * 3600
+# message texts are slices of a corpus of random words, so they can be searched
+CORPUS_MIN_SIZE = 1 << 16
+_WORDS = (
+    "bonjour",
+    "réunion",
+    "projet",
+    "rapport",
+    "facture",
+    "livraison",
+    "client",
+    "équipe",
+    "planning",
+    "budget",
+    "contrat",
+    "semaine",
+    "demain",
+    "urgent",
+    "merci",
+    "cordialement",
+    "dossier",
+    "validation",
+    "serveur",
+    "version",
+    "correctif",
+    "mise",
+    "jour",
+    "document",
+    "signature",
+    "commande",
+    "devis",
+    "relance",
+    "agenda",
+    "présentation",
+    "compte",
+    "rendu",
+    "question",
+    "réponse",
+)
+
+
+def _uuid(random: Random) -> str:
+    """
+    Draw a version 4 UUID from a random generator.
+
+    Args:
+        random: Seeded random generator.
+
+    Returns:
+        str: UUID.
+    """
+    return str(UUID(int=random.getrandbits(128), version=4))
+
+
+def _build_corpus(random: Random, size: int) -> str:
+    """
+    Draw a text of random words.
+
+    Args:
+        random: Seeded random generator.
+        size: Minimum length of the text.
+
+    Returns:
+        str: Text.
+    """
+    words = random.choices(_WORDS, k=size // 4)
+    corpus = " ".join(words)
+    while len(corpus) < size:
+        corpus += " " + corpus
+    return corpus
+
+
+def _text(random: Random, corpus: str, size: int) -> str:
+    """
+    Draw a slice of the corpus.
+
+    Args:
+        random: Seeded random generator.
+        corpus: Text of random words, longer than `size`.
+        size: Length of the slice.
+
+    Returns:
+        str: Slice of the corpus.
+    """
+    start = random.randrange(len(corpus) - size)
+    return corpus[start : start + size]
+
+
+def _generate_messages(
+    scale: SyntheticDatasetInput, random: Random, id_emails: list[str]
+) -> Iterator[tuple[list[dict[str, Any]], list[dict[str, Any]]]]:
+    """
+    Draw messages and their recipients, by batches.
+
+    Args:
+        scale: Scale of the dataset.
+        random: Seeded random generator.
+        id_emails: IDs of email addresses sending and receiving messages.
+
+    Returns:
+        Iterator[tuple[list[dict[str, Any]], list[dict[str, Any]]]]: Messages and
+            recipients of each batch.
+    """
+    corpus = _build_corpus(random, max(CORPUS_MIN_SIZE, 2 * scale.body_size_max))
+    recipient_counts = range(1, len(scale.recipient_weights) + 1)
+    body_size_mu = log(scale.body_size_median)
+
+    messages: list[dict[str, Any]] = []
+    recipients: list[dict[str, Any]] = []
+    for id_sender in id_emails:
+        for _ in range(scale.messages_per_address):
+            id_message = _uuid(random)
+            body_size = int(random.lognormvariate(body_size_mu, scale.body_size_sigma))
+            messages.append(
+                {
+                    "id": id_message,
+                    "subject": _text(random, corpus, random.randint(10, 60)),
+                    "body": _text(
+                        random, corpus, min(max(body_size, 1), scale.body_size_max)
+                    ),
+                    "sentAt": SENT_BEFORE
+                    - timedelta(seconds=random.randrange(SENT_SPAN_SECONDS)),
+                    "fromId": id_sender,
+                }
+            )
+
+            count = random.choices(recipient_counts, scale.recipient_weights)[0]
+            recipients.extend(
+                {
+                    "id": _uuid(random),
+                    "messageId": id_message,
+                    "emailId": id_recipient,
+                    "type": "to" if rank == 0 else "cc",
+                }
+                for rank, id_recipient in enumerate(
+                    random.sample(id_emails, min(count, len(id_emails)))
+                )
+            )
+
+            if len(messages) == scale.batch_size:
+                yield messages, recipients
+                messages, recipients = [], []
+
+    if messages:
+        yield messages, recipients
+
+
+async def generate_synthetic_dataset(
+    prisma: Prisma, scale: SyntheticDatasetInput
+) -> AsyncIterator[SyntheticDatasetProgress]:
+    """
+    Add a synthetic dataset to DB.
+
+    User names start with `scale.name_prefix`, which must not be used by existing
+    users. Batches already inserted are kept if a later one fails.
+
+    Args:
+        prisma: DB connection.
+        scale: Scale of the dataset.
+
+    Returns:
+        AsyncIterator[SyntheticDatasetProgress]: Rows inserted, after users and
+            email addresses, after each batch of messages, and once done.
+    """
+    start = perf_counter()
+    random = Random(scale.seed)
+    progress = SyntheticDatasetProgress(
+        total_messages=scale.users
+        * scale.addresses_per_user
+        * scale.messages_per_address
+    )
+
+    password = await hash_str_chain(scale.password)
+    id_users = [_uuid(random) for _ in range(scale.users)]
+    id_emails = [_uuid(random) for _ in range(scale.users * scale.addresses_per_user)]
+    for index in range(0, len(id_users), scale.batch_size):
+        await prisma.user.create_many(
+            data=[
+                {
+                    "id": id_user,
+                    "name": f"{scale.name_prefix}-{index + rank}",
+                    "password": password,
+                }
+                for rank, id_user in enumerate(
+                    id_users[index : index + scale.batch_size]
+                )
+            ]
+        )
+    for index in range(0, len(id_emails), scale.batch_size):
+        await prisma.email.create_many(
+            data=[
+                {
+                    "id": id_email,
+                    "address": f"{scale.name_prefix}.{index + rank}@scraplook.test",
+                    "userId": id_users[(index + rank) // scale.addresses_per_user],
+                }
+                for rank, id_email in enumerate(
+                    id_emails[index : index + scale.batch_size]
+                )
+            ]
+        )
+    clear_user_cache()
+    progress.users, progress.email_addresses = len(id_users), len(id_emails)
+    progress.seconds = round(perf_counter() - start, 3)
+    yield progress
+
+    for messages, recipients in _generate_messages(scale, random, id_emails):
+        async with prisma.tx(timeout=BULK_TX_TIMEOUT) as transaction:
+            await transaction.message.create_many(data=messages)
+            await transaction.messagerecipient.create_many(data=recipients)
+            id_messages = [message["id"] for message in messages]
+            await add_mailbox_entries(transaction, id_messages)
+            await index_messages(transaction, id_messages)
+        progress.messages += len(messages)
+        progress.recipients += len(recipients)
+        progress.seconds = round(perf_counter() - start, 3)
+        yield progress
+
+    progress.seconds = round(perf_counter() - start, 3)
+    progress.done = True
+    yield progress
@@ -2,10 +2,20 @@
 Service module to manage users in DB.
 """
 
+from typing import Optional
+
 from models.user import UserInput
 from prisma import Prisma
 from prisma.models import User
 from utils.hash import hash_str_chain
+from utils.ttl_cache import TTLCache
+from config.app_config import get_app_config
+
+# authenticated users, without password, by name
+_user_cache: TTLCache[str, User] = TTLCache(
+    max_size=get_app_config().env_data.user_cache_max_size,
+    ttl_seconds=get_app_config().env_data.user_cache_ttl_seconds,
+)
 
 
 async def get_all_users(prisma: Prisma) -> list[User]:
@@ -53,6 +63,67 @@ async def get_user_by_name(prisma: Prisma, user_name: str) -> User:
     )
 
 
+async def get_cached_user_by_name(
+    prisma: Prisma, user_name: str, expires_at: Optional[float] = None
+) -> User:
+    """
+    Get user by name from the user cache, or from DB if not cached.
+
+    The user returned has an empty password. If not user was found, raise an exception.
+
+    Args:
+        prisma: DB connection.
+        user_name: User name to search for.
+        expires_at: Unix timestamp after which the user must not be cached anymore,
+            usually the expiration of the access token.
+
+    Returns:
+        User: User object without password.
+    """
+    user = _user_cache.get(user_name)
+    if user is None:
+        # an invalidation during the query may concern the user read
+        generation = _user_cache.generation
+        user = await get_user_by_name(prisma, user_name)
+        user.password = ""
+        _user_cache.set(user_name, user, expires_at, generation)
+
+    return user
+
+
+def invalidate_cached_user(id_user: str) -> None:
+    """
+    Remove a user from the user cache, after its user or email rows changed.
+
+    Args:
+        id_user: User ID.
+
+    Returns:
+
+    """
+    _user_cache.discard_if(lambda user: user.id == id_user)
+
+
+def clear_user_cache() -> None:
+    """
+    Remove all users from the user cache.
+
+    Returns:
+
+    """
+    _user_cache.clear()
+
+
+def get_user_cache_stats() -> dict[str, int]:
+    """
+    Get user cache usage counters.
+
+    Returns:
+        dict[str, int]: Number of hits, misses, evictions and entries of the cache.
+    """
+    return _user_cache.stats()
+
+
 async def add_new_user(prisma: Prisma, user_info: UserInput) -> User:
     """
     Add new user to DB.
@@ -65,6 +136,9 @@ async def add_new_user(prisma: Prisma, user_info: UserInput) -> User:
         User: User inserted in DB.
     """
     # hash password
-    user_info.password = hash_str_chain(user_info.password)
+    user_info.password = await hash_str_chain(user_info.password)
+
+    user = await prisma.user.create(data=user_info.model_dump())
+    invalidate_cached_user(user.id)
 
-    return await prisma.user.create(data=user_info.model_dump())
+    return user
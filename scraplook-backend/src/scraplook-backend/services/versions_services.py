@@ -0,0 +1,98 @@
+"""
+Service module to read versions of data, used as entity tags of responses.
+
+Versions are kept in DB, in the "DataVersion" table: triggers increase them in
+the transaction of each write (see migrations/), so that writes of other workers
+or of tools such as `seed_synthetic` change entity tags too. They are kept per
+table for users, and per mailbox for messages. Message details share a fixed
+number of keys, the first three hex digits of their ID, so that versions do not
+grow with the number of messages: a collision only makes a client download a
+message again.
+
+Versions must be read before the data they tag: a write committed in between then
+only makes the client download the data again.
+"""
+
+from prisma import Prisma
+from utils.etag import build_etag
+
+# random number chosen when the DB is created
+_EPOCH_KEY = "epoch"
+_USERS_KEY = "users"
+# any email address renamed or deleted, embedded in messages
+_ADDRESSES_KEY = "addresses"
+
+
+async def _versions_etag(prisma: Prisma, keys: list[str]) -> str:
+    """
+    Read versions of data and build their entity tag.
+
+    Args:
+        prisma: DB connection.
+        keys: Keys of data a response depends on.
+
+    Returns:
+        str: Entity tag.
+    """
+    rows = await prisma.dataversion.find_many(
+        where={"key": {"in": [_EPOCH_KEY, *keys]}}
+    )
+    versions = {row.key: row.version for row in rows}
+    return build_etag(
+        versions.get(_EPOCH_KEY, 0), [versions.get(key, 0) for key in keys]
+    )
+
+
+async def users_etag(prisma: Prisma) -> str:
+    """
+    Get the entity tag of the user list.
+
+    Args:
+        prisma: DB connection.
+
+    Returns:
+        str: Entity tag.
+    """
+    return await _versions_etag(prisma, [_USERS_KEY])
+
+
+async def user_email_addresses_etag(prisma: Prisma, id_user: str) -> str:
+    """
+    Get the entity tag of the email addresses of a user.
+
+    Args:
+        prisma: DB connection.
+        id_user: User ID.
+
+    Returns:
+        str: Entity tag.
+    """
+    return await _versions_etag(prisma, [f"user_emails:{id_user}"])
+
+
+async def mailbox_etag(prisma: Prisma, id_email_address: str) -> str:
+    """
+    Get the entity tag of messages sent or received by an email address.
+
+    Args:
+        prisma: DB connection.
+        id_email_address: Email address ID.
+
+    Returns:
+        str: Entity tag.
+    """
+    return await _versions_etag(prisma, [f"mailbox:{id_email_address}", _ADDRESSES_KEY])
+
+
+async def message_etag(prisma: Prisma, id_message: str) -> str:
+    """
+    Get the entity tag of a message detail.
+
+    Args:
+        prisma: DB connection.
+        id_message: Message ID.
+
+    Returns:
+        str: Entity tag.
+    """
+    return await _versions_etag(prisma, [f"message:{id_message[:3]}", _ADDRESSES_KEY])
@@ -0,0 +1,26 @@
+"""
+Utility module to authenticate admin requests, with the admin token of `.env`.
+"""
+
+from secrets import compare_digest
+from typing import Optional
+
+# header holding the admin token
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def is_admin_token(admin_token: Optional[str], token: Optional[str]) -> bool:
+    """
+    Check a token sent by a client against the admin token.
+
+    Args:
+        admin_token: Admin token of the app, None if admin features are disabled.
+        token: Token sent by the client.
+
+    Returns:
+        bool: True if both tokens are set and equal.
+    """
+    if admin_token is None or token is None:
+        return False
+
+    return compare_digest(admin_token.encode(), token.encode())
@@ -0,0 +1,72 @@
+"""
+Utility module to provide entity tags computed from version numbers of data.
+
+Instead of hashing response bodies, each kind of data has a version, increased
+when the data changes. An entity tag is built from the versions a response depends
+on, so it can be checked before reading the data.
+"""
+
+from typing import Iterable, Optional
+
+from fastapi import Response, status
+
+
+def build_etag(epoch: int, versions: Iterable[int]) -> str:
+    """
+    Build the strong entity tag of data from its versions.
+
+    Args:
+        epoch: Number changed when all versions restart, e.g. when the DB is
+            recreated.
+        versions: Versions of data a response depends on.
+
+    Returns:
+        str: Quoted entity tag.
+    """
+    versions_text = ".".join(str(version) for version in versions)
+    return f'"{epoch:x}-{versions_text}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check if an `If-None-Match` header matches an entity tag.
+
+    Args:
+        if_none_match: Header value, a list of entity tags or `*`.
+        etag: Current entity tag.
+
+    Returns:
+        bool: True if the client already has the current version.
+    """
+    if if_none_match is None:
+        return False
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in candidates or etag in (
+        candidate.removeprefix("W/") for candidate in candidates
+    )
+
+
+def check_etag(
+    if_none_match: Optional[str], etag: str, response: Response
+) -> Optional[Response]:
+    """
+    Tag a response with its entity tag, or answer 304 if the client is up to date.
+
+    Args:
+        if_none_match: `If-None-Match` header sent by the client.
+        etag: Current entity tag.
+        response: Response of the endpoint, to tag.
+
+    Returns:
+        Optional[Response]: 304 response to return instead of reading the data,
+            None if the response must be computed.
+    """
+    # private: responses depend on the access token, no-cache: always revalidate
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
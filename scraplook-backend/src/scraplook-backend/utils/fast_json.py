@@ -0,0 +1,77 @@
+"""
+Utility module to send JSON responses without FastAPI response validation.
+
+By default, FastAPI dumps the models returned by an endpoint to dicts, validates
+these dicts against the response model, then encodes them with `jsonable_encoder`
+and `json`. Models read from the DB are already valid: when fast responses are
+enabled, they are dumped once by a serializer compiled for the response type at
+import, and encoded with orjson.
+"""
+
+from typing import Any, Generic, TypeVar, Union
+
+from fastapi import Response
+from orjson import OPT_UTC_Z, dumps
+from pydantic import TypeAdapter
+
+from config.app_config import get_app_config
+
+ContentT = TypeVar("ContentT")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson, which handles datetimes natively.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        """
+        Encode the content of the response.
+
+        Args:
+            content: JSON compatible content, datetimes included, or JSON already
+                encoded.
+
+        Returns:
+            bytes: Body of the response.
+        """
+        if isinstance(content, bytes):
+            return content
+
+        # UTC datetimes end with "Z", as with pydantic
+        return dumps(content, option=OPT_UTC_Z)
+
+
+class ResponseSchema(Generic[ContentT]):
+    """
+    Serializer of the content returned by an endpoint, compiled once.
+    """
+
+    def __init__(self, content_type: Any):
+        self._adapter: TypeAdapter[ContentT] = TypeAdapter(content_type)
+
+    def response(
+        self, content: ContentT, response: Response
+    ) -> Union[ContentT, Response]:
+        """
+        Build the response of an endpoint from its content.
+
+        If fast responses are disabled, the content is returned as is, for FastAPI
+        to validate it against the response model of the endpoint.
+
+        Args:
+            content: Content returned by the endpoint, of the schema type.
+            response: Response of the endpoint, whose headers are kept.
+
+        Returns:
+            Union[ContentT, Response]: Response to return from the endpoint.
+        """
+        if not get_app_config().env_data.fast_json_responses:
+            return content
+
+        return FastJSONResponse(
+            self._adapter.dump_json(content, by_alias=True),
+            headers=dict(response.headers),
+        )
@@ -1,13 +1,88 @@
 """
 Utility module to provide methods linked to hash strategy.
+
+Bcrypt is slow on purpose, so hashes are computed in a bounded thread pool
+instead of the event loop thread (bcrypt releases the GIL while hashing).
 """
 
+from asyncio import Semaphore, get_running_loop, timeout
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
 from passlib.context import CryptContext
 
+from config.app_config import get_app_config
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[Semaphore] = None
+
+ResultT = TypeVar("ResultT")
+
+
+class HashPoolSaturatedException(Exception):
+    """
+    Exception raised when too many hashes are waiting for the hash pool.
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+async def _run_in_hash_pool(func: Callable[..., ResultT], *args: str) -> ResultT:
+    """
+    Run a hash function in the hash thread pool.
+
+    At most `hash_max_pending` calls are submitted to the pool at once, other calls
+    wait for a free slot up to `hash_queue_timeout_seconds`.
+
+    Args:
+        func: Hash function to run.
+        *args: Hash function arguments.
+
+    Returns:
+        ResultT: Hash function result.
+    """
+    global _hash_executor, _hash_slots  # pylint: disable=W0603
+    env_data = get_app_config().env_data
+
+    if _hash_executor is None or _hash_slots is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=env_data.hash_workers, thread_name_prefix="hash"
+        )
+        _hash_slots = Semaphore(env_data.hash_max_pending)
 
-def hash_str_chain(str_chain: str) -> str:
+    try:
+        async with timeout(env_data.hash_queue_timeout_seconds):
+            await _hash_slots.acquire()
+    except TimeoutError as error:
+        raise HashPoolSaturatedException(
+            f"No hash slot available after {env_data.hash_queue_timeout_seconds}s"
+        ) from error
+
+    try:
+        return await get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_slots.release()
+
+
+def shutdown_hash_pool() -> None:
+    """
+    Stop hash pool threads, once pending hashes are done.
+
+    Returns:
+
+    """
+    global _hash_executor, _hash_slots  # pylint: disable=W0603
+
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True)
+        _hash_executor = None
+        _hash_slots = None
+
+
+async def hash_str_chain(str_chain: str) -> str:
     """
     Hash str chain.
 
@@ -17,4 +92,18 @@ def hash_str_chain(str_chain: str) -> str:
     Returns: Hash str.
 
     """
-    return pwd_context.hash(str_chain)
+    return await _run_in_hash_pool(pwd_context.hash, str_chain)
+
+
+async def verify_str_chain(str_chain: str, hashed_str_chain: str) -> bool:
+    """
+    Check str chain matches a hash.
+
+    Args:
+        str_chain: String chain to check.
+        hashed_str_chain: Hash to compare with.
+
+    Returns: True if str chain matches the hash, otherwise False.
+
+    """
+    return await _run_in_hash_pool(pwd_context.verify, str_chain, hashed_str_chain)
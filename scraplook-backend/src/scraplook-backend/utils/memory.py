@@ -0,0 +1,141 @@
+"""
+Utility module to trace memory allocations with tracemalloc, on demand.
+
+Tracing is started and stopped by an admin, as it slows allocations down and
+keeps a traceback for each memory block. While it runs, each snapshot is compared
+with the previous one, so that the allocation sites that grew in between, e.g.
+during a large inbox listing, come first.
+
+The peak of traced memory is reset to measure single requests. Peaks reached
+before each reset are kept, so that the peak reported to admins is the peak since
+tracing started.
+"""
+
+import tracemalloc
+from typing import Literal, Optional
+
+GroupBy = Literal["filename", "lineno", "traceback"]
+
+# allocations of tracemalloc itself and of imports are noise in the diffs
+_IGNORED_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+# highest peak of traced memory before the last reset, in bytes
+_previous_peak = 0
+
+
+class MemoryTracingNotStartedException(Exception):
+    """
+    Exception raised when a snapshot is requested while tracing is stopped.
+    """
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    """
+    Take a snapshot of traced memory blocks, without tracemalloc and import noise.
+
+    Returns:
+        tracemalloc.Snapshot: Filtered snapshot.
+    """
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED_FILTERS)
+
+
+def start_tracing(frames: int) -> None:
+    """
+    Start tracing memory allocations, and take the first snapshot to compare with.
+
+    Does nothing if tracing is already started.
+
+    Args:
+        frames: Number of frames stored in the traceback of each allocation.
+
+    Returns:
+
+    """
+    global _last_snapshot, _previous_peak  # pylint: disable=W0603
+
+    if tracemalloc.is_tracing():
+        return
+
+    tracemalloc.start(frames)
+    _previous_peak = 0
+    _last_snapshot = _take_snapshot()
+
+
+def stop_tracing() -> None:
+    """
+    Stop tracing memory allocations, freeing the traces and the last snapshot.
+
+    Returns:
+
+    """
+    global _last_snapshot  # pylint: disable=W0603
+
+    tracemalloc.stop()
+    _last_snapshot = None
+
+
+def reset_traced_peak() -> None:
+    """
+    Reset the peak of traced memory to the current size, to measure the peak of a
+    piece of code, keeping the previous peak for `get_tracing_status`.
+
+    Returns:
+
+    """
+    global _previous_peak  # pylint: disable=W0603
+
+    _previous_peak = max(_previous_peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+
+
+def get_tracing_status() -> tuple[bool, int, int, int]:
+    """
+    Get the state of memory tracing.
+
+    Returns:
+        tuple[bool, int, int, int]: Indicates if tracing is started, number of
+            frames stored per traceback, current size of traced memory and its
+            peak since tracing started, in bytes.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    return (
+        tracemalloc.is_tracing(),
+        tracemalloc.get_traceback_limit(),
+        current,
+        max(peak, _previous_peak) if tracemalloc.is_tracing() else peak,
+    )
+
+
+def diff_snapshot(group_by: GroupBy, limit: int) -> list[tracemalloc.StatisticDiff]:
+    """
+    Take a snapshot and compare it with the previous one, which it then replaces.
+
+    Taking and comparing snapshots is slow with many traces: it should run in a
+    worker thread.
+
+    Args:
+        group_by: Grouping of the allocations: by file, line or whole traceback.
+        limit: Maximum number of allocation sites returned.
+
+    Returns:
+        list[tracemalloc.StatisticDiff]: Allocation sites, the largest size
+            differences first.
+
+    Raises:
+        MemoryTracingNotStartedException: If tracing is not started.
+    """
+    global _last_snapshot  # pylint: disable=W0603
+
+    previous = _last_snapshot
+    if not tracemalloc.is_tracing() or previous is None:
+        raise MemoryTracingNotStartedException("Memory tracing is not started")
+
+    snapshot = _take_snapshot()
+    _last_snapshot = snapshot
+    return snapshot.compare_to(previous, group_by)[:limit]
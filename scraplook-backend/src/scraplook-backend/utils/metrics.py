@@ -0,0 +1,344 @@
+"""
+Utility module to record request and DB query metrics, and render them for Prometheus.
+
+Metrics are kept in process memory, in histograms with fixed buckets, one per
+route or query kind, created on first use. They are meant to be updated from the
+event loop thread only, so they have no lock.
+
+The DB queries of a request are counted in a `RequestQueries` object, set in a
+context variable by the metrics middleware for the duration of the request, and
+updated by the instrumented Prisma client.
+
+While memory is traced with tracemalloc, the peak of traced memory of message
+requests is recorded too, see `middlewares.metrics`.
+"""
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+# upper bounds of buckets, in seconds, bytes and queries
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MEMORY_BUCKETS = (
+    10_000,
+    100_000,
+    1_000_000,
+    5_000_000,
+    10_000_000,
+    50_000_000,
+    100_000_000,
+    500_000_000,
+)
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, as a Prometheus histogram.
+    """
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # the last count is the `+Inf` bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Add a value to the bucket of its upper bound.
+
+        Args:
+            value: Observed value.
+
+        Returns:
+
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RouteMetrics:
+    """
+    Metrics of the requests of one route.
+    """
+
+    __slots__ = ("statuses", "latency", "response_size", "queries", "memory_peak")
+
+    def __init__(self):
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        # only observed while memory is traced
+        self.memory_peak = Histogram(MEMORY_BUCKETS)
+
+
+class RequestQueries:
+    """
+    DB queries made while handling one request.
+    """
+
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self, trace_shapes: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        # number of queries by shape, only traced to check query budgets
+        self.shapes: Optional[dict[str, int]] = {} if trace_shapes else None
+
+
+_routes: dict[tuple[str, str], RouteMetrics] = {}
+_queries: dict[str, Histogram] = {}
+_in_flight = 0
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "request_queries", default=None
+)
+
+
+def start_request(trace_shapes: bool = False) -> RequestQueries:
+    """
+    Count a request in flight, and start counting its DB queries.
+
+    Args:
+        trace_shapes: Indicates if the shapes of DB queries are recorded too.
+
+    Returns:
+        RequestQueries: DB queries of the request, to pass to `end_request`.
+    """
+    global _in_flight  # pylint: disable=W0603
+
+    _in_flight += 1
+    queries = RequestQueries(trace_shapes)
+    _request_queries.set(queries)
+    return queries
+
+
+def end_request(
+    method: str,
+    route: str,
+    status: int,
+    seconds: float,
+    response_size: int,
+    queries: RequestQueries,
+    memory_peak: Optional[int] = None,
+) -> None:
+    """
+    Record a request handled.
+
+    Args:
+        method: HTTP method.
+        route: Path template of the route, e.g. `/messages/{id_message}`.
+        status: Response status code.
+        seconds: Time taken to send the response.
+        response_size: Number of body bytes sent.
+        queries: DB queries of the request.
+        memory_peak: Peak of memory allocated while handling the request, in bytes,
+            None if memory was not traced.
+
+    Returns:
+
+    """
+    global _in_flight  # pylint: disable=W0603
+
+    _in_flight -= 1
+    key = (method, route)
+    metrics = _routes.get(key)
+    if metrics is None:
+        metrics = _routes[key] = RouteMetrics()
+
+    metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+    metrics.latency.observe(seconds)
+    metrics.response_size.observe(response_size)
+    metrics.queries.observe(queries.count)
+    if memory_peak is not None:
+        metrics.memory_peak.observe(memory_peak)
+
+
+def get_request_queries() -> Optional[RequestQueries]:
+    """
+    Get the DB queries of the request being handled.
+
+    Returns:
+        Optional[RequestQueries]: DB queries of the request, None outside requests.
+    """
+    return _request_queries.get()
+
+
+def observe_query(name: str, seconds: float) -> None:
+    """
+    Record a DB query, and count it in the request being handled.
+
+    Args:
+        name: Query kind, e.g. `Message.find_many` or `query_raw`.
+        seconds: Time taken by the query.
+
+    Returns:
+
+    """
+    histogram = _queries.get(name)
+    if histogram is None:
+        histogram = _queries[name] = Histogram(LATENCY_BUCKETS)
+    histogram.observe(seconds)
+
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += seconds
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """
+    Format labels of a sample.
+
+    Args:
+        labels: Label values by name.
+
+    Returns:
+        str: Labels between braces, empty if there is none.
+    """
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_histogram(
+    name: str, labels: dict[str, str], histogram: Histogram
+) -> list[str]:
+    """
+    Format the samples of a histogram, with cumulative buckets.
+
+    Args:
+        name: Metric name.
+        labels: Labels of the histogram.
+        histogram: Histogram to format.
+
+    Returns:
+        list[str]: Sample lines.
+    """
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        bucket_labels = _format_labels({**labels, "le": str(bound)})
+        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def format_counters(prefix: str, description: str, values: dict[str, int]) -> list[str]:
+    """
+    Format counters read from elsewhere, e.g. cache hits, which only increase.
+
+    Args:
+        prefix: Prefix of the metric names.
+        description: Help text of the metrics.
+        values: Values by name, each becoming a `<prefix>_<name>_total` counter.
+
+    Returns:
+        list[str]: Metric lines.
+    """
+    lines = []
+    for name, value in values.items():
+        lines.append(f"# HELP {prefix}_{name}_total {description}")
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    return lines
+
+
+def format_gauges(prefix: str, description: str, values: dict[str, int]) -> list[str]:
+    """
+    Format current values read from elsewhere, e.g. cache size, as gauges.
+
+    Args:
+        prefix: Prefix of the metric names.
+        description: Help text of the metrics.
+        values: Values by name, each becoming a `<prefix>_<name>` gauge.
+
+    Returns:
+        list[str]: Metric lines.
+    """
+    lines = []
+    for name, value in values.items():
+        lines.append(f"# HELP {prefix}_{name} {description}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    return lines
+
+
+def render_metrics(extra_lines: Iterable[str] = ()) -> str:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Args:
+        extra_lines: Lines of other metrics, appended to the output.
+
+    Returns:
+        str: Metrics text.
+    """
+    lines = [
+        "# HELP http_requests_in_flight Requests being handled.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {_in_flight}",
+        "# HELP http_requests_total Requests handled, by route and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    routes = sorted(_routes.items())
+    for (method, route), metrics in routes:
+        for status, count in sorted(metrics.statuses.items()):
+            labels = {"method": method, "route": route, "status": str(status)}
+            lines.append(f"http_requests_total{_format_labels(labels)} {count}")
+
+    histograms = (
+        ("http_request_duration_seconds", "Request latency.", "latency"),
+        ("http_response_size_bytes", "Response body size.", "response_size"),
+        ("http_request_db_queries", "DB queries per request.", "queries"),
+    )
+    for name, description, attribute in histograms:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for (method, route), metrics in routes:
+            labels = {"method": method, "route": route}
+            lines.extend(_format_histogram(name, labels, getattr(metrics, attribute)))
+
+    # routes are only listed once measured, memory being rarely traced
+    name = "http_request_memory_peak_bytes"
+    lines.append(f"# HELP {name} Peak of memory allocated per request, while traced.")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), metrics in routes:
+        if metrics.memory_peak.count:
+            labels = {"method": method, "route": route}
+            lines.extend(_format_histogram(name, labels, metrics.memory_peak))
+
+    lines.append("# HELP db_query_duration_seconds DB query latency, by kind.")
+    lines.append("# TYPE db_query_duration_seconds histogram")
+    for query, histogram in sorted(_queries.items()):
+        lines.extend(
+            _format_histogram("db_query_duration_seconds", {"query": query}, histogram)
+        )
+
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
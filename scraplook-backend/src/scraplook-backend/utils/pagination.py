@@ -0,0 +1,116 @@
+"""
+Utility module to provide methods linked to cursor pagination.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime, timedelta, timezone
+from json import JSONDecodeError, dumps, loads
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class InvalidCursorException(Exception):
+    """
+    Exception raised when a pagination cursor cannot be decoded.
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Encode a page position into an opaque cursor.
+
+    Args:
+        position: Values identifying the last item of a page.
+
+    Returns:
+        str: Opaque cursor, safe to use in an url.
+    """
+    raw_cursor = dumps(position, separators=(",", ":")).encode("utf-8")
+    return urlsafe_b64encode(raw_cursor).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decode an opaque cursor created by `encode_cursor`.
+
+    Args:
+        cursor: Opaque cursor sent by a client.
+
+    Returns:
+        dict: Values identifying the last item of the previous page.
+    """
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        position = loads(urlsafe_b64decode(cursor + padding))
+    except (BinasciiError, JSONDecodeError, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursorException(f"Invalid cursor '{cursor}': {error}") from error
+
+    if not isinstance(position, dict):
+        raise InvalidCursorException(f"Invalid cursor '{cursor}'")
+
+    return position
+
+
+def to_epoch_milliseconds(value: datetime) -> int:
+    """
+    Convert a datetime to milliseconds since the epoch, the way Prisma stores
+    DateTime columns in SQLite, to compare them in raw queries.
+
+    Args:
+        value: Datetime to convert, in UTC if naive.
+
+    Returns:
+        int: Milliseconds since the epoch.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_message_cursor(sent_at: datetime, id_message: str) -> str:
+    """
+    Encode the position of a message in a listing ordered on (sentAt, id).
+
+    The cursor holds the sort key itself, so that the next page can be read even if
+    the message was deleted meanwhile.
+
+    Args:
+        sent_at: Sending date of the last message of a page.
+        id_message: ID of the last message of a page.
+
+    Returns:
+        str: Opaque cursor, safe to use in an url.
+    """
+    return encode_cursor({"sentAt": to_epoch_milliseconds(sent_at), "id": id_message})
+
+
+def decode_message_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Decode an opaque cursor created by `encode_message_cursor`.
+
+    Args:
+        cursor: Opaque cursor sent by a client.
+
+    Returns:
+        tuple[datetime, str]: Sending date and ID of the last message of the
+            previous page.
+    """
+    position = decode_cursor(cursor)
+    sent_at = position.get("sentAt")
+    id_message = position.get("id")
+    if (
+        not isinstance(sent_at, int)
+        or isinstance(sent_at, bool)
+        or not isinstance(id_message, str)
+    ):
+        raise InvalidCursorException(f"Invalid cursor '{cursor}'")
+
+    try:
+        return EPOCH + timedelta(milliseconds=sent_at), id_message
+    except OverflowError as error:
+        raise InvalidCursorException(f"Invalid cursor '{cursor}'") from error
@@ -0,0 +1,163 @@
+"""
+Utility module to provide an in-process publish/subscribe with bounded queues.
+"""
+
+from asyncio import Queue, QueueFull, timeout
+from typing import Generic, Optional, TypeVar
+
+EventT = TypeVar("EventT")
+
+
+class SubscriptionOverflowException(Exception):
+    """
+    Exception raised when a subscriber did not consume its events fast enough,
+    and some of them were dropped.
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class Subscription(Generic[EventT]):
+    """
+    Events published on some topics, waiting to be consumed by one subscriber.
+    """
+
+    def __init__(self, topics: frozenset[str], max_pending: int):
+        self.topics = topics
+        self.overflowed = False
+        self._queue: Queue[EventT] = Queue(maxsize=max_pending)
+
+    def push(self, event: EventT) -> bool:
+        """
+        Add an event to the subscription, unless its queue is full.
+
+        Once an event is dropped, the subscription is marked as overflowed and
+        no longer receives events.
+
+        Args:
+            event: Event published.
+
+        Returns:
+            bool: Indicates if the event was queued.
+        """
+        if self.overflowed:
+            return False
+
+        try:
+            self._queue.put_nowait(event)
+        except QueueFull:
+            self.overflowed = True
+            return False
+
+        return True
+
+    async def next_event(self, timeout_seconds: float) -> Optional[EventT]:
+        """
+        Wait for the next event of the subscription.
+
+        Events queued before an overflow are still returned, then
+        `SubscriptionOverflowException` is raised.
+
+        Args:
+            timeout_seconds: Maximum waiting time.
+
+        Returns:
+            Optional[EventT]: Next event, None if no event was published in time.
+        """
+        if self.overflowed and self._queue.empty():
+            raise SubscriptionOverflowException(
+                f"Events dropped for topics {sorted(self.topics)}"
+            )
+
+        try:
+            async with timeout(timeout_seconds):
+                return await self._queue.get()
+        except TimeoutError:
+            return None
+
+
+class PubSub(Generic[EventT]):
+    """
+    Publish/subscribe whose subscribers each have a bounded queue, so that a slow
+    subscriber cannot make the publisher wait nor hold unbounded memory.
+
+    It is meant to be used from the event loop thread only, so it has no lock.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.published = 0
+        self.dropped = 0
+        self._subscriptions: dict[str, set[Subscription[EventT]]] = {}
+        self._subscription_count = 0
+
+    def subscribe(self, topics: frozenset[str]) -> Subscription[EventT]:
+        """
+        Subscribe to events published on some topics.
+
+        Args:
+            topics: Topics to subscribe to.
+
+        Returns:
+            Subscription[EventT]: Subscription receiving events.
+        """
+        subscription: Subscription[EventT] = Subscription(topics, self.max_pending)
+        for topic in topics:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+        self._subscription_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription[EventT]) -> None:
+        """
+        Stop a subscription.
+
+        Args:
+            subscription: Subscription created by `subscribe`.
+
+        Returns:
+
+        """
+        removed = False
+        for topic in subscription.topics:
+            subscribers = self._subscriptions.get(topic)
+            if subscribers is None or subscription not in subscribers:
+                continue
+            subscribers.remove(subscription)
+            removed = True
+            if not subscribers:
+                del self._subscriptions[topic]
+
+        if removed:
+            self._subscription_count -= 1
+
+    def publish(self, topic: str, event: EventT) -> None:
+        """
+        Publish an event to the subscribers of a topic, without waiting.
+
+        Args:
+            topic: Topic of the event.
+            event: Event to publish.
+
+        Returns:
+
+        """
+        self.published += 1
+        for subscription in self._subscriptions.get(topic, ()):
+            if not subscription.push(event):
+                self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get publish/subscribe usage counters.
+
+        Returns:
+            dict[str, int]: Number of events published and dropped, of topics and
+                of subscriptions.
+        """
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "topics": len(self._subscriptions),
+            "subscriptions": self._subscription_count,
+        }
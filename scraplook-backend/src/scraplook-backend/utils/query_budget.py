@@ -0,0 +1,157 @@
+"""
+Utility module to detect requests making too many DB queries, e.g. N+1 patterns.
+
+When `query_budget_mode` is not `off`, the instrumented Prisma client records the
+shape of each query of a request: its kind with the structure of its arguments,
+values excluded, or its SQL for raw queries. A request exceeds its budget when it
+makes more than `query_budget_max_queries` queries, or the same query shape more
+than `query_budget_max_repeats` times, the sign of a query made in a loop.
+
+In `warn` mode, a warning is logged once the request is handled. In `raise` mode,
+the query exceeding the budget raises `QueryBudgetExceededException` instead of
+being executed, failing the request: it is meant for tests.
+"""
+
+from re import sub
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from config.app_config import get_app_config
+from utils.metrics import RequestQueries
+
+# raw SQL is cut in shapes, a repeated query is recognized from its start
+SHAPE_SQL_LENGTH = 200
+
+
+class QueryBudgetExceededException(Exception):
+    """
+    Exception raised in `raise` mode when a request exceeds its query budget.
+    """
+
+
+def _skeleton(value: Any) -> str:
+    """
+    Describe the structure of query arguments, without their values.
+
+    Args:
+        value: Query argument.
+
+    Returns:
+        str: Keys of dictionaries, distinct structures of list items, and `?` for
+            other values.
+    """
+    if isinstance(value, dict):
+        fields = ",".join(f"{key}={_skeleton(value[key])}" for key in sorted(value))
+        return "{" + fields + "}"
+    if isinstance(value, (list, tuple)):
+        # lists of IDs have one structure whatever their length
+        return "[" + ",".join(sorted({_skeleton(item) for item in value})) + "]"
+    return "?"
+
+
+def query_shape(
+    method: str, model: Optional[type[BaseModel]], arguments: dict[str, Any]
+) -> str:
+    """
+    Describe a query regardless of its values, so that repetitions can be counted.
+
+    Args:
+        method: Prisma method, e.g. `find_many` or `query_raw`.
+        model: Model of the query results, if any.
+        arguments: Query arguments.
+
+    Returns:
+        str: Query shape, e.g. `Message.find_unique {where={id=?}}`.
+    """
+    name = method if model is None else f"{model.__name__}.{method}"
+    if method in ("query_raw", "execute_raw"):
+        sql = sub(r"\s+", " ", arguments["query"]).strip()
+        return f"{name} {sql[:SHAPE_SQL_LENGTH]}"
+    return f"{name} {_skeleton(arguments)}"
+
+
+def find_budget_violations(
+    queries: RequestQueries, max_queries: int, max_repeats: int
+) -> list[str]:
+    """
+    Check the queries of a request against a budget.
+
+    Args:
+        queries: DB queries of the request, with their shapes.
+        max_queries: Maximum number of queries.
+        max_repeats: Maximum number of queries of the same shape.
+
+    Returns:
+        list[str]: Description of each limit exceeded, empty within the budget.
+    """
+    violations = []
+    if queries.count > max_queries:
+        violations.append(f"{queries.count} queries (budget {max_queries})")
+    for shape, count in queries.shapes.items():
+        if count > max_repeats:
+            violations.append(f"{count} x {shape} (budget {max_repeats})")
+    return violations
+
+
+def record_query_shape(
+    queries: RequestQueries,
+    method: str,
+    model: Optional[type[BaseModel]],
+    arguments: dict[str, Any],
+) -> None:
+    """
+    Record the shape of a query about to be executed for a request.
+
+    Args:
+        queries: DB queries of the request, whose shapes are traced.
+        method: Prisma method.
+        model: Model of the query results, if any.
+        arguments: Query arguments.
+
+    Returns:
+
+    Raises:
+        QueryBudgetExceededException: In `raise` mode, if the query exceeds the
+            budget of the request.
+    """
+    shape = query_shape(method, model, arguments)
+    repeats = queries.shapes[shape] = queries.shapes.get(shape, 0) + 1
+
+    env_data = get_app_config().env_data
+    if env_data.query_budget_mode != "raise":
+        return
+
+    # the query is counted once executed
+    if queries.count >= env_data.query_budget_max_queries:
+        raise QueryBudgetExceededException(
+            f"{queries.count + 1} queries (budget {env_data.query_budget_max_queries})"
+        )
+    if repeats > env_data.query_budget_max_repeats:
+        raise QueryBudgetExceededException(
+            f"{repeats} x {shape} (budget {env_data.query_budget_max_repeats})"
+        )
+
+
+def warn_budget_violations(method: str, route: str, queries: RequestQueries) -> None:
+    """
+    Log a warning if a request handled exceeded its query budget.
+
+    Args:
+        method: HTTP method.
+        route: Path template of the route.
+        queries: DB queries of the request, with their shapes.
+
+    Returns:
+
+    """
+    app_config = get_app_config()
+    violations = find_budget_violations(
+        queries,
+        app_config.env_data.query_budget_max_queries,
+        app_config.env_data.query_budget_max_repeats,
+    )
+    if violations:
+        app_config.logger.warning(
+            "Query budget exceeded by %s %s: %s", method, route, "; ".join(violations)
+        )
@@ -0,0 +1,128 @@
+"""
+Utility module to provide an in-process cache with expiration and LRU eviction.
+"""
+
+from collections import OrderedDict
+from time import monotonic, time
+from typing import Callable, Generic, Optional, TypeVar
+
+KeyT = TypeVar("KeyT")
+ValueT = TypeVar("ValueT")
+
+
+class TTLCache(Generic[KeyT, ValueT]):
+    """
+    Cache whose entries expire after a time to live, and whose least recently used
+    entries are evicted once the maximum size is reached.
+
+    It is meant to be used from the event loop thread only, so it has no lock.
+    Removals increase `generation`: a value read from its source across an await
+    is only cached if no removal happened meanwhile, see `set`.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries: OrderedDict[KeyT, tuple[float, ValueT]] = OrderedDict()
+
+    def get(self, key: KeyT) -> Optional[ValueT]:
+        """
+        Get a cached value, and mark it as recently used.
+
+        Args:
+            key: Key of the value.
+
+        Returns:
+            Optional[ValueT]: Cached value, None if missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(
+        self,
+        key: KeyT,
+        value: ValueT,
+        expires_at: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Cache a value.
+
+        Args:
+            key: Key of the value.
+            value: Value to cache.
+            expires_at: Unix timestamp after which the value must not be used,
+                the entry expires at the earliest of this date and its time to live.
+            generation: `generation` read before loading the value, the value is
+                not cached if values were removed since, as it may be stale.
+
+        Returns:
+
+        """
+        if generation is not None and generation != self.generation:
+            return
+
+        ttl_seconds = self.ttl_seconds
+        if expires_at is not None:
+            ttl_seconds = min(ttl_seconds, expires_at - time())
+        if ttl_seconds <= 0:
+            return
+
+        self._entries[key] = (monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard_if(self, predicate: Callable[[ValueT], bool]) -> None:
+        """
+        Remove cached values matching a predicate.
+
+        Args:
+            predicate: Function returning True for values to remove.
+
+        Returns:
+
+        """
+        self.generation += 1
+        for key in [
+            key for key, (_, value) in self._entries.items() if predicate(value)
+        ]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """
+        Remove all cached values.
+
+        Returns:
+
+        """
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get cache usage counters.
+
+        Returns:
+            dict[str, int]: Number of hits, misses, evictions and entries of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
@@ -0,0 +1,601 @@
+"""
+Check that each route of the API stays within its DB query budget.
+
+The app of `main.py` is started in-process on a temporary SQLite database built
+from `migrations/`, seeded with `/seeder/populate` and `--messages` messages
+between the addresses of the first user. Each route of `routes/` is then called
+once, and checked against its entry of `ROUTE_BUDGETS`: a maximum number of DB
+queries, and no query shape repeated more than `--max-repeats` times, which
+catches queries made in a loop (N+1) even when the budget is generous.
+
+A route missing from `ROUTE_BUDGETS` fails the check, so that new routes get a
+budget. Routes that cannot be called once and measured, such as infinite streams,
+are listed in `UNCHECKED_ROUTES`.
+
+Usage (from `scraplook-backend`):
+    pdm run check_query_budgets --messages 50
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+from dataclasses import dataclass, field
+from pathlib import Path
+from sqlite3 import connect
+from sys import exit as sys_exit
+from tempfile import TemporaryDirectory
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from fastapi.routing import APIRoute
+from httpx import ASGITransport, AsyncClient, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from check_query_plans import apply_migrations
+from config.app_config import get_app_config
+from utils.metrics import RequestQueries, get_request_queries
+from utils.query_budget import find_budget_violations
+
+USERNAME = "AntoninD"
+PASSWORD = "azerty"
+# routes that are not called: seeders are bulk tools, streams never end, admin
+# routes make no query
+UNCHECKED_ROUTES = {
+    ("GET", "/messages/stream"),
+    ("GET", "/seeder/populate"),
+    ("GET", "/seeder/user"),
+    ("GET", "/seeder/email_addresses"),
+    ("GET", "/seeder/email_messages"),
+    ("POST", "/seeder/synthetic"),
+    ("GET", "/seeder/reset"),
+    ("GET", "/auth/user_cache_stats"),
+    ("GET", "/metrics"),
+    ("GET", "/messages/stream_stats"),
+    ("GET", "/admin/memory"),
+    ("POST", "/admin/memory/start"),
+    ("POST", "/admin/memory/snapshot"),
+    ("POST", "/admin/memory/stop"),
+}
+
+
+@dataclass
+class _Context:
+    """
+    Data of the seeded database used to call routes.
+    """
+
+    headers: dict[str, str]
+    refresh_headers: dict[str, str]
+    id_user: str
+    id_email_address: str
+    id_other_email_addresses: list[str]
+    id_received_messages: list[str] = field(default_factory=list)
+
+
+class RouteCase(NamedTuple):
+    """
+    Call of a route, with its query budget.
+    """
+
+    method: str
+    path: str
+    max_queries: int
+    # calls the route last, after any request preparing it
+    call: Callable[[AsyncClient, _Context], Awaitable[Response]]
+
+
+class _QueryRecorder:
+    """
+    ASGI wrapper keeping the DB queries of the last request handled.
+
+    The metrics middleware sets them in a context variable of the task handling
+    the request, which is the task of the client with an in-process transport.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.last: Optional[RequestQueries] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
+        self.last = get_request_queries()
+
+
+def _message(id_from: str, id_recipients: list[str], index: int) -> dict:
+    """
+    Build a message to send.
+
+    Args:
+        id_from: Sender email address ID.
+        id_recipients: Recipient email address IDs.
+        index: Message number.
+
+    Returns:
+        dict: Message sent to `/messages/` or `/messages/batch`.
+    """
+    return {
+        "subject": f"Budget {index}",
+        "body": f"Contenu du mail {index} pour vérifier le budget de requêtes",
+        "fromId": id_from,
+        "recipients": [
+            {"emailId": id_email, "type": "to"} for id_email in id_recipients
+        ],
+    }
+
+
+async def _delete_email_address(client: AsyncClient, context: _Context) -> Response:
+    """
+    Delete a new email address holding messages sent to itself.
+
+    Args:
+        client: Client calling the app.
+        context: Seeded data.
+
+    Returns:
+        Response: Response of the deletion.
+    """
+    address = {"address": "budget.delete@scraplook.test", "userId": context.id_user}
+    await client.post("/email_address/", json=address, headers=context.headers)
+    emails = (
+        await client.get(
+            "/email_address/all",
+            params={"user_id": context.id_user},
+            headers=context.headers,
+        )
+    ).json()
+    id_email = next(
+        email["id"] for email in emails if email["address"] == address["address"]
+    )
+    await client.post(
+        "/messages/batch",
+        json={
+            "messages": [_message(id_email, [id_email], index) for index in range(20)]
+        },
+        headers=context.headers,
+    )
+    return await client.delete(f"/email_address/{id_email}", headers=context.headers)
+
+
+async def _patch_email_address(client: AsyncClient, context: _Context) -> Response:
+    """
+    Rename the address of the first user, which sent messages.
+
+    Args:
+        client: Client calling the app.
+        context: Seeded data.
+
+    Returns:
+        Response: Response of the update.
+    """
+    return await client.patch(
+        f"/email_address/{context.id_email_address}",
+        json={"address": "budget.renamed@scraplook.test", "userId": context.id_user},
+        headers=context.headers,
+    )
+
+
+def _mailbox(context: _Context) -> dict:
+    """
+    Query parameters of a mailbox listing.
+
+    Args:
+        context: Seeded data.
+
+    Returns:
+        dict: Parameters.
+    """
+    return {"id_email_address": context.id_email_address, "limit": 100}
+
+
+def _read_state(context: _Context) -> dict:
+    """
+    Body of a read state change of all received messages.
+
+    Args:
+        context: Seeded data.
+
+    Returns:
+        dict: Body.
+    """
+    return {
+        "id_email_address": context.id_email_address,
+        "id_messages": context.id_received_messages,
+    }
+
+
+# routes in calling order, deletions last
+ROUTE_BUDGETS: list[RouteCase] = [
+    RouteCase(
+        "POST",
+        "/auth/token",
+        2,
+        lambda client, context: client.post(
+            "/auth/token", data={"username": USERNAME, "password": PASSWORD}
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/auth/me",
+        1,
+        lambda client, context: client.get("/auth/me", headers=context.headers),
+    ),
+    RouteCase(
+        "POST",
+        "/auth/stream_ticket",
+        1,
+        lambda client, context: client.post(
+            "/auth/stream_ticket", headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/auth/check_refresh_access_token",
+        0,
+        lambda client, context: client.get(
+            "/auth/check_refresh_access_token", headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/auth/refresh_access_token",
+        2,
+        lambda client, context: client.post(
+            "/auth/refresh_access_token", headers=context.refresh_headers
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/user/all",
+        3,
+        lambda client, context: client.get("/user/all", headers=context.headers),
+    ),
+    RouteCase(
+        "GET",
+        "/user/{id_user}",
+        2,
+        lambda client, context: client.get(
+            f"/user/{context.id_user}", headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/user/",
+        2,
+        lambda client, context: client.post(
+            "/user/",
+            json={"name": "BudgetUser", "password": "budget"},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/email_address/all",
+        3,
+        lambda client, context: client.get(
+            "/email_address/all",
+            params={"user_id": context.id_user},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/email_address/{id_email_address}",
+        2,
+        lambda client, context: client.get(
+            f"/email_address/{context.id_email_address}", headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/email_address/{id_email_address}/counters",
+        3,
+        lambda client, context: client.get(
+            f"/email_address/{context.id_email_address}/counters",
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/email_address/",
+        2,
+        lambda client, context: client.post(
+            "/email_address/",
+            json={"address": "budget.new@scraplook.test", "userId": context.id_user},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/sent_messages",
+        4,
+        lambda client, context: client.get(
+            "/messages/sent_messages", params=_mailbox(context), headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/received_messages",
+        4,
+        lambda client, context: client.get(
+            "/messages/received_messages",
+            params=_mailbox(context),
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/sent_summaries",
+        2,
+        lambda client, context: client.get(
+            "/messages/sent_summaries",
+            params=_mailbox(context),
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/received_summaries",
+        2,
+        lambda client, context: client.get(
+            "/messages/received_summaries",
+            params=_mailbox(context),
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/changes",
+        3,
+        lambda client, context: client.get(
+            "/messages/changes",
+            params={"id_email_address": context.id_email_address, "since": 0},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/search",
+        2,
+        lambda client, context: client.get(
+            "/messages/search",
+            params={"id_email_address": context.id_email_address, "q": "budget"},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/export",
+        3,
+        lambda client, context: client.get(
+            "/messages/export",
+            params={"id_email_address": context.id_email_address},
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "GET",
+        "/messages/{id_message}",
+        3,
+        lambda client, context: client.get(
+            f"/messages/{context.id_received_messages[0]}", headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/messages/",
+        8,
+        lambda client, context: client.post(
+            "/messages/",
+            json=_message(
+                context.id_email_address, context.id_other_email_addresses, 0
+            ),
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/messages/batch",
+        8,
+        lambda client, context: client.post(
+            "/messages/batch",
+            json={
+                "messages": [
+                    _message(
+                        context.id_email_address,
+                        context.id_other_email_addresses,
+                        index,
+                    )
+                    for index in range(20)
+                ]
+            },
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/messages/mark_read",
+        8,
+        lambda client, context: client.post(
+            "/messages/mark_read", json=_read_state(context), headers=context.headers
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/messages/mark_unread",
+        8,
+        lambda client, context: client.post(
+            "/messages/mark_unread", json=_read_state(context), headers=context.headers
+        ),
+    ),
+    RouteCase("PATCH", "/email_address/{id_email_address}", 4, _patch_email_address),
+    RouteCase(
+        "DELETE",
+        "/messages/",
+        8,
+        lambda client, context: client.delete(
+            "/messages/",
+            params={
+                "id_email_address": context.id_email_address,
+                "id_message": context.id_received_messages.pop(),
+            },
+            headers=context.headers,
+        ),
+    ),
+    RouteCase(
+        "POST",
+        "/messages/bulk_delete",
+        12,
+        lambda client, context: client.post(
+            "/messages/bulk_delete",
+            json=_read_state(context),
+            headers=context.headers,
+        ),
+    ),
+    RouteCase("DELETE", "/email_address/{id_email_address}", 15, _delete_email_address),
+]
+
+
+async def _seed(client: AsyncClient, messages: int) -> _Context:
+    """
+    Seed the database, and log in the first user.
+
+    Args:
+        client: Client calling the app.
+        messages: Number of messages sent between the addresses of the first user
+            and others.
+
+    Returns:
+        _Context: Seeded data.
+    """
+    (await client.get("/seeder/populate")).raise_for_status()
+    response = await client.post(
+        "/auth/token", data={"username": USERNAME, "password": PASSWORD}
+    )
+    response.raise_for_status()
+    token = response.json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    users = (await client.get("/user/all", headers=headers)).json()
+    user = next(user for user in users if user["name"] == USERNAME)
+    context = _Context(
+        headers=headers,
+        refresh_headers={"Authorization": f"Bearer {token['refresh_token']}"},
+        id_user=user["id"],
+        id_email_address=user["emails"][0]["id"],
+        id_other_email_addresses=[
+            other["emails"][0]["id"] for other in users if other["id"] != user["id"]
+        ][:3],
+    )
+
+    # messages sent both ways, so that both folders need several rows
+    batch = [
+        _message(context.id_email_address, context.id_other_email_addresses, index)
+        for index in range(messages)
+    ] + [
+        _message(id_other, [context.id_email_address], index)
+        for index in range(messages)
+        for id_other in context.id_other_email_addresses[:1]
+    ]
+    (
+        await client.post("/messages/batch", json={"messages": batch}, headers=headers)
+    ).raise_for_status()
+
+    received = (
+        await client.get(
+            "/messages/received_summaries",
+            params={"id_email_address": context.id_email_address, "limit": 100},
+            headers=headers,
+        )
+    ).json()
+    context.id_received_messages = [item["id"] for item in received["items"]]
+    return context
+
+
+async def check_budgets(arguments: Namespace, database: Path) -> int:
+    """
+    Call each route and check its DB queries.
+
+    Args:
+        arguments: Script arguments.
+        database: Database file, with tables created.
+
+    Returns:
+        int: Number of routes failing the check.
+    """
+    app_config = get_app_config()
+    app_config.env_data = app_config.env_data.model_copy(
+        update={
+            "database_url": f"file:{database}",
+            "query_budget_mode": "warn",
+            "query_budget_max_repeats": arguments.max_repeats,
+        }
+    )
+    from main import app  # pylint: disable=C0415
+
+    recorder = _QueryRecorder(app)
+    failures = 0
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=recorder), base_url="http://budgets"
+        ) as client:
+            context = await _seed(client, arguments.messages)
+
+            for case in ROUTE_BUDGETS:
+                response = await case.call(client, context)
+                queries = recorder.last
+                problems = find_budget_violations(
+                    queries, case.max_queries, arguments.max_repeats
+                )
+                if response.is_error:
+                    problems.append(f"status {response.status_code}")
+                failures += bool(problems)
+
+                print(
+                    f"{'FAIL' if problems else 'ok  '} {case.method} {case.path}:"
+                    f" {queries.count} queries (budget {case.max_queries})"
+                )
+                for problem in problems:
+                    print(f"       {problem}")
+                if arguments.verbose:
+                    for shape, count in queries.shapes.items():
+                        print(f"       {count} x {shape}")
+
+    # every route needs a budget
+    checked = {(case.method, case.path) for case in ROUTE_BUDGETS} | UNCHECKED_ROUTES
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in sorted(route.methods):
+            if (method, route.path) not in checked:
+                failures += 1
+                print(f"FAIL {method} {route.path}: no query budget")
+
+    return failures
+
+
+def main(arguments: Namespace) -> int:
+    """
+    Check query budgets and print a report.
+
+    Args:
+        arguments: Script arguments.
+
+    Returns:
+        int: Exit code, 1 if a route exceeds its budget or has none.
+    """
+    with TemporaryDirectory() as directory:
+        database = Path(directory) / "budgets.db"
+        connection = connect(database)
+        apply_migrations(connection)
+        connection.close()
+
+        failures = run(check_budgets(arguments, database))
+
+    print(f"{len(ROUTE_BUDGETS)} routes checked, {failures} failing")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--max-repeats", type=int, default=3)
+    parser.add_argument("--verbose", action="store_true")
+    sys_exit(main(parser.parse_args()))
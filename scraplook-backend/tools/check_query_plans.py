@@ -0,0 +1,468 @@
+"""
+Check that DB queries of the services use indexes, with `EXPLAIN QUERY PLAN`.
+
+A temporary SQLite database is built from `migrations/`, seeded and analyzed,
+then the plan of each query is checked: a full scan of a table fails the check,
+unless the query is expected to read the whole table.
+
+Queries checked are:
+- raw SQL constants of `services/` whose name ends with `_QUERY`, read from the
+  source files, so new raw queries are checked without changing this script,
+- the SQL generated by Prisma for `find_many`, `group_by`, `update_many`...
+  calls of `services/`. Without a query log, it is approximated by the SQL
+  written by hand in `PRISMA_QUERIES` below, reported as `approx`: a new Prisma
+  call filtering on new columns must be mirrored there, and the plans of the
+  approximations may differ from those of the real queries.
+- with `--prisma-log`, the SQL actually run by Prisma, read from the output of
+  the query engine of an app started with `prisma_log_queries=true` (e.g. while
+  `check_query_budgets` or `bench_http` run). It replaces the approximations.
+
+Usage (from `scraplook-backend`):
+    pdm run check_query_plans
+    pdm run check_query_plans --prisma-log logs/prisma_queries.log
+"""
+
+from argparse import ArgumentParser, Namespace
+from ast import Add, Assign, BinOp, Constant, Name, expr, parse
+from json import JSONDecodeError, dumps, loads
+from pathlib import Path
+from random import Random
+from re import IGNORECASE, findall, match, search
+from sqlite3 import Connection, connect
+from sys import exit as sys_exit
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MIGRATIONS_DIR = BACKEND_DIR / "migrations"
+SERVICES_DIR = BACKEND_DIR / "src" / "scraplook-backend" / "services"
+
+# SQL written by hand to approximate the queries of Prisma service calls, with the
+# tables they must scan; replaced by the SQL of a query log with `--prisma-log`
+_LISTING_COLUMNS = "id, subject, body, sentAt, fromId, deleted_by_sender"
+PRISMA_QUERIES: list[tuple[str, str, frozenset[str]]] = [
+    (
+        "user_services.get_all_users",
+        "SELECT id, name, password, createdAt, updatedAt FROM User",
+        frozenset({"User"}),
+    ),
+    (
+        "user_services.get_all_users (emails)",
+        "SELECT id, address, userId FROM Email WHERE userId IN (?, ?)",
+        frozenset(),
+    ),
+    (
+        "user_services.get_user_by_name",
+        "SELECT id, name, password FROM User WHERE name = ? LIMIT ?",
+        frozenset(),
+    ),
+    (
+        "email_address_services.get_user_email_addresses",
+        "SELECT id, address, userId FROM Email WHERE userId = ?",
+        frozenset(),
+    ),
+    (
+        "messages_services.find_unknown_email_addresses",
+        "SELECT id, address, userId FROM Email WHERE id IN (?, ?, ?)",
+        frozenset(),
+    ),
+    (
+        "messages_services.get_user_messages_*",
+        f"SELECT {_LISTING_COLUMNS} FROM Message WHERE id IN (?, ?, ?)"
+        " ORDER BY sentAt ASC, id ASC",
+        frozenset(),
+    ),
+    (
+        "messages_services.get_user_messages_* (recipients)",
+        "SELECT id, messageId, emailId, deletes_message, type FROM MessageRecipient"
+        " WHERE messageId IN (?, ?, ?)",
+        frozenset(),
+    ),
+    (
+        "messages_services.export_mailbox",
+        f"SELECT {_LISTING_COLUMNS} FROM Message"
+        " WHERE ((fromId = ? AND deleted_by_sender = ?) OR id IN ("
+        " SELECT messageId FROM MessageRecipient"
+        " WHERE emailId = ? AND deletes_message = ? AND messageId IS NOT NULL))"
+        " AND (sentAt > ? OR (sentAt = ? AND id > ?))"
+        " ORDER BY sentAt ASC, id ASC LIMIT ?",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_messages (sent ids)",
+        "SELECT id FROM Message WHERE id IN (?, ?) AND sentAt < ?"
+        " AND fromId = ? AND deleted_by_sender = ? GROUP BY id",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_messages (mailbox sent ids)",
+        "SELECT id FROM Message WHERE fromId = ? AND deleted_by_sender = ? GROUP BY id",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_messages (received ids)",
+        "SELECT messageId FROM MessageRecipient"
+        " WHERE emailId = ? AND deletes_message = ? AND messageId IN ("
+        " SELECT id FROM Message WHERE id IN (?, ?) AND sentAt < ?)"
+        " GROUP BY messageId",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_messages (sent flags)",
+        "UPDATE Message SET deleted_by_sender = ?"
+        " WHERE id IN (?, ?) AND fromId = ? AND deleted_by_sender = ?",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_messages (received flags)",
+        "UPDATE MessageRecipient SET deletes_message = ?"
+        " WHERE emailId = ? AND deletes_message = ? AND messageId IN ("
+        " SELECT id FROM Message WHERE id IN (?, ?))",
+        frozenset(),
+    ),
+    (
+        "messages_services.safe_delete_message (received flag)",
+        "UPDATE MessageRecipient SET deletes_message = ?"
+        " WHERE messageId = ? AND emailId = ? AND deletes_message = ?",
+        frozenset(),
+    ),
+    (
+        "messages_services.purge_deleted_messages",
+        "DELETE FROM Message WHERE id IN (?, ?, ?)",
+        frozenset(),
+    ),
+    (
+        "versions_services.*_etag",
+        "SELECT key, version FROM DataVersion WHERE key IN (?, ?, ?)",
+        frozenset(),
+    ),
+    (
+        "changes_services.get_mailbox_changes",
+        "SELECT seq, emailId, messageId, kind, createdAt FROM MailboxChange"
+        " WHERE emailId = ? AND seq > ? AND seq <= ? ORDER BY seq ASC LIMIT ?",
+        frozenset(),
+    ),
+    (
+        "changes_services.prune_mailbox_changes",
+        "DELETE FROM MailboxChange WHERE createdAt < ? AND seq < ?",
+        frozenset(),
+    ),
+]
+
+# raw queries completed at runtime, with the suffix added by the services
+RAW_QUERY_SUFFIXES: dict[str, list[str]] = {
+    "_FOLDER_QUERY": [
+        "ORDER BY sentAt, messageId LIMIT ?3",
+        "{_FOLDER_CURSOR_CLAUSE} ORDER BY sentAt, messageId LIMIT ?5",
+    ],
+    "_SEARCH_QUERY": [
+        "ORDER BY h.rank, m.id LIMIT ?4",
+        "{_SEARCH_CURSOR_CLAUSE} ORDER BY h.rank, m.id LIMIT ?6",
+    ],
+}
+# raw queries expected to read a whole table
+RAW_QUERY_SCANS: dict[str, frozenset[str]] = {}
+
+
+def _evaluate(node: expr, constants: dict[str, str]) -> Optional[str]:
+    """
+    Evaluate a string expression made of literals and other string constants.
+
+    Args:
+        node: Expression assigned to a module constant.
+        constants: Constants already evaluated in the module.
+
+    Returns:
+        Optional[str]: String value, None if the expression is not a string constant.
+    """
+    if isinstance(node, Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, Name):
+        return constants.get(node.id)
+    if isinstance(node, BinOp) and isinstance(node.op, Add):
+        left = _evaluate(node.left, constants)
+        right = _evaluate(node.right, constants)
+        if left is not None and right is not None:
+            return left + right
+    return None
+
+
+def read_service_constants() -> dict[str, str]:
+    """
+    Read string constants defined at module level in services.
+
+    Returns:
+        dict[str, str]: String constants, by name.
+    """
+    constants: dict[str, str] = {}
+    for path in sorted(SERVICES_DIR.glob("*.py")):
+        module_constants: dict[str, str] = {}
+        for statement in parse(path.read_text(encoding="utf-8")).body:
+            if (
+                isinstance(statement, Assign)
+                and len(statement.targets) == 1
+                and isinstance(statement.targets[0], Name)
+            ):
+                value = _evaluate(statement.value, module_constants)
+                if value is not None:
+                    module_constants[statement.targets[0].id] = value
+        constants.update(module_constants)
+    return constants
+
+
+def raw_queries(constants: dict[str, str]) -> list[tuple[str, str, frozenset[str]]]:
+    """
+    List raw queries of services to check, as executed at runtime.
+
+    Args:
+        constants: String constants of services.
+
+    Returns:
+        list[tuple[str, str, frozenset[str]]]: Name, SQL and tables expected to be
+            scanned of each query.
+    """
+    queries = []
+    for name, sql in constants.items():
+        if not name.endswith("_QUERY") or not match(
+            r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", sql
+        ):
+            continue
+        scans = RAW_QUERY_SCANS.get(name, frozenset())
+        for suffix in RAW_QUERY_SUFFIXES.get(name, [""]):
+            queries.append(
+                (f"{name} {suffix}".strip(), sql + suffix.format(**constants), scans)
+            )
+    return queries
+
+
+def _logged_statement(line: str) -> Optional[str]:
+    """
+    Extract the SQL of a line of the query engine output.
+
+    The engine writes JSON lines, the SQL being in the `query` field (or in the
+    message for older engines). Plain SQL lines are read as is.
+
+    Args:
+        line: Line of the output.
+
+    Returns:
+        Optional[str]: SQL statement, None if the line is not a query.
+    """
+    try:
+        entry = loads(line)
+    except JSONDecodeError:
+        sql = line.strip()
+    else:
+        fields = entry.get("fields", {}) if isinstance(entry, dict) else {}
+        sql = str(fields.get("query") or fields.get("message") or "")
+    if not match(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", sql, IGNORECASE):
+        return None
+    return sql
+
+
+def logged_queries(path: Path) -> list[tuple[str, str, frozenset[str]]]:
+    """
+    List the distinct SQL statements run by Prisma, from a query log.
+
+    Queries without a WHERE clause, such as the listing of all users, are expected
+    to read whole tables.
+
+    Args:
+        path: Output of the query engine of an app started with
+            `prisma_log_queries=true`.
+
+    Returns:
+        list[tuple[str, str, frozenset[str]]]: Name, SQL and tables expected to be
+            scanned of each query.
+    """
+    statements: dict[str, None] = {}
+    with path.open(encoding="utf-8") as log:
+        for line in log:
+            sql = _logged_statement(line)
+            if sql is not None:
+                statements.setdefault(sql, None)
+
+    queries = []
+    for index, sql in enumerate(statements, start=1):
+        # engines qualify tables, e.g. `main`.`Message`, the plan names the table
+        tables = findall(r'(?:FROM|JOIN)\s+[`"]?main[`"]?\.[`"]?(\w+)', sql)
+        # Prisma writes `WHERE 1=1` when a call has no filter
+        filtered = search(r"\bWHERE\b(?!\s+1\s*=\s*1\s*(?:LIMIT|ORDER|$))", sql)
+        scans = frozenset() if filtered else frozenset(tables)
+        queries.append((f"prisma log #{index} {' '.join(tables)}".strip(), sql, scans))
+    return queries
+
+
+def apply_migrations(connection: Connection) -> None:
+    """
+    Create the tables of a database from the migrations.
+
+    Args:
+        connection: Connection to an empty database.
+
+    Returns:
+
+    """
+    for migration in sorted(MIGRATIONS_DIR.glob("*/migration.sql")):
+        connection.executescript(migration.read_text(encoding="utf-8"))
+
+
+def build_database(path: Path, messages: int, constants: dict[str, str]) -> Connection:
+    """
+    Create a database from the migrations, seed it and analyze it.
+
+    Args:
+        path: Database file to create.
+        messages: Number of messages to seed.
+        constants: String constants of services, to fill mailbox entries.
+
+    Returns:
+        Connection: Connection to the database.
+    """
+    connection = connect(path)
+    apply_migrations(connection)
+
+    random = Random(0)
+    users = [f"user-{index}" for index in range(50)]
+    emails = [f"email-{index}" for index in range(200)]
+    connection.executemany(
+        "INSERT INTO User(id, name, password, updatedAt) VALUES (?, ?, '', 0)",
+        [(user, user) for user in users],
+    )
+    connection.executemany(
+        "INSERT INTO Email(id, address, userId) VALUES (?, ?, ?)",
+        [
+            (email, f"{email}@test", users[index % 50])
+            for index, email in enumerate(emails)
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO Message(id, subject, body, sentAt, fromId, deleted_by_sender)"
+        " VALUES (?, ?, 'corps du mail', ?, ?, ?)",
+        [
+            (
+                f"message-{index}",
+                f"objet {index}",
+                index,
+                random.choice(emails),
+                random.random() < 0.2,
+            )
+            for index in range(messages)
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO MessageRecipient(id, messageId, emailId, deletes_message, type)"
+        " VALUES (?, ?, ?, ?, 'to')",
+        [
+            (
+                f"recipient-{index}-{rank}",
+                f"message-{index}",
+                email,
+                random.random() < 0.2,
+            )
+            for index in range(messages)
+            for rank, email in enumerate(random.sample(emails, 2))
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO MailboxChange(emailId, messageId, kind) VALUES (?, ?, 'insert')",
+        [(random.choice(emails), f"message-{index}") for index in range(messages)],
+    )
+    connection.execute(
+        constants["_ADD_ENTRIES_QUERY"],
+        (dumps([f"message-{index}" for index in range(messages)]), 120),
+    )
+    connection.execute(
+        constants["_INDEX_MESSAGES_QUERY"],
+        (dumps([f"message-{index}" for index in range(messages)]),),
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    return connection
+
+
+def check_plan(
+    connection: Connection, tables: set[str], sql: str, allowed_scans: frozenset[str]
+) -> tuple[list[str], list[str]]:
+    """
+    Explain a query and find full scans of tables.
+
+    Args:
+        connection: Connection to the seeded database.
+        tables: Names of regular tables of the database.
+        sql: Query to explain.
+        allowed_scans: Tables the query is expected to scan.
+
+    Returns:
+        tuple[list[str], list[str]]: Lines of the plan, and tables scanned unexpectedly.
+    """
+    numbered = [int(number) for number in findall(r"\?(\d+)", sql)]
+    parameter_count = max(numbered, default=0) or sql.count("?")
+    rows = connection.execute(
+        f"EXPLAIN QUERY PLAN {sql}", [None] * parameter_count
+    ).fetchall()
+
+    plan = [row[3] for row in rows]
+    scans = []
+    for detail in plan:
+        scan = match(r"SCAN (?:main\.)?(\w+)(?: AS \w+)?", detail)
+        if scan and scan.group(1) in tables and scan.group(1) not in allowed_scans:
+            scans.append(detail)
+    return plan, scans
+
+
+def main(arguments: Namespace) -> int:
+    """
+    Check query plans and print a report.
+
+    Args:
+        arguments: Script arguments.
+
+    Returns:
+        int: Exit code, 1 if a query scans a table unexpectedly.
+    """
+    constants = read_service_constants()
+    if arguments.prisma_log is not None:
+        prisma_queries = logged_queries(arguments.prisma_log)
+    else:
+        prisma_queries = [
+            (f"{name} (approx)", sql, scans) for name, sql, scans in PRISMA_QUERIES
+        ]
+    queries = raw_queries(constants) + prisma_queries
+    failures = 0
+
+    with TemporaryDirectory() as directory:
+        connection = build_database(
+            Path(directory) / "plans.db", arguments.messages, constants
+        )
+        tables = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master"
+                " WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL TABLE%'"
+            )
+        } | {"sqlite_master"}
+
+        for name, sql, allowed_scans in queries:
+            plan, scans = check_plan(connection, tables, sql, allowed_scans)
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'ok  '} {name}")
+            if scans or arguments.verbose:
+                for detail in plan:
+                    print(f"       {detail}")
+        connection.close()
+
+    print(f"{len(queries)} queries checked, {failures} scanning tables")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument(
+        "--prisma-log",
+        type=Path,
+        help="query engine output of an app started with prisma_log_queries=true",
+    )
+    sys_exit(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""
+Add a large synthetic dataset to the DB of `.env`, e.g. to benchmark at scale.
+
+Options map to the fields of `SyntheticDatasetInput`, the same seed and scale
+always generate the same dataset. Progress is printed as JSON lines. For instance,
+10 000 users with 2 addresses and 500 messages each give 10 million messages.
+
+Usage (from `scraplook-backend`, on a migrated DB):
+    pdm run seed_synthetic --users 10000 --messages-per-address 500 --seed 1
+"""
+
+from argparse import ArgumentParser, Namespace
+from asyncio import run
+
+from config.prisma_client import disconnect_prisma, get_prisma_instance
+from models.seeder import SyntheticDatasetInput
+from services.synthetic_data_services import generate_synthetic_dataset
+
+
+async def main(arguments: Namespace) -> None:
+    """
+    Generate the dataset and print its progress.
+
+    Args:
+        arguments: Scale of the dataset.
+
+    Returns:
+
+    """
+    scale = SyntheticDatasetInput(**vars(arguments))
+    prisma = await get_prisma_instance()
+    try:
+        async for progress in generate_synthetic_dataset(prisma, scale):
+            print(progress.model_dump_json(), flush=True)
+    finally:
+        await disconnect_prisma()
+
+
+if __name__ == "__main__":
+    defaults = SyntheticDatasetInput()
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument(
+        "--addresses-per-user", type=int, default=defaults.addresses_per_user
+    )
+    parser.add_argument(
+        "--messages-per-address", type=int, default=defaults.messages_per_address
+    )
+    parser.add_argument(
+        "--recipient-weights",
+        type=float,
+        nargs="+",
+        default=defaults.recipient_weights,
+    )
+    parser.add_argument(
+        "--body-size-median", type=int, default=defaults.body_size_median
+    )
+    parser.add_argument(
+        "--body-size-sigma", type=float, default=defaults.body_size_sigma
+    )
+    parser.add_argument("--body-size-max", type=int, default=defaults.body_size_max)
+    parser.add_argument("--password", default=defaults.password)
+    parser.add_argument("--name-prefix", default=defaults.name_prefix)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    run(main(parser.parse_args()))